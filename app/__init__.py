@@ -32,7 +32,43 @@ def create_app(config_class=Config):
     })
 
     # Import models to ensure they are registered
-    from app.models import user, branch, customer, subscription, payment, attendance, complaint
+    from app.models import user, branch, customer, subscription, payment, attendance, complaint, branch_stats, alert_snapshot, id_counter
+    
+    # Keep the branch daily rollup in step with payment, attendance and customer writes
+    from app.services.rollup_service import register_rollup_listeners
+    register_rollup_listeners()
+    
+    # Keep the customer search index in step with customer and user writes
+    from app.services.search_service import register_search_listeners
+    register_search_listeners()
+    
+    # Dashboard payload cache, invalidated by commits touching a branch
+    from app.services.dashboard_cache import dashboard_cache
+    dashboard_cache.init_app(app)
+    
+    # In-memory check-in eligibility, kept current by commits
+    from app.services.eligibility_index import eligibility_index
+    eligibility_index.init_app(app)
+    
+    # Live per-branch occupancy for today's attendance
+    from app.services.occupancy import occupancy_tracker
+    occupancy_tracker.init_app(app)
+    
+    # Live attendance events for /api/attendance/stream (after occupancy, whose counts it reports)
+    from app.services.attendance_stream import attendance_broker
+    attendance_broker.init_app(app)
+    
+    # Optional write-behind check-ins: journaled, then inserted in batches
+    from app.services.attendance_journal import attendance_recorder
+    attendance_recorder.init_app(app)
+    
+    # Sequential member, subscription, payment and complaint numbers
+    from app.services.id_allocator import id_allocator
+    id_allocator.init_app(app)
+    
+    # Background refresh of precomputed dashboard alerts
+    from app.services.alert_service import alert_worker
+    alert_worker.init_app(app)
     
     # Register blueprints
     from app.api import auth_bp, branch_bp, customer_bp, subscription_bp, payment_bp, attendance_bp, dashboard_bp, complaint_bp
@@ -62,4 +98,8 @@ def create_app(config_class=Config):
     else:
         print("[WARNING] Paymob blueprint not registered due to import error")
 
+    # Register maintenance CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
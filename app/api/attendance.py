@@ -1,10 +1,19 @@
 """Attendance management API routes"""
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from datetime import date, datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from app.database import db
 from app.models.attendance import Attendance, AttendanceValidation
 from app.models.customer import Customer
 from app.auth import require_staff, require_receptionist_or_above, validate_json_request
+from app.query_budget import query_budget
+from app.conditional import conditional_get, row_version
+from app.services.occupancy import occupancy_tracker
+from app.services.attendance_stream import attendance_broker
+from app.services.archive_service import ArchiveService
+from app.services.attendance_journal import attendance_recorder
+from app.pagination import DEFAULT_PAGE_SIZE, InvalidCursor, cursor_pagination, cursor_requested, page_size
 
 attendance_bp = Blueprint('attendance', __name__)
 
@@ -45,22 +54,21 @@ def record_checkin(current_user):
     if not current_user.has_branch_access(branch_id):
         return jsonify({'error': 'Access denied for this branch'}), 403
     
-    # Validate customer exists
-    customer = Customer.query.get(customer_id)
-    if not customer:
-        return jsonify({'error': 'Customer not found'}), 404
-    
     try:
-        attendance, is_valid, reason = AttendanceValidation.record_entry(
+        # Eligibility is resolved in one query and the entry is recorded in the same transaction
+        result = AttendanceValidation.check_in(
             customer_id=customer_id,
             branch_id=branch_id,
             entry_method=entry_method,
             processed_by_id=current_user.id,
             notes=notes
         )
+        if result is None:
+            return jsonify({'error': 'Customer not found'}), 404
         
+        attendance_data, is_valid, reason = result
         response_data = {
-            'attendance': attendance.to_dict(include_customer=True),
+            'attendance': attendance_data,
             'access_granted': is_valid,
             'message': reason
         }
@@ -71,6 +79,116 @@ def record_checkin(current_user):
         db.session.rollback()
         return jsonify({'error': 'Failed to record attendance', 'details': str(e)}), 500
 
+def parse_batch_entry(entry, device_id, latest):
+    """Normalize one batch entry; invalid entries carry an ``error``"""
+    if not isinstance(entry, dict):
+        return {'error': 'Entry must be an object'}
+    
+    customer_id = entry.get('customer_id')
+    parsed = {'customer_id': customer_id}
+    if not isinstance(customer_id, int):
+        parsed['error'] = 'customer_id is required'
+        return parsed
+    
+    parsed['device_id'] = str(entry.get('device_id') or device_id or '')[:64]
+    if not parsed['device_id']:
+        parsed['error'] = 'device_id is required'
+        return parsed
+    
+    try:
+        timestamp = datetime.fromisoformat(entry['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        parsed['error'] = 'timestamp must be an ISO 8601 datetime'
+        return parsed
+    if timestamp.tzinfo is not None:
+        # Entries are stored in server local time, like live check-ins
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    if timestamp > latest:
+        parsed['error'] = 'timestamp is in the future'
+        return parsed
+    parsed['timestamp'] = timestamp
+    
+    entry_method = entry.get('entry_method', 'card')
+    if entry_method not in ('biometric', 'manual', 'card'):
+        parsed['error'] = 'Invalid entry_method'
+        return parsed
+    parsed['entry_method'] = entry_method
+    parsed['notes'] = entry.get('notes')
+    return parsed
+
+@attendance_bp.route('/checkin/batch', methods=['POST'])
+@require_staff()
+@validate_json_request('entries')
+def record_checkin_batch(current_user):
+    """Record a batch of swipes replayed by a door controller
+    
+    Each entry is validated as of its own client timestamp and reported
+    individually; replaying a batch is safe, as already ingested swipes
+    come back as duplicates.
+    """
+    data = request.get_json()
+    entries = data['entries']
+    branch_id = data.get('branch_id', current_user.branch_id)
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'entries must be a non-empty list'}), 400
+    
+    max_entries = current_app.config.get('ATTENDANCE_BATCH_MAX_ENTRIES', 500)
+    if len(entries) > max_entries:
+        return jsonify({'error': f'A batch may contain at most {max_entries} entries'}), 400
+    
+    # Check branch access
+    if not branch_id or not current_user.has_branch_access(branch_id):
+        return jsonify({'error': 'Access denied for this branch'}), 403
+    
+    skew = timedelta(seconds=current_app.config.get('ATTENDANCE_BATCH_CLOCK_SKEW', 300))
+    latest = datetime.now() + skew
+    parsed = [parse_batch_entry(entry, data.get('device_id'), latest) for entry in entries]
+    
+    try:
+        try:
+            results = AttendanceValidation.check_in_batch(parsed, branch_id, processed_by_id=current_user.id)
+        except IntegrityError:
+            # A concurrent replay ingested some of these swipes first; they are duplicates now
+            db.session.rollback()
+            results = AttendanceValidation.check_in_batch(parsed, branch_id, processed_by_id=current_user.id)
+        
+        counts = {status: 0 for status in ('granted', 'denied', 'duplicate', 'error')}
+        for result in results:
+            counts[result['status']] += 1
+        
+        return jsonify({
+            'branch_id': branch_id,
+            'processed': len(results),
+            'summary': counts,
+            'results': results
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to record attendance batch', 'details': str(e)}), 500
+
+@attendance_bp.route('/provisional/<provisional_id>', methods=['GET'])
+@require_staff()
+def provisional_attendance(provisional_id, current_user):
+    """Resolve the provisional id of a write-behind check-in to its record"""
+    if attendance_recorder.is_pending(provisional_id):
+        return jsonify({'provisional_id': provisional_id, 'status': 'pending'}), 202
+    
+    attendance = attendance_recorder.lookup(provisional_id)
+    if attendance is None:
+        return jsonify({'error': 'Unknown provisional id'}), 404
+    
+    # Check branch access
+    if not current_user.has_branch_access(attendance.branch_id):
+        return jsonify({'error': 'Access denied for this attendance record'}), 403
+    
+    return jsonify({
+        'provisional_id': provisional_id,
+        'status': 'recorded',
+        'attendance': attendance.to_dict(include_customer=True)
+    }), 200
+
 @attendance_bp.route('/checkout', methods=['POST'])
 @require_staff()
 @validate_json_request('attendance_id')
@@ -133,7 +251,8 @@ def biometric_check(current_user):
     if biometric_success:
         # Record attendance with biometric verification
         try:
-            attendance, is_valid, reason = AttendanceValidation.record_entry(
+            # Same path as /checkin, so write-behind mode applies here too
+            attendance_data, is_valid, reason = AttendanceValidation.check_in(
                 customer_id=customer_id,
                 branch_id=customer.branch_id,
                 entry_method='biometric',
@@ -145,7 +264,7 @@ def biometric_check(current_user):
                 'biometric_verified': True,
                 'access_granted': is_valid,
                 'message': reason,
-                'attendance': attendance.to_dict(include_customer=True)
+                'attendance': attendance_data
             }), 201 if is_valid else 200
         
         except Exception as e:
@@ -159,10 +278,11 @@ def biometric_check(current_user):
         }), 200
 
 @attendance_bp.route('/', methods=['GET'])
+@query_budget(3)
 @require_staff()
 def list_attendance(current_user):
     """List attendance records with filtering"""
-    query = Attendance.query.join(Customer)
+    query = Attendance.query.join(Customer).options(*Attendance.load_options(include_customer=True))
     
     # Branch-based filtering for non-owners
     if current_user.role != 'owner':
@@ -193,62 +313,152 @@ def list_attendance(current_user):
     if access_granted is not None:
         query = query.filter(Attendance.access_granted == (access_granted.lower() == 'true'))
     
-    # Pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
-    
-    attendance_paginated = query.order_by(Attendance.entry_date.desc(), Attendance.entry_time.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Pagination: page numbers by default, keyset on entry date/time and id with ?cursor=
+    if cursor_requested(request.args):
+        try:
+            records, pagination = cursor_pagination(
+                query, [Attendance.entry_date, Attendance.entry_time, Attendance.id], request.args, 50
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+        
+        attendance_paginated = query.order_by(Attendance.entry_date.desc(), Attendance.entry_time.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        records = attendance_paginated.items
+        pagination = {
+            'page': page,
+            'pages': attendance_paginated.pages,
+            'per_page': per_page,
+            'total': attendance_paginated.total
+        }
     
     attendance_data = []
-    for attendance in attendance_paginated.items:
+    for attendance in records:
         attendance_dict = attendance.to_dict(include_customer=True)
         attendance_data.append(attendance_dict)
     
     return jsonify({
         'attendance': attendance_data,
-        'pagination': {
-            'page': page,
-            'pages': attendance_paginated.pages,
-            'per_page': per_page,
-            'total': attendance_paginated.total
-        }
+        'pagination': pagination
     }), 200
 
+def today_attendance_version(current_user):
+    """Conditional-GET version of today's attendance visible to the user"""
+    criteria = [Attendance.entry_date == date.today()]
+    if current_user.role != 'owner':
+        criteria.append(Attendance.branch_id == current_user.branch_id)
+    token, last_modified = row_version(Attendance, *criteria, related=(Attendance.customer, Customer.user))
+    # The payload is for today only; a new day is a new representation
+    return f'{date.today().isoformat()}:{token}', last_modified
+
 @attendance_bp.route('/today', methods=['GET'])
 @require_staff()
+@conditional_get(today_attendance_version)
 def today_attendance(current_user):
-    """Get today's attendance for quick overview"""
-    query = Attendance.query.filter(Attendance.entry_date == date.today())
+    """Get today's attendance for quick overview
     
-    # Branch filtering for non-owners
+    Summary counts come from the live occupancy tracker; the list of
+    customers currently in the gym is paginated (``page``, ``per_page``).
+    """
+    branch_ids = None
     if current_user.role != 'owner':
-        query = query.filter(Attendance.branch_id == current_user.branch_id)
+        branch_ids = {current_user.branch_id}
     
     branch_id = request.args.get('branch_id')
     if branch_id and current_user.has_branch_access(int(branch_id)):
-        query = query.filter(Attendance.branch_id == int(branch_id))
+        branch_ids = {int(branch_id)}
+    
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+    
+    summary = occupancy_tracker.summary(branch_ids)
+    checked_in_ids = occupancy_tracker.checked_in_ids(branch_ids)
+    page_ids = checked_in_ids[(page - 1) * per_page:page * per_page]
     
-    attendance_records = query.order_by(Attendance.entry_time.desc()).all()
+    with_customer = joinedload(Attendance.customer).joinedload(Customer.user)
+    checked_in = []
+    if page_ids:
+        checked_in = Attendance.query.options(with_customer).filter(Attendance.id.in_(page_ids)).order_by(
+            Attendance.entry_time.desc(), Attendance.id.desc()
+        ).all()
     
-    # Separate checked in vs checked out
-    checked_in = [a for a in attendance_records if a.access_granted and not a.exit_time]
-    checked_out = [a for a in attendance_records if a.access_granted and a.exit_time]
-    denied_entry = [a for a in attendance_records if not a.access_granted]
+    recent_query = Attendance.query.options(with_customer).filter(Attendance.entry_date == date.today())
+    if branch_ids is not None:
+        recent_query = recent_query.filter(Attendance.branch_id.in_(branch_ids))
+    recent_entries = recent_query.order_by(Attendance.entry_time.desc()).limit(10).all()
     
     return jsonify({
         'date': date.today().isoformat(),
-        'summary': {
-            'total_entries': len([a for a in attendance_records if a.access_granted]),
-            'currently_in_gym': len(checked_in),
-            'checked_out': len(checked_out),
-            'denied_entries': len(denied_entry)
-        },
+        'summary': summary,
         'currently_in_gym': [a.to_dict(include_customer=True) for a in checked_in],
-        'recent_entries': [a.to_dict(include_customer=True) for a in attendance_records[:10]]
+        'currently_in_gym_pagination': {
+            'page': page,
+            'pages': (len(checked_in_ids) + per_page - 1) // per_page,
+            'per_page': per_page,
+            'total': len(checked_in_ids)
+        },
+        'recent_entries': [a.to_dict(include_customer=True) for a in recent_entries]
     }), 200
 
+@attendance_bp.route('/stream', methods=['GET'])
+@require_staff()
+def attendance_stream(current_user):
+    """Server-sent events for check-ins, checkouts and denials in the user's branch
+    
+    Starts with an ``occupancy`` snapshot (or, when resuming with
+    ``Last-Event-ID``, the missed events) and then pushes events as they
+    are committed, with a comment line as heartbeat while idle.
+    """
+    if not attendance_broker.enabled:
+        return jsonify({'error': 'Attendance stream is disabled'}), 404
+    
+    branch_ids = None
+    if current_user.role != 'owner':
+        branch_ids = {current_user.branch_id}
+    
+    branch_id = request.args.get('branch_id')
+    if branch_id and current_user.has_branch_access(int(branch_id)):
+        branch_ids = {int(branch_id)}
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    snapshot = None if last_event_id else occupancy_tracker.summary(branch_ids)
+    
+    subscription, backlog = attendance_broker.subscribe(branch_ids, last_event_id)
+    if subscription is None:
+        return jsonify({'error': 'Too many open attendance streams'}), 503
+    
+    heartbeat = attendance_broker.heartbeat
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            if snapshot is not None:
+                yield attendance_broker.format(attendance_broker.snapshot_event(snapshot))
+            for event in backlog:
+                yield attendance_broker.format(event)
+            
+            while True:
+                event = subscription.next_event(heartbeat)
+                if subscription.overflowed:
+                    # Fell too far behind; the client reloads and reconnects
+                    yield attendance_broker.format(attendance_broker.reset_event())
+                    return
+                if event is None:
+                    yield ': heartbeat\n\n'
+                else:
+                    yield attendance_broker.format(event)
+        finally:
+            attendance_broker.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @attendance_bp.route('/customer/<int:customer_id>/history', methods=['GET'])
 @require_staff()
 def customer_attendance_history(customer_id, current_user):
@@ -263,27 +473,18 @@ def customer_attendance_history(customer_id, current_user):
     days_back = int(request.args.get('days', 90))
     start_date = date.today() - timedelta(days=days_back)
     
-    attendance_records = Attendance.query.filter(
-        Attendance.customer_id == customer_id,
-        Attendance.entry_date >= start_date,
-        Attendance.access_granted == True
-    ).order_by(Attendance.entry_date.desc(), Attendance.entry_time.desc()).all()
-    
-    # Calculate statistics
-    total_visits = len(attendance_records)
-    avg_duration = 0
-    if attendance_records:
-        durations = [a.calculate_duration() for a in attendance_records if a.calculate_duration()]
-        if durations:
-            avg_duration = sum(durations) / len(durations)
-    
-    # Monthly breakdown
-    monthly_visits = {}
-    for attendance in attendance_records:
-        month_key = attendance.entry_date.strftime('%Y-%m')
-        if month_key not in monthly_visits:
-            monthly_visits[month_key] = 0
-        monthly_visits[month_key] += 1
+    # Detail is keyset-paginated (limit, cursor); both include archived entries when the range needs them
+    limit = page_size(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    try:
+        attendance_records, next_cursor = ArchiveService.customer_history_page(
+            customer_id, start_date, request.args.get('cursor'), limit
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Statistics over the whole range, aggregated in SQL
+    statistics = ArchiveService.customer_history_stats(customer_id, start_date)
+    avg_duration = statistics['average_duration_minutes']
     
     return jsonify({
         'customer': {
@@ -292,10 +493,15 @@ def customer_attendance_history(customer_id, current_user):
             'name': f"{customer.user.first_name} {customer.user.last_name}"
         },
         'statistics': {
-            'total_visits': total_visits,
+            'total_visits': statistics['total_visits'],
             'days_period': days_back,
             'average_duration_minutes': round(avg_duration, 1) if avg_duration else 0,
-            'visits_per_month': monthly_visits
+            'visits_per_month': statistics['visits_per_month']
         },
-        'attendance_history': [a.to_dict() for a in attendance_records]
+        'attendance_history': [a.to_dict() for a in attendance_records],
+        'pagination': {
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
     }), 200
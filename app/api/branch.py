@@ -4,11 +4,19 @@ from app.database import db
 from app.models.branch import Branch
 from app.models.user import User
 from app.auth import require_owner, require_manager_or_owner, require_staff, validate_json_request
+from app.conditional import conditional_get, row_version
 
 branch_bp = Blueprint('branch', __name__)
 
+def branch_list_version(current_user):
+    """Conditional-GET version of the branches visible to the user"""
+    if current_user.role == 'owner':
+        return row_version(Branch)
+    return row_version(Branch, Branch.id == current_user.branch_id)
+
 @branch_bp.route('/', methods=['GET'])
 @require_staff()
+@conditional_get(branch_list_version)
 def list_branches(current_user):
     """List branches (filtered by user access)"""
     query = Branch.query
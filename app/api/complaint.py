@@ -6,18 +6,12 @@ from app.models.complaint import Complaint, ComplaintUpdate
 from app.models.customer import Customer
 from app.models.user import User
 from app.auth import require_staff, require_manager_or_owner, validate_json_request
-import secrets
-import string
+from app.query_budget import query_budget
+from app.pagination import InvalidCursor, cursor_pagination, cursor_requested
+from app.services.id_allocator import id_allocator
 
 complaint_bp = Blueprint('complaint', __name__)
 
-def generate_complaint_number():
-    """Generate unique complaint number"""
-    today = date.today()
-    date_part = today.strftime('%y%m%d')
-    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-    return f"CMP{date_part}{random_part}"
-
 @complaint_bp.route('/', methods=['POST'])
 @require_staff()
 @validate_json_request('customer_id', 'title', 'description', 'category')
@@ -46,9 +40,7 @@ def create_complaint(current_user):
         return jsonify({'error': 'Invalid priority', 'valid_priorities': valid_priorities}), 400
     
     # Generate complaint number
-    complaint_number = generate_complaint_number()
-    while Complaint.query.filter_by(complaint_number=complaint_number).first():
-        complaint_number = generate_complaint_number()
+    complaint_number = id_allocator.complaint_number()
     
     # Create complaint
     complaint = Complaint(
@@ -75,10 +67,13 @@ def create_complaint(current_user):
         return jsonify({'error': 'Failed to create complaint', 'details': str(e)}), 500
 
 @complaint_bp.route('/', methods=['GET'])
+@query_budget(3)
 @require_staff()
 def list_complaints(current_user):
     """List complaints with filtering"""
-    query = Complaint.query.join(Customer)
+    query = Complaint.query.join(Customer).options(
+        *Complaint.load_options(include_customer=True, include_assignee=True)
+    )
     
     # Branch-based filtering for non-owners
     if current_user.role != 'owner':
@@ -114,16 +109,29 @@ def list_complaints(current_user):
     if end_date:
         query = query.filter(Complaint.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
     
-    # Pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
-    
-    complaints_paginated = query.order_by(Complaint.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Pagination: page numbers by default, keyset on created_at, then id with ?cursor=
+    if cursor_requested(request.args):
+        try:
+            complaints, pagination = cursor_pagination(query, [Complaint.created_at, Complaint.id], request.args, 20)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        complaints_paginated = query.order_by(Complaint.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        complaints = complaints_paginated.items
+        pagination = {
+            'page': page,
+            'pages': complaints_paginated.pages,
+            'per_page': per_page,
+            'total': complaints_paginated.total
+        }
     
     complaints_data = []
-    for complaint in complaints_paginated.items:
+    for complaint in complaints:
         complaint_dict = complaint.to_dict(include_customer=True)
         if complaint.assigned_to:
             complaint_dict['assigned_to'] = {
@@ -135,12 +143,7 @@ def list_complaints(current_user):
     
     return jsonify({
         'complaints': complaints_data,
-        'pagination': {
-            'page': page,
-            'pages': complaints_paginated.pages,
-            'per_page': per_page,
-            'total': complaints_paginated.total
-        }
+        'pagination': pagination
     }), 200
 
 @complaint_bp.route('/<int:complaint_id>', methods=['GET'])
@@ -1,24 +1,21 @@
 """Customer management API routes"""
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
+from itertools import islice
 from datetime import date, datetime
 from app.database import db
 from app.models.user import User
 from app.models.customer import Customer, HealthReport
 from app.models.branch import Branch
 from app.auth import require_staff, require_receptionist_or_above, check_customer_access, validate_json_request
-import secrets
-import string
+from app.query_budget import query_budget
+from app.conditional import conditional_get, row_version
+from app.services.search_service import SearchService
+from app.services.import_service import CustomerImportService, read_rows
+from app.services.id_allocator import id_allocator
+from app.pagination import InvalidCursor, cursor_pagination, cursor_requested
 
 customer_bp = Blueprint('customer', __name__)
 
-def generate_member_id(branch_code):
-    """Generate unique member ID"""
-    # Format: BranchCode + YYMMDD + 4 random digits
-    today = date.today()
-    date_part = today.strftime('%y%m%d')
-    random_part = ''.join(secrets.choice(string.digits) for _ in range(4))
-    return f"{branch_code}{date_part}{random_part}"
-
 @customer_bp.route('/', methods=['POST'])
 @require_receptionist_or_above()
 @validate_json_request('username', 'email', 'password', 'first_name', 'last_name', 'branch_id')
@@ -44,6 +41,9 @@ def create_customer(current_user):
         return jsonify({'error': 'Email already exists'}), 400
     
     try:
+        # Member ID first: its number block is reserved before this request writes
+        member_id = id_allocator.member_id(branch.code)
+        
         # Create user account
         user = User(
             username=data['username'],
@@ -59,11 +59,6 @@ def create_customer(current_user):
         db.session.add(user)
         db.session.flush()  # Get user ID without committing
         
-        # Generate unique member ID
-        member_id = generate_member_id(branch.code)
-        while Customer.query.filter_by(member_id=member_id).first():
-            member_id = generate_member_id(branch.code)
-        
         # Create customer profile
         customer = Customer(
             user_id=user.id,
@@ -113,11 +108,57 @@ def create_customer(current_user):
         traceback.print_exc()
         return jsonify({'error': 'Failed to create customer', 'details': str(e)}), 500
 
+@customer_bp.route('/import', methods=['POST'])
+@require_receptionist_or_above()
+def import_customers(current_user):
+    """Bulk-create customers from a CSV or NDJSON request body
+
+    Rows are streamed and inserted in batches; rows that fail are reported
+    with their line number and do not stop the import.
+    """
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    default_branch_id = request.args.get('branch_id', type=int)
+    if default_branch_id is None and current_user.role != 'owner':
+        default_branch_id = current_user.branch_id
+
+    max_rows = current_app.config.get('CUSTOMER_IMPORT_MAX_ROWS', 10000)
+    rows = islice(read_rows(request.stream, fmt), max_rows)
+
+    try:
+        summary = CustomerImportService.import_rows(
+            rows,
+            created_by_id=current_user.id,
+            default_branch_id=default_branch_id,
+            can_access_branch=current_user.has_branch_access,
+            batch_size=current_app.config.get('CUSTOMER_IMPORT_BATCH_SIZE', 500),
+            workers=current_app.config.get('CUSTOMER_IMPORT_HASH_WORKERS')
+        )
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'Request body must be UTF-8 text'}), 400
+
+    summary['truncated'] = summary['processed'] >= max_rows
+    status = 201 if summary['imported'] else 400
+    return jsonify(summary), status
+
+def customer_list_version(current_user):
+    """Conditional-GET version of the customers (with users and branches) visible to the user"""
+    if current_user.role == 'owner':
+        return row_version(Customer, related=(Customer.user, Customer.branch))
+    return row_version(Customer, Customer.branch_id == current_user.branch_id, related=(Customer.user, Customer.branch))
+
 @customer_bp.route('/', methods=['GET'])
+@query_budget(4)
 @require_staff()
+@conditional_get(customer_list_version)
 def list_customers(current_user):
     """List customers with filtering"""
-    query = Customer.query.join(User)
+    query = Customer.query.join(User).options(*Customer.load_options(include_branch=True))
     
     # Branch-based filtering for non-owners
     if current_user.role != 'owner':
@@ -132,29 +173,35 @@ def list_customers(current_user):
     if is_active is not None:
         query = query.filter(Customer.is_active == (is_active.lower() == 'true'))
     
-    # Search by name or member ID
+    # Search by member ID, name, email or phone; best matches first in page mode
+    use_cursor = cursor_requested(request.args)
     search = request.args.get('search')
     if search:
-        query = query.filter(
-            db.or_(
-                Customer.member_id.contains(search),
-                User.first_name.contains(search),
-                User.last_name.contains(search),
-                User.email.contains(search),
-                User.phone.contains(search)
-            )
-        )
-    
-    # Pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
+        query = SearchService.filter_customers(query, search, ranked=not use_cursor)
     
-    customers_paginated = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Pagination: page numbers by default, keyset on the customer id with ?cursor=
+    if use_cursor:
+        try:
+            customers, pagination = cursor_pagination(query, [Customer.id], request.args, 20, descending=False)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        customers_paginated = query.paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        customers = customers_paginated.items
+        pagination = {
+            'page': page,
+            'pages': customers_paginated.pages,
+            'per_page': per_page,
+            'total': customers_paginated.total
+        }
     
     customers_data = []
-    for customer in customers_paginated.items:
+    for customer in customers:
         customer_dict = customer.to_dict()
         customer_dict['user'] = customer.user.to_dict()
         customer_dict['branch'] = customer.branch.to_dict()
@@ -162,12 +209,7 @@ def list_customers(current_user):
     
     return jsonify({
         'customers': customers_data,
-        'pagination': {
-            'page': page,
-            'pages': customers_paginated.pages,
-            'per_page': per_page,
-            'total': customers_paginated.total
-        }
+        'pagination': pagination
     }), 200
 
 @customer_bp.route('/<int:customer_id>', methods=['GET'])
@@ -461,7 +503,8 @@ def mark_attendance():
 @validate_json_request('customer_id', 'qr_timestamp')
 def mark_attendance_by_qr(current_user):
     """Mark customer attendance by scanning QR code (staff only)"""
-    from app.models.attendance import Attendance
+    from app.models.attendance import Attendance, AttendanceValidation
+    from app.services.attendance_journal import attendance_recorder
     import json
     
     data = request.get_json()
@@ -530,6 +573,13 @@ def mark_attendance_by_qr(current_user):
             'check_in_time': existing_attendance.entry_time.strftime('%I:%M %p')
         }), 400
     
+    if attendance_recorder.active and attendance_recorder.pending_open_entries(customer_id, today):
+        return jsonify({
+            'error': 'Already attended today',
+            'message': 'تم تسجيل الحضور مسبقاً اليوم',
+            'customer_name': f"{customer.user.first_name} {customer.user.last_name}"
+        }), 400
+    
     try:
         # Create attendance record
         now = datetime.now()
@@ -546,10 +596,16 @@ def mark_attendance_by_qr(current_user):
             entry_method='manual',  # QR code scan
             processed_by_id=current_user.id  # Track who marked the attendance
         )
-        db.session.add(attendance)
-        print(f"DEBUG: Before commit")
-        db.session.commit()
-        print(f"DEBUG: After commit - Attendance ID: {attendance.id}")
+        attendance_data = {}
+        if attendance_recorder.active:
+            attendance.biometric_verified = False
+            attendance.access_granted = True
+            attendance_data['provisional_id'] = AttendanceValidation.queue_entry(attendance)['provisional_id']
+        else:
+            db.session.add(attendance)
+            print(f"DEBUG: Before commit")
+            db.session.commit()
+            print(f"DEBUG: After commit - Attendance ID: {attendance.id}")
         
         customer_name = f"{customer.user.first_name} {customer.user.last_name}"
         check_in_time = attendance.entry_time.strftime('%I:%M %p')
@@ -562,7 +618,8 @@ def mark_attendance_by_qr(current_user):
             'attendance': {
                 'id': attendance.id,
                 'entry_date': attendance.entry_date.isoformat(),
-                'entry_time': attendance.entry_time.isoformat()
+                'entry_time': attendance.entry_time.isoformat(),
+                **attendance_data
             }
         }), 200
         
@@ -1,21 +1,29 @@
 """Dashboard API routes for analytics and reporting"""
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import date, datetime, timedelta
 from sqlalchemy import func, and_, or_
 from app.database import db
 from app.models.user import User
 from app.models.customer import Customer
 from app.models.subscription import Subscription, SubscriptionPlan
-from app.models.payment import Payment
-from app.models.attendance import Attendance
 from app.models.complaint import Complaint
 from app.models.branch import Branch
+from app.models.alert_snapshot import AlertSnapshot
 from app.auth import require_staff, require_owner, require_manager_or_owner
+from app.services.dashboard_service import DashboardService, GRANULARITIES
+from app.services.alert_service import AlertService
+from app.services.notification_service import NotificationService
+from app.services.forecast_service import ForecastService
+from app.services.heatmap_service import HeatmapService
+from app.services.dashboard_cache import dashboard_cache, cached_dashboard, dashboard_version, user_scope
+from app.conditional import conditional_get
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/owner', methods=['GET'])
 @require_owner()
+@conditional_get(dashboard_version(user_scope))
+@cached_dashboard('owner', user_scope)
 def owner_dashboard(current_user):
     """Owner dashboard with system-wide analytics"""
     # Date range (default current month)
@@ -32,73 +40,15 @@ def owner_dashboard(current_user):
     else:
         end_date = today
     
-    # Revenue Summary
-    revenue_query = Payment.query.filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    )
-    
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).scalar() or 0
-    
-    # Revenue by branch
-    revenue_by_branch = db.session.query(
-        Branch.name,
-        Branch.code,
-        func.sum(Payment.amount).label('revenue'),
-        func.count(Payment.id).label('payments')
-    ).join(Payment).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).group_by(Branch.id).all()
-    
-    # Active Subscriptions by Branch
-    active_subs_by_branch = db.session.query(
-        Branch.name,
-        Branch.code,
-        func.count(Subscription.id).label('active_subscriptions')
-    ).join(Subscription).filter(
-        Subscription.status == 'active'
-    ).group_by(Branch.id).all()
-    
-    # New Customers This Month
-    new_customers = Customer.query.filter(
-        Customer.joined_date >= start_date,
-        Customer.joined_date <= end_date
-    ).count()
-    
-    # Expiring Subscriptions (next 7 days)
-    expiring_soon = Subscription.query.filter(
-        Subscription.status == 'active',
-        Subscription.end_date >= today,
-        Subscription.end_date <= today + timedelta(days=7)
-    ).count()
-    
-    # Attendance Statistics
-    total_attendance = Attendance.query.filter(
-        Attendance.entry_date >= start_date,
-        Attendance.entry_date <= end_date,
-        Attendance.access_granted == True
-    ).count()
-    
-    # Open Complaints
-    open_complaints = Complaint.query.filter(
-        Complaint.status.in_(['open', 'in_progress'])
-    ).count()
+    # One grouped query per table covers the summary, breakdowns and alerts
+    overview = DashboardService.owner_overview(start_date, end_date, today)
+    alert_counts = overview['alert_counts']
     
     # Critical Alerts
     alerts = []
     
     # High priority open complaints
-    critical_complaints = Complaint.query.filter(
-        Complaint.status.in_(['open', 'in_progress']),
-        Complaint.priority == 'critical'
-    ).count()
+    critical_complaints = alert_counts['critical_complaints']
     if critical_complaints > 0:
         alerts.append({
             'type': 'critical',
@@ -107,10 +57,7 @@ def owner_dashboard(current_user):
         })
     
     # Subscriptions expiring today
-    expiring_today = Subscription.query.filter(
-        Subscription.status == 'active',
-        Subscription.end_date == today
-    ).count()
+    expiring_today = alert_counts['expiring_today']
     if expiring_today > 0:
         alerts.append({
             'type': 'warning',
@@ -119,10 +66,7 @@ def owner_dashboard(current_user):
         })
     
     # Pending payments
-    pending_payments = Payment.query.filter(
-        Payment.status == 'pending',
-        Payment.payment_date >= today - timedelta(days=7)
-    ).count()
+    pending_payments = alert_counts['pending_payments']
     if pending_payments > 0:
         alerts.append({
             'type': 'info',
@@ -135,30 +79,16 @@ def owner_dashboard(current_user):
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat()
         },
-        'summary': {
-            'total_revenue': float(total_revenue),
-            'new_customers': new_customers,
-            'active_subscriptions': Subscription.query.filter_by(status='active').count(),
-            'total_attendance': total_attendance,
-            'expiring_subscriptions': expiring_soon,
-            'open_complaints': open_complaints
-        },
-        'revenue_by_branch': [{
-            'branch_name': row.name,
-            'branch_code': row.code,
-            'revenue': float(row.revenue),
-            'payments': row.payments
-        } for row in revenue_by_branch],
-        'subscriptions_by_branch': [{
-            'branch_name': row.name,
-            'branch_code': row.code,
-            'active_subscriptions': row.active_subscriptions
-        } for row in active_subs_by_branch],
+        'summary': overview['summary'],
+        'revenue_by_branch': overview['revenue_by_branch'],
+        'subscriptions_by_branch': overview['subscriptions_by_branch'],
         'alerts': alerts
     }), 200
 
 @dashboard_bp.route('/branch/<int:branch_id>', methods=['GET'])
 @require_manager_or_owner()
+@conditional_get(dashboard_version(lambda current_user, branch_id: branch_id))
+@cached_dashboard('branch', lambda current_user, branch_id: branch_id)
 def branch_dashboard(branch_id, current_user):
     """Branch-specific dashboard"""
     # Check branch access
@@ -181,121 +111,84 @@ def branch_dashboard(branch_id, current_user):
     else:
         end_date = today
     
-    # Branch Revenue
-    branch_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.branch_id == branch_id,
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).scalar() or 0
-    
-    # Monthly Target Progress
-    target_progress = 0
-    if branch.monthly_target:
-        target_progress = (float(branch_revenue) / float(branch.monthly_target)) * 100
-    
-    # Customer Statistics
-    total_customers = Customer.query.filter_by(branch_id=branch_id, is_active=True).count()
-    new_customers_period = Customer.query.filter(
-        Customer.branch_id == branch_id,
-        Customer.joined_date >= start_date,
-        Customer.joined_date <= end_date
-    ).count()
-    
-    # Subscription Statistics
-    active_subscriptions = Subscription.query.filter(
-        Subscription.branch_id == branch_id,
-        Subscription.status == 'active'
-    ).count()
+    # Every metric is computed with the grouped queries shared with /branches
+    payload = DashboardService.branch_dashboards([branch], start_date, end_date, today)[branch.id]
     
-    expiring_subscriptions = Subscription.query.filter(
-        Subscription.branch_id == branch_id,
-        Subscription.status == 'active',
-        Subscription.end_date >= today,
-        Subscription.end_date <= today + timedelta(days=7)
-    ).count()
-    
-    # Popular subscription plans
-    popular_plans = db.session.query(
-        SubscriptionPlan.name,
-        func.count(Subscription.id).label('count')
-    ).join(Subscription).filter(
-        Subscription.branch_id == branch_id,
-        Subscription.status.in_(['active', 'pending']),
-        Subscription.created_at >= start_date
-    ).group_by(SubscriptionPlan.id).order_by(func.count(Subscription.id).desc()).limit(5).all()
+    return jsonify(payload), 200
+
+# Server-side sort keys for the multi-branch dashboard
+BRANCH_SORT_KEYS = {
+    'revenue': lambda payload: payload['financial']['revenue'],
+    'target_progress': lambda payload: payload['financial']['target_progress_percent'],
+    'attendance': lambda payload: payload['attendance']['period_total']
+}
+
+@dashboard_bp.route('/branches', methods=['GET'])
+@require_owner()
+@conditional_get(dashboard_version(user_scope))
+@cached_dashboard('branches', user_scope)
+def branches_dashboard(current_user):
+    """Branch dashboards for several (default: all active) branches, ranked server-side"""
+    # Date range (default current month)
+    today = date.today()
+    start_date = request.args.get('start_date')
+    if start_date:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+    else:
+        start_date = today.replace(day=1)
     
-    # Attendance Statistics
-    today_attendance = Attendance.query.filter(
-        Attendance.branch_id == branch_id,
-        Attendance.entry_date == today,
-        Attendance.access_granted == True
-    ).count()
+    end_date = request.args.get('end_date')
+    if end_date:
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    else:
+        end_date = today
     
-    period_attendance = Attendance.query.filter(
-        Attendance.branch_id == branch_id,
-        Attendance.entry_date >= start_date,
-        Attendance.entry_date <= end_date,
-        Attendance.access_granted == True
-    ).count()
+    sort = request.args.get('sort', 'revenue')
+    if sort not in BRANCH_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(BRANCH_SORT_KEYS)}"}), 400
+    
+    order = request.args.get('order', 'desc')
+    if order not in ['asc', 'desc']:
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    
+    # Branch selection: ?branch_ids=1,2,3 or all active branches
+    branch_ids = request.args.get('branch_ids')
+    if branch_ids:
+        try:
+            branch_ids = {int(value) for value in branch_ids.split(',') if value.strip()}
+        except ValueError:
+            return jsonify({'error': 'branch_ids must be a comma-separated list of integers'}), 400
+        
+        branches = Branch.query.filter(Branch.id.in_(branch_ids)).all()
+        missing = sorted(branch_ids - {branch.id for branch in branches})
+        if missing:
+            return jsonify({'error': f"Branches not found: {', '.join(map(str, missing))}"}), 404
+    else:
+        branches = Branch.query.filter_by(is_active=True).all()
     
-    # Payment Method Breakdown
-    payment_methods = db.session.query(
-        Payment.payment_method,
-        func.count(Payment.id).label('count'),
-        func.sum(Payment.amount).label('amount')
-    ).filter(
-        Payment.branch_id == branch_id,
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).group_by(Payment.payment_method).all()
+    payloads = DashboardService.branch_dashboards(branches, start_date, end_date, today)
     
-    # Branch Complaints
-    open_complaints = Complaint.query.filter(
-        Complaint.branch_id == branch_id,
-        Complaint.status.in_(['open', 'in_progress'])
-    ).count()
+    # Ties keep branch id order regardless of direction
+    ranked = sorted(payloads.values(), key=lambda payload: payload['branch']['id'])
+    ranked.sort(key=BRANCH_SORT_KEYS[sort], reverse=(order == 'desc'))
+    for rank, payload in enumerate(ranked, start=1):
+        payload['rank'] = rank
     
     return jsonify({
-        'branch': branch.to_dict(),
         'period': {
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat()
         },
-        'financial': {
-            'revenue': float(branch_revenue),
-            'monthly_target': float(branch.monthly_target) if branch.monthly_target else 0,
-            'target_progress_percent': round(target_progress, 1)
-        },
-        'customers': {
-            'total_active': total_customers,
-            'new_this_period': new_customers_period
-        },
-        'subscriptions': {
-            'active': active_subscriptions,
-            'expiring_soon': expiring_subscriptions
-        },
-        'attendance': {
-            'today': today_attendance,
-            'period_total': period_attendance
-        },
-        'popular_plans': [{
-            'plan_name': row.name,
-            'subscription_count': row.count
-        } for row in popular_plans],
-        'payment_methods': [{
-            'method': row.payment_method,
-            'count': row.count,
-            'amount': float(row.amount)
-        } for row in payment_methods],
-        'complaints': {
-            'open': open_complaints
-        }
+        'sort': sort,
+        'order': order,
+        'count': len(ranked),
+        'branches': ranked
     }), 200
 
 @dashboard_bp.route('/accountant', methods=['GET'])
 @require_staff()
+@conditional_get(dashboard_version(user_scope))
+@cached_dashboard('accountant', user_scope, vary=lambda current_user: current_user.role)
 def accountant_dashboard(current_user):
     """Accountant dashboard for financial overview"""
     if current_user.role not in ['owner', 'branch_manager', 'accountant']:
@@ -315,56 +208,23 @@ def accountant_dashboard(current_user):
     else:
         end_date = today
     
-    # Base query for branch filtering
-    payment_query = Payment.query.filter(
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    )
+    if end_date < start_date:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
     
-    # Branch filtering for non-owners
-    if current_user.role != 'owner':
-        payment_query = payment_query.filter(Payment.branch_id == current_user.branch_id)
-    
-    # Financial Summary
-    completed_payments = payment_query.filter(Payment.status == 'completed')
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.id.in_(p.id for p in completed_payments)
-    ).scalar() or 0
-    
-    pending_amount = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.status == 'pending',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).scalar() or 0
-    
-    refunded_amount = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.status == 'refunded',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).scalar() or 0
-    
-    # Daily revenue breakdown
-    daily_revenue = db.session.query(
-        Payment.payment_date,
-        func.sum(Payment.amount).label('daily_total')
-    ).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    )
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"}), 400
     
-    if current_user.role != 'owner':
-        daily_revenue = daily_revenue.filter(Payment.branch_id == current_user.branch_id)
-    
-    daily_revenue = daily_revenue.group_by(Payment.payment_date).order_by(Payment.payment_date).all()
+    # Branch filtering for non-owners
+    branch_id = None if current_user.role == 'owner' else current_user.branch_id
     
-    # Cash reconciliation data
-    cash_payments = payment_query.filter(
-        Payment.payment_method == 'cash',
-        Payment.status == 'completed'
-    ).all()
+    # Financial summary and cash reconciliation in one aggregate query
+    totals = DashboardService.payment_totals(start_date, end_date, branch_id)
+    total_revenue = totals['total_revenue']
+    refunded_amount = totals['refunded_amount']
     
-    cash_total = sum(float(p.amount) for p in cash_payments)
+    # Revenue series bucketed in SQL, gap-filled, with the previous period alongside
+    revenue_series = DashboardService.revenue_series(start_date, end_date, granularity, branch_id)
     
     return jsonify({
         'period': {
@@ -373,22 +233,23 @@ def accountant_dashboard(current_user):
         },
         'financial_summary': {
             'total_revenue': float(total_revenue),
-            'pending_amount': float(pending_amount or 0),
-            'refunded_amount': float(refunded_amount or 0),
-            'net_revenue': float(total_revenue) - float(refunded_amount or 0)
+            'pending_amount': float(totals['pending_amount']),
+            'refunded_amount': float(refunded_amount),
+            'net_revenue': float(total_revenue) - float(refunded_amount)
         },
         'cash_reconciliation': {
-            'cash_payments_count': len(cash_payments),
-            'cash_total': cash_total
+            'cash_payments_count': totals['cash_count'],
+            'cash_total': float(totals['cash_total'])
         },
-        'daily_revenue': [{
-            'date': row.payment_date.isoformat(),
-            'amount': float(row.daily_total)
-        } for row in daily_revenue]
+        'granularity': revenue_series['granularity'],
+        'previous_period': revenue_series['previous_period'],
+        'daily_revenue': revenue_series['series']
     }), 200
 
 @dashboard_bp.route('/manager', methods=['GET'])
 @require_manager_or_owner()
+@conditional_get(dashboard_version(lambda current_user: current_user.branch_id))
+@cached_dashboard('manager', lambda current_user: current_user.branch_id)
 def manager_dashboard(current_user):
     """Branch manager dashboard - shows their branch data"""
     if not current_user.branch_id:
@@ -412,13 +273,11 @@ def manager_dashboard(current_user):
     else:
         end_date = today
 
+    # Revenue, attendance and signups from the branch daily rollup
+    rollup = DashboardService.branch_rollup(branch_id, start_date, end_date, today)
+
     # Branch Revenue
-    branch_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.branch_id == branch_id,
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).scalar() or 0
+    branch_revenue = rollup['revenue']
 
     # Monthly Target Progress
     target_progress = 0
@@ -429,11 +288,7 @@ def manager_dashboard(current_user):
     total_customers = Customer.query.filter_by(branch_id=branch_id).filter(
         Customer.user.has(is_active=True)
     ).count()
-    new_customers_period = Customer.query.filter(
-        Customer.branch_id == branch_id,
-        Customer.joined_date >= start_date,
-        Customer.joined_date <= end_date
-    ).count()
+    new_customers_period = rollup['new_customers']
 
     # Subscription Statistics
     active_subscriptions = Subscription.query.filter(
@@ -459,30 +314,12 @@ def manager_dashboard(current_user):
     ).group_by(SubscriptionPlan.id).order_by(func.count(Subscription.id).desc()).limit(5).all()
 
     # Attendance Statistics
-    today_attendance = Attendance.query.filter(
-        Attendance.branch_id == branch_id,
-        Attendance.entry_date == today,
-        Attendance.access_granted == True
-    ).count()
+    today_attendance = rollup['granted_today']
 
-    period_attendance = Attendance.query.filter(
-        Attendance.branch_id == branch_id,
-        Attendance.entry_date >= start_date,
-        Attendance.entry_date <= end_date,
-        Attendance.access_granted == True
-    ).count()
+    period_attendance = rollup['granted']
 
     # Payment Method Breakdown
-    payment_methods = db.session.query(
-        Payment.payment_method,
-        func.count(Payment.id).label('count'),
-        func.sum(Payment.amount).label('amount')
-    ).filter(
-        Payment.branch_id == branch_id,
-        Payment.status == 'completed',
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date
-    ).group_by(Payment.payment_method).all()
+    payment_methods = DashboardService.payment_method_breakdown(rollup)
 
     # Branch Complaints
     open_complaints = Complaint.query.filter(
@@ -517,11 +354,7 @@ def manager_dashboard(current_user):
             'plan_name': row.name,
             'subscription_count': row.count
         } for row in popular_plans],
-        'payment_methods': [{
-            'method': row.payment_method,
-            'count': row.count,
-            'amount': float(row.amount)
-        } for row in payment_methods],
+        'payment_methods': payment_methods,
         'complaints': {
             'open': open_complaints
         }
@@ -529,6 +362,8 @@ def manager_dashboard(current_user):
 
 @dashboard_bp.route('/staff', methods=['GET'])
 @require_staff()
+@conditional_get(dashboard_version(lambda current_user: current_user.branch_id))
+@cached_dashboard('staff', lambda current_user: current_user.branch_id, vary=lambda current_user: current_user.role)
 def staff_dashboard(current_user):
     """Staff dashboard for receptionists and accountants"""
     if not current_user.branch_id:
@@ -550,12 +385,11 @@ def staff_dashboard(current_user):
 
     branch_id = current_user.branch_id
 
+    # Today's attendance, revenue and signups from the branch daily rollup
+    rollup = DashboardService.branch_rollup(branch_id, today, today, today)
+
     # Today's attendance
-    today_attendance = Attendance.query.filter(
-        Attendance.branch_id == branch_id,
-        Attendance.entry_date == today,
-        Attendance.access_granted == True
-    ).count()
+    today_attendance = rollup['granted_today']
 
     # Active customers
     active_customers = Customer.query.filter(
@@ -572,11 +406,7 @@ def staff_dashboard(current_user):
     # Today's revenue (for accountants)
     today_revenue = 0
     if current_user.role in ['accountant', 'branch_manager']:
-        today_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.branch_id == branch_id,
-            Payment.status == 'completed',
-            Payment.payment_date == today
-        ).scalar() or 0
+        today_revenue = rollup['revenue_today']
 
     # Pending tasks
     pending_complaints = Complaint.query.filter(
@@ -585,10 +415,7 @@ def staff_dashboard(current_user):
     ).count()
 
     # New customers today
-    new_customers = Customer.query.filter(
-        Customer.branch_id == branch_id,
-        Customer.joined_date == today
-    ).count()
+    new_customers = rollup['new_customers_today']
 
     return jsonify({
         'period': {
@@ -604,87 +431,118 @@ def staff_dashboard(current_user):
         'branch_id': branch_id
     }), 200
 
-@dashboard_bp.route('/alerts', methods=['GET'])
-@require_staff()
-def get_alerts(current_user):
-    """Get system alerts and notifications"""
-    alerts = []
-    today = date.today()
+@dashboard_bp.route('/projection', methods=['GET'])
+@require_manager_or_owner()
+@conditional_get(dashboard_version(user_scope))
+@cached_dashboard('projection', user_scope)
+def revenue_projection(current_user):
+    """Projected month-end revenue vs monthly target for every visible branch"""
+    try:
+        weeks = int(request.args.get('weeks', 8))
+    except ValueError:
+        return jsonify({'error': 'weeks must be an integer'}), 400
+    if not 1 <= weeks <= 52:
+        return jsonify({'error': 'weeks must be between 1 and 52'}), 400
     
     # Branch filtering for non-owners
-    branch_filter = {}
-    if current_user.role != 'owner':
-        branch_filter['branch_id'] = current_user.branch_id
-    
-    # Expiring subscriptions
-    expiring_subscriptions = Subscription.query.filter(
-        Subscription.status == 'active',
-        Subscription.end_date >= today,
-        Subscription.end_date <= today + timedelta(days=3)
-    )
-    
-    if current_user.role != 'owner':
-        expiring_subscriptions = expiring_subscriptions.filter(
-            Subscription.branch_id == current_user.branch_id
-        )
-    
-    expiring_count = expiring_subscriptions.count()
-    if expiring_count > 0:
-        alerts.append({
-            'type': 'warning',
-            'category': 'subscriptions',
-            'title': 'Subscriptions Expiring Soon',
-            'message': f"{expiring_count} subscriptions expire in the next 3 days",
-            'count': expiring_count,
-            'priority': 'medium'
-        })
-    
-    # Pending payments older than 2 days
-    old_pending_payments = Payment.query.filter(
-        Payment.status == 'pending',
-        Payment.created_at <= datetime.utcnow() - timedelta(days=2)
-    )
-    
-    if current_user.role != 'owner':
-        old_pending_payments = old_pending_payments.filter(
-            Payment.branch_id == current_user.branch_id
-        )
-    
-    pending_count = old_pending_payments.count()
-    if pending_count > 0:
-        alerts.append({
-            'type': 'warning',
-            'category': 'payments',
-            'title': 'Pending Payments',
-            'message': f"{pending_count} payments have been pending for 2+ days",
-            'count': pending_count,
-            'priority': 'medium'
-        })
-    
-    # High priority complaints
-    high_priority_complaints = Complaint.query.filter(
-        Complaint.status.in_(['open', 'in_progress']),
-        Complaint.priority.in_(['high', 'critical'])
-    )
+    branch_ids = None if current_user.role == 'owner' else [current_user.branch_id]
     
+    return jsonify(ForecastService.month_end_projection(weeks=weeks, branch_ids=branch_ids)), 200
+
+@dashboard_bp.route('/heatmap', methods=['GET'])
+@require_manager_or_owner()
+def occupancy_heatmap(current_user):
+    """Weekday x hour visit counts and occupancy over recent complete weeks"""
+    try:
+        weeks = int(request.args.get('weeks', 4))
+    except ValueError:
+        return jsonify({'error': 'weeks must be an integer'}), 400
+    if not 1 <= weeks <= 26:
+        return jsonify({'error': 'weeks must be between 1 and 26'}), 400
+    
+    # Owners: ?branch_ids=1,2,3 or all active branches; others: their own branch
     if current_user.role != 'owner':
-        high_priority_complaints = high_priority_complaints.filter(
-            Complaint.branch_id == current_user.branch_id
-        )
-    
-    complaint_count = high_priority_complaints.count()
-    if complaint_count > 0:
-        alerts.append({
-            'type': 'error',
-            'category': 'complaints',
-            'title': 'High Priority Complaints',
-            'message': f"{complaint_count} high/critical priority complaints need attention",
-            'count': complaint_count,
-            'priority': 'high'
-        })
-    
+        branches = Branch.query.filter_by(id=current_user.branch_id).all()
+    elif request.args.get('branch_ids'):
+        try:
+            branch_ids = {int(value) for value in request.args['branch_ids'].split(',') if value.strip()}
+        except ValueError:
+            return jsonify({'error': 'branch_ids must be a comma-separated list of integers'}), 400
+        branches = Branch.query.filter(Branch.id.in_(branch_ids)).order_by(Branch.id).all()
+    else:
+        branches = Branch.query.filter_by(is_active=True).order_by(Branch.id).all()
+    
+    config = current_app.config
+    return jsonify(HeatmapService.branch_heatmaps(
+        branches,
+        weeks=weeks,
+        default_visit_minutes=config.get('HEATMAP_DEFAULT_VISIT_MINUTES', 60),
+        ttl=config.get('HEATMAP_CACHE_TTL', 3600),
+        max_entries=config.get('HEATMAP_CACHE_MAX_ENTRIES', 2048)
+    )), 200
+
+def alert_snapshot_version(current_user):
+    """Conditional-GET version of the caller's alert snapshot"""
+    if request.args.get('refresh', 'false').lower() == 'true':
+        return None
+    
+    if current_user.role != 'owner' and current_user.branch_id is None:
+        return None
+    
+    branch_id = None if current_user.role == 'owner' else current_user.branch_id
+    generated_at = db.session.query(AlertSnapshot.generated_at).filter_by(
+        scope=AlertSnapshot.scope_for(branch_id)
+    ).scalar()
+    
+    # Missing or stale snapshots are rebuilt by the view, so let it run
+    max_age = 2 * current_app.config.get('ALERT_SNAPSHOT_INTERVAL', 300)
+    if generated_at is None or generated_at < datetime.utcnow() - timedelta(seconds=max_age):
+        return None
+    return generated_at.isoformat(), generated_at
+
+@dashboard_bp.route('/alerts', methods=['GET'])
+@require_staff()
+@conditional_get(alert_snapshot_version)
+def get_alerts(current_user):
+    """Get system alerts from the latest precomputed snapshot"""
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    if refresh:
+        if current_user.role != 'owner':
+            return jsonify({'error': 'Only owners can force an alert refresh'}), 403
+        AlertService.refresh_snapshots()
+    
+    # Owners see system-wide alerts; everyone else their branch's (none without a branch)
+    if current_user.role != 'owner' and current_user.branch_id is None:
+        return jsonify({'alerts': [], 'total': 0, 'generated_at': None, 'age_seconds': 0}), 200
+    branch_id = None if current_user.role == 'owner' else current_user.branch_id
+    
+    # Snapshots older than two refresh intervals mean the worker is behind
+    max_age = 2 * current_app.config.get('ALERT_SNAPSHOT_INTERVAL', 300)
+    snapshot = AlertService.get_snapshot(branch_id, max_age=max_age)
+    
+    alerts = snapshot.alerts
     return jsonify({
         'alerts': alerts,
         'total': len(alerts),
-        'generated_at': datetime.utcnow().isoformat()
+        'generated_at': snapshot.generated_at.isoformat(),
+        'age_seconds': int((datetime.utcnow() - snapshot.generated_at).total_seconds())
     }), 200
+
+@dashboard_bp.route('/alerts/live', methods=['GET'])
+@require_staff()
+def get_live_alerts(current_user):
+    """Alerts computed now, with the alert groups run in parallel
+    
+    Groups that do not finish within ``NOTIFICATION_GROUP_TIMEOUT`` are left
+    out and the response is flagged ``degraded``.
+    """
+    if current_user.role != 'owner' and current_user.branch_id is None:
+        return jsonify({'alerts': [], 'total': 0, 'degraded': False, 'timed_out': [], 'failed': []}), 200
+    branch_id = None if current_user.role == 'owner' else current_user.branch_id
+    return jsonify(NotificationService.get_all_alerts(branch_id, parallel=True)), 200
+
+@dashboard_bp.route('/cache/stats', methods=['GET'])
+@require_owner()
+def cache_stats(current_user):
+    """Dashboard cache hit/miss counters for this worker"""
+    return jsonify(dashboard_cache.stats()), 200
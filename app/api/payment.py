@@ -6,18 +6,12 @@ from app.models.payment import Payment, PaymentAuditLog
 from app.models.subscription import Subscription
 from app.models.customer import Customer
 from app.auth import require_staff, require_accountant_or_above, validate_json_request
-import secrets
-import string
+from app.query_budget import query_budget
+from app.pagination import InvalidCursor, cursor_pagination, cursor_requested
+from app.services.id_allocator import id_allocator
 
 payment_bp = Blueprint('payment', __name__)
 
-def generate_payment_number():
-    """Generate unique payment number"""
-    today = date.today()
-    date_part = today.strftime('%y%m%d')
-    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-    return f"PAY{date_part}{random_part}"
-
 @payment_bp.route('/', methods=['POST'])
 @require_staff()
 @validate_json_request('customer_id', 'amount', 'payment_method')
@@ -51,9 +45,7 @@ def create_payment(current_user):
             print(f"[PAYMENT DEBUG] Found subscription: {subscription.subscription_number}")
         
         # Generate payment number
-        payment_number = generate_payment_number()
-        while Payment.query.filter_by(payment_number=payment_number).first():
-            payment_number = generate_payment_number()
+        payment_number = id_allocator.payment_number()
         
         print(f"[PAYMENT DEBUG] Generated payment number: {payment_number}")
         
@@ -141,10 +133,13 @@ def process_payment(payment_id, current_user):
         return jsonify({'error': message}), 400
 
 @payment_bp.route('/', methods=['GET'])
+@query_budget(3)
 @require_staff()
 def list_payments(current_user):
     """List payments with filtering"""
-    query = Payment.query.join(Customer)
+    query = Payment.query.join(Customer).options(
+        *Payment.load_options(include_customer=True, include_subscription=True)
+    )
     
     # Branch-based filtering for non-owners
     if current_user.role != 'owner':
@@ -176,27 +171,35 @@ def list_payments(current_user):
     if end_date:
         query = query.filter(Payment.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
     
-    # Pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
-    
-    payments_paginated = query.order_by(Payment.payment_time.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Pagination: page numbers by default, keyset on payment_time, then id with ?cursor=
+    if cursor_requested(request.args):
+        try:
+            payments, pagination = cursor_pagination(query, [Payment.payment_time, Payment.id], request.args, 20)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        payments_paginated = query.order_by(Payment.payment_time.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        payments = payments_paginated.items
+        pagination = {
+            'page': page,
+            'pages': payments_paginated.pages,
+            'per_page': per_page,
+            'total': payments_paginated.total
+        }
     
     payments_data = []
-    for payment in payments_paginated.items:
+    for payment in payments:
         payment_dict = payment.to_dict(include_customer=True, include_subscription=True)
         payments_data.append(payment_dict)
     
     return jsonify({
         'payments': payments_data,
-        'pagination': {
-            'page': page,
-            'pages': payments_paginated.pages,
-            'per_page': per_page,
-            'total': payments_paginated.total
-        }
+        'pagination': pagination
     }), 200
 
 @payment_bp.route('/<int:payment_id>', methods=['GET'])
@@ -6,7 +6,7 @@ from app.models.subscription import Subscription
 from app.models.branch import Branch
 from app.models.payment import Payment
 from app.services.paymob_service import PaymobService
-from app.api.subscription import generate_subscription_number
+from app.services.id_allocator import id_allocator
 from app.auth import require_customer, require_staff
 from datetime import datetime
 
@@ -64,8 +64,7 @@ def initiate_payment(current_user):
             return jsonify({'error': 'Failed to initiate payment with Paymob'}), 500
         
         # Store pending payment in database
-        from app.api.payment import generate_payment_number
-        payment_number = generate_payment_number()
+        payment_number = id_allocator.payment_number()
         
         payment = Payment(
             payment_number=payment_number,
@@ -151,12 +150,13 @@ def payment_callback():
                     plan_duration = int(parts[0].split(':')[1])
                     plan_name = parts[1].split(':')[1] if len(parts) > 1 else 'Subscription'
                     
-                    # Generate subscription number
-                    branch = None
-                    if payment.branch_id:
-                        branch = Branch.query.get(payment.branch_id)
-                    branch_code = branch.code if branch else 'GEN'
-                    sub_number = generate_subscription_number(branch_code)
+                    # Generate subscription number (before the payment update is flushed)
+                    with db.session.no_autoflush:
+                        branch = None
+                        if payment.branch_id:
+                            branch = Branch.query.get(payment.branch_id)
+                        branch_code = branch.code if branch else 'GEN'
+                        sub_number = id_allocator.subscription_number(branch_code)
                     
                     # Find a suitable plan_id (first active plan or create a default)
                     from app.models.subscription import SubscriptionPlan
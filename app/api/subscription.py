@@ -6,19 +6,14 @@ from app.models.subscription import SubscriptionPlan, Subscription, Subscription
 from app.models.customer import Customer
 from app.models.branch import Branch
 from app.auth import require_staff, require_receptionist_or_above, require_owner, validate_json_request
+from app.query_budget import query_budget
+from app.pagination import InvalidCursor, cursor_pagination, cursor_requested
+from app.conditional import conditional_get, row_version
+from app.services.id_allocator import id_allocator
 from flask_jwt_extended import jwt_required
-import secrets
-import string
 
 subscription_bp = Blueprint('subscription', __name__)
 
-def generate_subscription_number(branch_code):
-    """Generate unique subscription number"""
-    today = date.today()
-    date_part = today.strftime('%y%m%d')
-    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-    return f"SUB{branch_code}{date_part}{random_part}"
-
 # Public endpoint for customers to view available plans
 @subscription_bp.route('/plans/public', methods=['GET'])
 @jwt_required()
@@ -34,6 +29,7 @@ def list_public_plans():
 # Subscription Plans
 @subscription_bp.route('/plans', methods=['GET'])
 @require_staff()
+@conditional_get(lambda current_user: row_version(SubscriptionPlan, SubscriptionPlan.is_active == True))
 def list_subscription_plans(current_user):
     """List all subscription plans"""
     plans = SubscriptionPlan.query.filter_by(is_active=True).all()
@@ -130,9 +126,7 @@ def create_subscription(current_user):
     
     # Generate subscription number
     branch = Branch.query.get(customer.branch_id)
-    subscription_number = generate_subscription_number(branch.code)
-    while Subscription.query.filter_by(subscription_number=subscription_number).first():
-        subscription_number = generate_subscription_number(branch.code)
+    subscription_number = id_allocator.subscription_number(branch.code)
     
     # Create subscription
     subscription = Subscription(
@@ -161,10 +155,13 @@ def create_subscription(current_user):
         return jsonify({'error': 'Failed to create subscription', 'details': str(e)}), 500
 
 @subscription_bp.route('/', methods=['GET'])
+@query_budget(4)
 @require_staff()
 def list_subscriptions(current_user):
     """List subscriptions with filtering"""
-    query = Subscription.query.join(Customer)
+    query = Subscription.query.join(Customer).options(
+        *Subscription.load_options(include_details=True, include_customer=True)
+    )
     
     # Branch-based filtering for non-owners
     if current_user.role != 'owner':
@@ -192,16 +189,29 @@ def list_subscriptions(current_user):
     if end_date:
         query = query.filter(Subscription.end_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
     
-    # Pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
-    
-    subscriptions_paginated = query.order_by(Subscription.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Pagination: page numbers by default, keyset on created_at, then id with ?cursor=
+    if cursor_requested(request.args):
+        try:
+            subscriptions, pagination = cursor_pagination(query, [Subscription.created_at, Subscription.id], request.args, 20)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        subscriptions_paginated = query.order_by(Subscription.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        subscriptions = subscriptions_paginated.items
+        pagination = {
+            'page': page,
+            'pages': subscriptions_paginated.pages,
+            'per_page': per_page,
+            'total': subscriptions_paginated.total
+        }
     
     subscriptions_data = []
-    for subscription in subscriptions_paginated.items:
+    for subscription in subscriptions:
         sub_dict = subscription.to_dict(include_details=True)
         sub_dict['customer'] = {
             'member_id': subscription.customer.member_id,
@@ -211,12 +221,7 @@ def list_subscriptions(current_user):
     
     return jsonify({
         'subscriptions': subscriptions_data,
-        'pagination': {
-            'page': page,
-            'pages': subscriptions_paginated.pages,
-            'per_page': per_page,
-            'total': subscriptions_paginated.total
-        }
+        'pagination': pagination
     }), 200
 
 @subscription_bp.route('/<int:subscription_id>', methods=['GET'])
@@ -368,9 +373,7 @@ def renew_subscription(subscription_id, current_user):
     
     # Generate new subscription number
     branch = Branch.query.get(old_subscription.branch_id)
-    subscription_number = generate_subscription_number(branch.code)
-    while Subscription.query.filter_by(subscription_number=subscription_number).first():
-        subscription_number = generate_subscription_number(branch.code)
+    subscription_number = id_allocator.subscription_number(branch.code)
     
     # Create new subscription
     new_subscription = Subscription(
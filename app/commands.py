@@ -0,0 +1,74 @@
+"""Maintenance CLI commands"""
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+
+def _parse_date(value):
+    """Parse an optional YYYY-MM-DD option"""
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+@click.command('rebuild-rollups')
+@click.option('--start-date', default=None, help='First day to rebuild (YYYY-MM-DD); defaults to all history')
+@click.option('--end-date', default=None, help='Last day to rebuild (YYYY-MM-DD); defaults to all history')
+@with_appcontext
+def rebuild_rollups(start_date, end_date):
+    """Backfill branch_daily_stats from payment, attendance and customer history"""
+    from app.services.rollup_service import RollupService
+
+    rows = RollupService.rebuild(_parse_date(start_date), _parse_date(end_date))
+    print(f"Rebuilt {rows} branch/day rollup rows.")
+
+@click.command('archive-attendance')
+@click.option('--before', default=None, help='Archive entries before this day (YYYY-MM-DD); defaults to the configured horizon')
+@click.option('--batch-size', default=None, type=int, help='Rows moved per transaction')
+@with_appcontext
+def archive_attendance(before, batch_size):
+    """Move old attendance rows to attendance_archive and update monthly summaries"""
+    from flask import current_app
+    from app.services.archive_service import ArchiveService
+
+    cutoff = _parse_date(before) or ArchiveService.archive_cutoff(
+        current_app.config.get('ATTENDANCE_ARCHIVE_HORIZON_DAYS', 365)
+    )
+    batch_size = batch_size or current_app.config.get('ATTENDANCE_ARCHIVE_BATCH_SIZE', 5000)
+    moved = ArchiveService.archive_attendance(cutoff, batch_size)
+    print(f"Archived {moved} attendance rows dated before {cutoff.isoformat()}.")
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index():
+    """Recompute the customer search index from customers and users"""
+    from app.services.search_service import SearchService
+
+    indexed = SearchService.rebuild()
+    print(f"Indexed {indexed} customers for search.")
+
+@click.command('import-customers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None, help='Defaults from the file extension')
+@click.option('--branch-id', default=None, type=int, help='Branch for rows without a branch_id')
+@click.option('--batch-size', default=None, type=int, help='Rows inserted per transaction')
+@with_appcontext
+def import_customers(path, fmt, branch_id, batch_size):
+    """Create customers from a CSV or NDJSON file, reporting rows that fail"""
+    from flask import current_app
+    from app.services.import_service import CustomerImportService, read_rows
+
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        summary = CustomerImportService.import_rows(
+            read_rows(source, fmt),
+            default_branch_id=branch_id,
+            batch_size=batch_size or current_app.config.get('CUSTOMER_IMPORT_BATCH_SIZE', 500),
+            workers=current_app.config.get('CUSTOMER_IMPORT_HASH_WORKERS')
+        )
+    for error in summary['errors']:
+        print(f"Row {error['row']}: {error['error']}")
+    print(f"Imported {summary['imported']} of {summary['processed']} rows ({summary['failed']} failed).")
+
+def register_commands(app):
+    """Register maintenance CLI commands with Flask app"""
+    app.cli.add_command(rebuild_rollups)
+    app.cli.add_command(archive_attendance)
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(import_customers)
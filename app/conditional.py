@@ -0,0 +1,93 @@
+"""Conditional GET (ETag / Last-Modified) support
+
+Views declare a cheap version function; when the client already holds the
+representation for the current version the view is skipped entirely and
+a bodyless 304 is returned.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import request, current_app
+from sqlalchemy import func
+from app.database import db
+
+
+def conditional_get(version):
+    """Answer GETs with 304 Not Modified when the client's copy is current
+
+    ``version(current_user, **view_kwargs)`` returns ``(token, last_modified)``
+    describing the data behind the response, or ``None`` to skip conditional
+    handling for this request. The ETag also covers the path, query string
+    and the user's role and branch, so differently scoped payloads never
+    share a tag.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            current_user = kwargs['current_user']
+            view_kwargs = {name: value for name, value in kwargs.items() if name != 'current_user'}
+            validator = version(current_user, **view_kwargs)
+            if validator is None:
+                return f(*args, **kwargs)
+
+            token, last_modified = validator
+            query = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+            etag = hashlib.md5(
+                f'{request.path}?{query}|{current_user.role}|{current_user.branch_id}|{token}'.encode('utf-8')
+            ).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (
+                    last_modified is not None and request.if_modified_since is not None and
+                    last_modified <= request.if_modified_since.replace(tzinfo=None)
+                )
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Clients may store the payload but must revalidate before reuse
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def row_version(model, *criteria, related=()):
+    """Version of a set of rows: row count plus newest updated_at
+
+    ``related`` relationships (e.g. ``Customer.user``) are joined in order
+    and the newest updated_at of their targets is included too, for
+    payloads that embed them.
+    Returns ``(token, last_modified)`` from a single query.
+    """
+    targets = [relationship.property.mapper.class_ for relationship in related]
+    query = db.session.query(
+        func.count(model.id),
+        func.max(model.updated_at),
+        *[func.max(target.updated_at) for target in targets]
+    ).select_from(model)
+    for relationship in related:
+        query = query.join(relationship)
+    if criteria:
+        query = query.filter(*criteria)
+
+    count, *timestamps = query.one()
+    # SQLite may hand back aggregated datetimes as strings
+    timestamps = [
+        datetime.fromisoformat(value) if isinstance(value, str) else value
+        for value in timestamps
+    ]
+    known = [value for value in timestamps if value is not None]
+    token = f"{count}:{':'.join(value.isoformat() if value else '-' for value in timestamps)}"
+    return token, max(known) if known else None
@@ -0,0 +1,44 @@
+"""Alert snapshot model for precomputed dashboard alerts"""
+import json
+from datetime import datetime
+from app.database import db
+
+SYSTEM_SCOPE = 'all'
+
+class AlertSnapshot(db.Model):
+    """Latest computed alerts for one branch, or system-wide when branch_id is NULL"""
+    __tablename__ = 'alert_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # 'all' or 'branch:<id>'; unique where a nullable branch_id could not be (NULLs never clash)
+    scope = db.Column(db.String(20), nullable=False, unique=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON list of alerts
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    @staticmethod
+    def scope_for(branch_id):
+        """Scope key of a branch's snapshot (None: system-wide)"""
+        return SYSTEM_SCOPE if branch_id is None else f'branch:{branch_id}'
+    
+    @property
+    def alerts(self):
+        """Decoded alert list"""
+        return json.loads(self.payload) if self.payload else []
+    
+    @alerts.setter
+    def alerts(self, value):
+        self.payload = json.dumps(value)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        alerts = self.alerts
+        return {
+            'branch_id': self.branch_id,
+            'alerts': alerts,
+            'total': len(alerts),
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<AlertSnapshot branch={self.branch_id or "all"} {self.generated_at}>'
@@ -1,10 +1,19 @@
 """Attendance model for gym entry tracking"""
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.orm import joinedload
 from app.database import db
 
 class Attendance(db.Model):
     """Customer attendance records"""
     __tablename__ = 'attendance'
+    __table_args__ = (
+        # Branch listings and daily rollups
+        db.Index('ix_attendance_branch_entry_date', 'branch_id', 'entry_date'),
+        # Eligibility (open entry today) and customer history
+        db.Index('ix_attendance_customer_entry_date', 'customer_id', 'entry_date'),
+        # Today's attendance across branches (occupancy, denied counts)
+        db.Index('ix_attendance_entry_date_access', 'entry_date', 'access_granted'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -63,6 +72,16 @@ class Attendance(db.Model):
         self.exit_time = exit_time
         return True, "Exit marked successfully"
     
+    @classmethod
+    def load_options(cls, include_customer=False):
+        """Loader options for the relationships ``to_dict`` reads with the same flags"""
+        from app.models.customer import Customer
+        
+        options = []
+        if include_customer:
+            options.append(joinedload(cls.customer).joinedload(Customer.user))
+        return options
+    
     def to_dict(self, include_customer=False):
         """Convert to dictionary"""
         data = {
@@ -94,56 +113,463 @@ class Attendance(db.Model):
         return f'<Attendance {self.customer.member_id} - {self.entry_date} {self.entry_time}>'
 
 
+class AttendanceArchive(db.Model):
+    """Attendance rows older than the archive horizon
+    
+    Same columns as ``attendance``; rows are moved here by
+    ``ArchiveService.archive_attendance`` and keep their original ids.
+    """
+    __tablename__ = 'attendance_archive'
+    __table_args__ = (
+        db.Index('ix_attendance_archive_customer_entry_date', 'customer_id', 'entry_date'),
+        db.Index('ix_attendance_archive_branch_entry_date', 'branch_id', 'entry_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    customer = db.relationship('Customer')
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False)
+    entry_date = db.Column(db.Date, nullable=False)
+    entry_time = db.Column(db.Time, nullable=False)
+    exit_time = db.Column(db.Time)
+    entry_method = db.Column(db.Enum('biometric', 'manual', 'card', name='entry_methods'), default='manual')
+    biometric_verified = db.Column(db.Boolean, default=False)
+    access_granted = db.Column(db.Boolean, nullable=False)
+    denial_reason = db.Column(db.String(200))
+    processed_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    calculate_duration = Attendance.calculate_duration
+    to_dict = Attendance.to_dict
+
+
+class AttendanceMonthlySummary(db.Model):
+    """Per-customer, per-month totals of archived attendance"""
+    __tablename__ = 'attendance_monthly_summary'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'month', name='uq_attendance_monthly_summary_customer_month'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    visits = db.Column(db.Integer, default=0, nullable=False)  # Granted entries
+    denied_entries = db.Column(db.Integer, default=0, nullable=False)
+    total_duration_minutes = db.Column(db.Float, default=0, nullable=False)
+    timed_visits = db.Column(db.Integer, default=0, nullable=False)  # Visits with an exit time and a non-zero duration
+    first_visit = db.Column(db.Date)
+    last_visit = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'customer_id': self.customer_id,
+            'month': self.month.strftime('%Y-%m') if self.month else None,
+            'visits': self.visits,
+            'denied_entries': self.denied_entries,
+            'average_duration_minutes': round(self.total_duration_minutes / self.timed_visits, 1) if self.timed_visits else 0,
+            'first_visit': self.first_visit.isoformat() if self.first_visit else None,
+            'last_visit': self.last_visit.isoformat() if self.last_visit else None
+        }
+
+
+class AttendanceIngestKey(db.Model):
+    """Idempotency key of an entry replayed by a door controller
+    
+    One row per (customer, device, client timestamp); replaying the same
+    swipe returns the attendance record created the first time.
+    """
+    __tablename__ = 'attendance_ingest_keys'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'device_id', 'client_timestamp', name='uq_attendance_ingest_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    device_id = db.Column(db.String(64), nullable=False)
+    client_timestamp = db.Column(db.DateTime, nullable=False)
+    
+    attendance_id = db.Column(db.Integer, db.ForeignKey('attendance.id'), nullable=False)
+    attendance = db.relationship('Attendance')
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class AttendanceValidation:
     """Service class for attendance validation logic"""
     
     @staticmethod
-    def validate_entry(customer_id, branch_id=None):
-        """Validate if customer can enter the gym"""
+    def load_access_record(customer_id):
+        """Load what an access decision needs for one customer in one joined query
+        
+        Returns ``None`` when the customer does not exist, otherwise a dict
+        with the customer's status and summary, its active subscriptions
+        (``{id: (branch_id, start, end, freeze_start, freeze_end)}``) and
+        the ids of today's open entries.
+        """
         from app.models.customer import Customer
         from app.models.subscription import Subscription
+        from app.models.user import User
         
-        customer = Customer.query.get(customer_id)
-        if not customer:
-            return False, "Customer not found"
+        today = date.today()
+        open_entry = db.aliased(Attendance)
+        rows = db.session.query(
+            Customer.is_active,
+            Customer.member_id,
+            Customer.branch_id,
+            Customer.user_id,
+            User.first_name,
+            User.last_name,
+            Subscription.id.label('subscription_id'),
+            Subscription.branch_id.label('subscription_branch_id'),
+            Subscription.start_date,
+            Subscription.end_date,
+            Subscription.current_freeze_start,
+            Subscription.current_freeze_end,
+            open_entry.id.label('open_entry_id')
+        ).join(User, Customer.user_id == User.id).outerjoin(Subscription, db.and_(
+            Subscription.customer_id == Customer.id,
+            Subscription.status == 'active',
+            Subscription.start_date <= today,
+            Subscription.end_date >= today
+        )).outerjoin(open_entry, db.and_(
+            open_entry.customer_id == Customer.id,
+            open_entry.entry_date == today,
+            open_entry.access_granted == True,
+            open_entry.exit_time.is_(None)
+        )).filter(Customer.id == customer_id).all()
         
-        if not customer.is_active:
-            return False, "Customer account is inactive"
+        if not rows:
+            return None
         
-        # Check for active subscription
-        active_subscription = Subscription.query.filter_by(
-            customer_id=customer_id,
-            status='active'
+        first = rows[0]
+        return {
+            'customer_id': customer_id,
+            'is_active': first.is_active,
+            'branch_id': first.branch_id,
+            'user_id': first.user_id,
+            'customer': {
+                'member_id': first.member_id,
+                'name': f"{first.first_name} {first.last_name}"
+            },
+            'subscriptions': {
+                row.subscription_id: (
+                    row.subscription_branch_id, row.start_date, row.end_date,
+                    row.current_freeze_start, row.current_freeze_end
+                ) for row in rows if row.subscription_id is not None
+            },
+            'open_entries': {row.open_entry_id for row in rows if row.open_entry_id is not None}
+        }
+    
+    @staticmethod
+    def load_access_records(customer_ids, start_date, end_date):
+        """Access records for many customers over a date range in three queries
+        
+        Returns ``(records, open_entries)``: ``records`` maps customer id to a
+        record shaped like ``load_access_record`` with every active
+        subscription overlapping the range, and ``open_entries`` maps
+        ``(customer_id, entry_date)`` to the ids of that day's open entries.
+        The records' own ``open_entries`` are left empty.
+        """
+        from app.models.customer import Customer
+        from app.models.subscription import Subscription
+        from app.models.user import User
+        
+        records, open_entries = {}, {}
+        if not customer_ids:
+            return records, open_entries
+        
+        customers = db.session.query(
+            Customer.id, Customer.is_active, Customer.branch_id, Customer.member_id,
+            Customer.user_id, User.first_name, User.last_name
+        ).join(User, Customer.user_id == User.id).filter(Customer.id.in_(customer_ids)).all()
+        for row in customers:
+            records[row.id] = {
+                'customer_id': row.id,
+                'is_active': row.is_active,
+                'branch_id': row.branch_id,
+                'user_id': row.user_id,
+                'customer': {'member_id': row.member_id, 'name': f"{row.first_name} {row.last_name}"},
+                'subscriptions': {},
+                'open_entries': set()
+            }
+        
+        subscriptions = db.session.query(
+            Subscription.id, Subscription.customer_id, Subscription.branch_id,
+            Subscription.start_date, Subscription.end_date,
+            Subscription.current_freeze_start, Subscription.current_freeze_end
         ).filter(
-            Subscription.start_date <= date.today(),
-            Subscription.end_date >= date.today()
-        ).first()
+            Subscription.customer_id.in_(customer_ids),
+            Subscription.status == 'active',
+            Subscription.start_date <= end_date,
+            Subscription.end_date >= start_date
+        ).all()
+        for row in subscriptions:
+            if row.customer_id in records:
+                records[row.customer_id]['subscriptions'][row.id] = (
+                    row.branch_id, row.start_date, row.end_date,
+                    row.current_freeze_start, row.current_freeze_end
+                )
         
-        if not active_subscription:
+        entries = db.session.query(Attendance.id, Attendance.customer_id, Attendance.entry_date).filter(
+            Attendance.customer_id.in_(customer_ids),
+            Attendance.entry_date >= start_date,
+            Attendance.entry_date <= end_date,
+            Attendance.access_granted == True,
+            Attendance.exit_time.is_(None)
+        ).all()
+        for row in entries:
+            open_entries.setdefault((row.customer_id, row.entry_date), set()).add(row.id)
+        
+        return records, open_entries
+    
+    @staticmethod
+    def decide_access(record, branch_id=None, on=None):
+        """Grant or deny entry from an access record; returns (valid, reason)
+        
+        ``on`` is the day of the entry (default today); ``record['open_entries']``
+        must hold that day's open entries.
+        """
+        today = on or date.today()
+        if not record['is_active']:
+            return False, "Customer account is inactive"
+        
+        current = [
+            subscription for subscription in record['subscriptions'].values()
+            if subscription[1] <= today <= subscription[2]
+        ]
+        if not current:
             return False, "No active subscription found"
         
-        # Check subscription access
-        access_allowed, reason = active_subscription.is_access_allowed()
-        if not access_allowed:
-            return False, reason
+        # Prefer a subscription that is usable today at this branch
+        usable = [
+            subscription for subscription in current
+            if not (subscription[3] and subscription[4] and subscription[3] <= today <= subscription[4])
+        ]
+        if not usable:
+            return False, "Subscription is frozen"
         
-        # Check branch access (if specified)
-        if branch_id and active_subscription.branch_id != branch_id:
+        if branch_id and not any(subscription[0] == branch_id for subscription in usable):
             return False, "Subscription not valid for this branch"
         
-        # Check if already checked in today
-        today_entry = Attendance.query.filter_by(
-            customer_id=customer_id,
-            entry_date=date.today(),
-            access_granted=True,
-            exit_time=None
-        ).first()
-        
-        if today_entry:
+        if record['open_entries']:
             return False, "Customer already checked in today"
         
         return True, "Access granted"
     
+    @staticmethod
+    def eligibility(customer_id, branch_id=None):
+        """Decide whether a customer may enter
+        
+        Answers from the in-memory eligibility index, which every worker keeps
+        current from committed changes; a miss loads the record in one query
+        and adds it to the index. Returns ``None`` when the customer does not
+        exist, otherwise a dict with ``valid``, ``reason``, ``branch_id`` (the
+        customer's home branch) and the ``customer`` summary used in check-in
+        responses.
+        """
+        from app.services.eligibility_index import eligibility_index
+        from app.services.attendance_journal import attendance_recorder
+        
+        queued = set()
+        if attendance_recorder.active:
+            # Check-ins still waiting for the write-behind flush are open entries too
+            queued = attendance_recorder.pending_open_entries(customer_id)
+        
+        record = eligibility_index.get(customer_id)
+        if record is None:
+            version = eligibility_index.version()
+            record = AttendanceValidation.load_access_record(customer_id)
+            if record is None:
+                return None
+            eligibility_index.put(record, version)
+        
+        valid, reason = AttendanceValidation.decide_access(
+            dict(record, open_entries=record['open_entries'] | queued), branch_id
+        )
+        return {
+            'valid': valid,
+            'reason': reason,
+            'branch_id': record['branch_id'],
+            'customer': dict(record['customer'])
+        }
+    
+    @staticmethod
+    def validate_entry(customer_id, branch_id=None):
+        """Validate if customer can enter the gym"""
+        eligibility = AttendanceValidation.eligibility(customer_id, branch_id)
+        if eligibility is None:
+            return False, "Customer not found"
+        return eligibility['valid'], eligibility['reason']
+    
+    @staticmethod
+    def check_in(customer_id, branch_id, entry_method='manual', processed_by_id=None, notes=None):
+        """Validate and record an entry in a single transaction
+        
+        Returns ``None`` if the customer does not exist, otherwise
+        ``(attendance_dict, is_valid, reason)``. The response dict is built
+        from the flushed row and the eligibility query, so no lazy loads or
+        post-commit refreshes are needed.
+        
+        In write-behind mode the entry is journaled instead of committed;
+        the dict then has ``id`` None and a ``provisional_id``.
+        """
+        from app.services.attendance_journal import attendance_recorder
+        
+        eligibility = AttendanceValidation.eligibility(customer_id, branch_id)
+        if eligibility is None:
+            return None
+        
+        now = datetime.now()
+        attendance = Attendance(
+            customer_id=customer_id,
+            branch_id=branch_id,
+            entry_date=now.date(),
+            entry_time=now.time(),
+            entry_method=entry_method,
+            biometric_verified=(entry_method == 'biometric'),
+            access_granted=eligibility['valid'],
+            denial_reason=None if eligibility['valid'] else eligibility['reason'],
+            processed_by_id=processed_by_id,
+            notes=notes
+        )
+        if attendance_recorder.active:
+            data = AttendanceValidation.queue_entry(attendance, eligibility['customer'])
+            return data, eligibility['valid'], eligibility['reason']
+        
+        db.session.add(attendance)
+        db.session.flush()
+        
+        data = attendance.to_dict()
+        data['customer'] = eligibility['customer']
+        db.session.commit()
+        
+        return data, eligibility['valid'], eligibility['reason']
+    
+    @staticmethod
+    def queue_entry(attendance, customer=None):
+        """Hand an unsaved entry to the write-behind recorder; returns its response dict"""
+        from app.services.attendance_journal import ENTRY_FIELDS, attendance_recorder
+        
+        attendance.created_at = datetime.utcnow()
+        values = {key: getattr(attendance, key) for key in ENTRY_FIELDS}
+        data = attendance.to_dict()
+        data['provisional_id'] = attendance_recorder.submit(values)
+        if customer is not None:
+            data['customer'] = customer
+        return data
+    
+    @staticmethod
+    def check_in_batch(entries, branch_id, processed_by_id=None):
+        """Validate and record a batch of replayed swipes in one transaction
+        
+        ``entries`` are dicts with ``customer_id``, ``device_id``, a naive
+        local ``timestamp`` (datetime) and optional ``entry_method``/``notes``;
+        entries that failed parsing carry an ``error`` instead and are only
+        echoed back. Customers, subscriptions, open entries and existing
+        ingest keys are prefetched once, and all new rows are inserted by a
+        single flush. Swipes already ingested (same customer, device and
+        timestamp) are reported as duplicates with their original record.
+        
+        Returns one result dict per entry, in order.
+        """
+        results = [None] * len(entries)
+        pending = []
+        for index, entry in enumerate(entries):
+            if entry.get('error'):
+                results[index] = {'index': index, 'customer_id': entry.get('customer_id'),
+                                  'status': 'error', 'reason': entry['error']}
+            else:
+                pending.append((index, entry))
+        if not pending:
+            return results
+        
+        customer_ids = {entry['customer_id'] for _, entry in pending}
+        days = [entry['timestamp'].date() for _, entry in pending]
+        records, open_entries = AttendanceValidation.load_access_records(customer_ids, min(days), max(days))
+        
+        existing = {}
+        keys = db.session.query(
+            AttendanceIngestKey.customer_id, AttendanceIngestKey.device_id,
+            AttendanceIngestKey.client_timestamp, Attendance.id,
+            Attendance.access_granted, Attendance.denial_reason
+        ).join(Attendance, AttendanceIngestKey.attendance_id == Attendance.id).filter(
+            AttendanceIngestKey.customer_id.in_(customer_ids),
+            AttendanceIngestKey.device_id.in_({entry['device_id'] for _, entry in pending}),
+            AttendanceIngestKey.client_timestamp >= min(entry['timestamp'] for _, entry in pending),
+            AttendanceIngestKey.client_timestamp <= max(entry['timestamp'] for _, entry in pending)
+        ).all()
+        for row in keys:
+            existing[(row.customer_id, row.device_id, row.client_timestamp)] = {
+                'attendance_id': row.id,
+                'access_granted': row.access_granted,
+                'reason': "Access granted" if row.access_granted else row.denial_reason
+            }
+        
+        created = []
+        for index, entry in pending:
+            customer_id, timestamp = entry['customer_id'], entry['timestamp']
+            key = (customer_id, entry['device_id'], timestamp)
+            result = {'index': index, 'customer_id': customer_id}
+            results[index] = result
+            
+            if key in existing:
+                result.update(status='duplicate', **existing[key])
+                continue
+            
+            record = records.get(customer_id)
+            if record is None:
+                result.update(status='error', reason="Customer not found")
+                continue
+            
+            day = timestamp.date()
+            day_entries = open_entries.setdefault((customer_id, day), set())
+            valid, reason = AttendanceValidation.decide_access(
+                dict(record, open_entries=day_entries), branch_id, on=day
+            )
+            
+            attendance = Attendance(
+                customer_id=customer_id,
+                branch_id=branch_id,
+                entry_date=day,
+                entry_time=timestamp.time(),
+                entry_method=entry.get('entry_method', 'card'),
+                biometric_verified=(entry.get('entry_method') == 'biometric'),
+                access_granted=valid,
+                denial_reason=None if valid else reason,
+                processed_by_id=processed_by_id,
+                notes=entry.get('notes')
+            )
+            ingest_key = AttendanceIngestKey(
+                customer_id=customer_id, device_id=entry['device_id'],
+                client_timestamp=timestamp, attendance=attendance
+            )
+            created.extend([attendance, ingest_key])
+            
+            if valid:
+                # Later swipes of the same day in this batch see the open entry
+                day_entries.add(key)
+            # Replays of the same swipe within the batch are duplicates of this one
+            existing[key] = {'attendance': attendance, 'access_granted': valid, 'reason': reason}
+            result.update(status='granted' if valid else 'denied', reason=reason,
+                          access_granted=valid, attendance=attendance)
+        
+        if created:
+            db.session.add_all(created)
+            db.session.flush()
+        
+        for result in results:
+            attendance = result.pop('attendance', None)
+            if attendance is not None:
+                result['attendance_id'] = attendance.id
+        
+        db.session.commit()
+        return results
+    
     @staticmethod
     def record_entry(customer_id, branch_id, entry_method='manual', processed_by_id=None, notes=None):
         """Record customer entry after validation"""
@@ -0,0 +1,74 @@
+"""Branch daily rollup model for dashboard reporting"""
+from datetime import datetime
+from sqlalchemy import Numeric
+from app.database import db
+
+PAYMENT_METHODS = ['cash', 'card', 'upi', 'net_banking', 'transfer']
+
+class BranchDailyStats(db.Model):
+    """Per-branch, per-day totals maintained alongside payment, attendance and customer writes"""
+    __tablename__ = 'branch_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'stat_date', name='uq_branch_daily_stats_branch_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False)
+    stat_date = db.Column(db.Date, nullable=False, index=True)
+
+    # Completed revenue (by payment_date)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+
+    # Completed revenue by payment method
+    cash_count = db.Column(db.Integer, default=0, nullable=False)
+    cash_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+    card_count = db.Column(db.Integer, default=0, nullable=False)
+    card_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+    upi_count = db.Column(db.Integer, default=0, nullable=False)
+    upi_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+    net_banking_count = db.Column(db.Integer, default=0, nullable=False)
+    net_banking_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+    transfer_count = db.Column(db.Integer, default=0, nullable=False)
+    transfer_revenue = db.Column(Numeric(12, 2), default=0, nullable=False)
+
+    # Refunds and pending payments
+    refunded_count = db.Column(db.Integer, default=0, nullable=False)
+    refunded_amount = db.Column(Numeric(12, 2), default=0, nullable=False)
+    pending_count = db.Column(db.Integer, default=0, nullable=False)
+    pending_amount = db.Column(Numeric(12, 2), default=0, nullable=False)
+
+    # Attendance
+    entries_granted = db.Column(db.Integer, default=0, nullable=False)
+    entries_denied = db.Column(db.Integer, default=0, nullable=False)
+
+    # Signups (by joined_date)
+    new_customers = db.Column(db.Integer, default=0, nullable=False)
+
+    # System Fields
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'branch_id': self.branch_id,
+            'date': self.stat_date.isoformat() if self.stat_date else None,
+            'completed_count': self.completed_count,
+            'completed_revenue': float(self.completed_revenue or 0),
+            'by_method': {
+                method: {
+                    'count': getattr(self, f'{method}_count'),
+                    'amount': float(getattr(self, f'{method}_revenue') or 0)
+                } for method in PAYMENT_METHODS
+            },
+            'refunded_count': self.refunded_count,
+            'refunded_amount': float(self.refunded_amount or 0),
+            'pending_count': self.pending_count,
+            'pending_amount': float(self.pending_amount or 0),
+            'entries_granted': self.entries_granted,
+            'entries_denied': self.entries_denied,
+            'new_customers': self.new_customers
+        }
+
+    def __repr__(self):
+        return f'<BranchDailyStats branch={self.branch_id} {self.stat_date}>'
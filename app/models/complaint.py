@@ -1,5 +1,6 @@
 """Complaint model for customer feedback"""
 from datetime import datetime, date
+from sqlalchemy.orm import joinedload, selectinload
 from app.database import db
 
 class Complaint(db.Model):
@@ -100,6 +101,23 @@ class Complaint(db.Model):
         """Get complaint age in days"""
         return (date.today() - self.created_at.date()).days
     
+    @classmethod
+    def load_options(cls, include_updates=False, include_customer=False, include_assignee=False):
+        """Loader options for the relationships ``to_dict`` reads with the same flags
+        
+        ``include_assignee`` covers the assigned staff member list views add.
+        """
+        from app.models.customer import Customer
+        
+        options = []
+        if include_updates:
+            options.append(selectinload(cls.updates))
+        if include_customer:
+            options.append(joinedload(cls.customer).joinedload(Customer.user))
+        if include_assignee:
+            options.append(joinedload(cls.assigned_to))
+        return options
+    
     def to_dict(self, include_updates=False, include_customer=False):
         """Convert to dictionary"""
         data = {
@@ -1,6 +1,7 @@
 """Customer model for gym members"""
 from datetime import datetime, date
-from sqlalchemy import Numeric
+from sqlalchemy import DDL, Numeric, event
+from sqlalchemy.orm import joinedload
 from app.database import db
 import math
 
@@ -108,6 +109,14 @@ class Customer(db.Model):
             'age': self.get_age()
         }
     
+    @classmethod
+    def load_options(cls, include_branch=False):
+        """Loader options for the relationships ``to_dict`` reads, plus the branch list views add"""
+        options = [joinedload(cls.user)]
+        if include_branch:
+            options.append(joinedload(cls.branch))
+        return options
+    
     def to_dict(self, include_health=False):
         """Convert to dictionary"""
         data = {
@@ -191,3 +200,51 @@ class HealthReport(db.Model):
     
     def __repr__(self):
         return f'<HealthReport {self.customer.member_id} - {self.report_date}>'
+
+
+class CustomerSearch(db.Model):
+    """Search document of a customer, maintained by ``app.services.search_service``
+    
+    One row per customer: its member id, a lower-cased document of member
+    id, names and email, and the digits of the phone number. SQLite mirrors
+    it into the FTS5 table ``customer_search_fts``; PostgreSQL indexes the
+    document as a tsvector. ``customer_id`` has no foreign key so the row
+    can be dropped after the customer it describes.
+    """
+    __tablename__ = 'customer_search'
+    
+    customer_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    member_id = db.Column(db.String(20), nullable=False)
+    document = db.Column(db.Text, nullable=False)
+    phone_digits = db.Column(db.String(20))
+
+
+# Full-text index over customer_search, created with the table
+CUSTOMER_SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS customer_search_fts USING fts5("
+        "document, phone_digits, content='customer_search', content_rowid='customer_id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_ai AFTER INSERT ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(rowid, document, phone_digits) "
+        "VALUES (new.customer_id, new.document, new.phone_digits); END",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_ad AFTER DELETE ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(customer_search_fts, rowid, document, phone_digits) "
+        "VALUES ('delete', old.customer_id, old.document, old.phone_digits); END",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_au AFTER UPDATE ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(customer_search_fts, rowid, document, phone_digits) "
+        "VALUES ('delete', old.customer_id, old.document, old.phone_digits); "
+        "INSERT INTO customer_search_fts(rowid, document, phone_digits) "
+        "VALUES (new.customer_id, new.document, new.phone_digits); END",
+    ],
+    'postgresql': [
+        "CREATE INDEX IF NOT EXISTS ix_customer_search_document ON customer_search "
+        "USING gin (to_tsvector('simple', document))",
+        "CREATE INDEX IF NOT EXISTS ix_customer_search_phone_digits ON customer_search "
+        "(phone_digits text_pattern_ops)",
+    ]
+}
+
+for dialect, statements in CUSTOMER_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(CustomerSearch.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
@@ -0,0 +1,15 @@
+"""Counter model for generated member, subscription, payment and complaint numbers"""
+from datetime import datetime
+from app.database import db
+
+class IdCounter(db.Model):
+    """Next free sequence number of one numbering scope (e.g. a branch's member ids) on one day"""
+    __tablename__ = 'id_counters'
+
+    scope = db.Column(db.String(40), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<IdCounter {self.scope} {self.day}: {self.next_value}>'
@@ -1,11 +1,18 @@
 """Payment model for financial transactions"""
 from datetime import datetime, date
 from sqlalchemy import Numeric
+from sqlalchemy.orm import joinedload
 from app.database import db
 
 class Payment(db.Model):
     """Payment transactions"""
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Branch revenue and status breakdowns by date
+        db.Index('ix_payments_branch_status_date', 'branch_id', 'status', 'payment_date'),
+        # Aged pending payments (alerts)
+        db.Index('ix_payments_status_created_at', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -35,7 +42,7 @@ class Payment(db.Model):
     # Additional Details
     service_type = db.Column(db.String(50))  # subscription, training, merchandise, etc.
     description = db.Column(db.String(200))
-    reference_number = db.Column(db.String(100))  # Bank reference, UPI ID, etc.
+    reference_number = db.Column(db.String(100), index=True)  # Bank reference, UPI ID, etc. (Paymob order id)
     
     # Staff Information
     processed_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -76,6 +83,19 @@ class Payment(db.Model):
         
         return True, "Payment refunded successfully"
     
+    @classmethod
+    def load_options(cls, include_customer=False, include_subscription=False):
+        """Loader options for the relationships ``to_dict`` reads with the same flags"""
+        from app.models.customer import Customer
+        from app.models.subscription import Subscription
+        
+        options = []
+        if include_customer:
+            options.append(joinedload(cls.customer).joinedload(Customer.user))
+        if include_subscription:
+            options.append(joinedload(cls.subscription).joinedload(Subscription.plan))
+        return options
+    
     def to_dict(self, include_customer=False, include_subscription=False):
         """Convert to dictionary"""
         data = {
@@ -1,6 +1,7 @@
 """Subscription model for gym memberships"""
 from datetime import datetime, date, timedelta
 from sqlalchemy import Numeric
+from sqlalchemy.orm import joinedload, selectinload
 from app.database import db
 
 class SubscriptionPlan(db.Model):
@@ -50,6 +51,14 @@ class SubscriptionPlan(db.Model):
 class Subscription(db.Model):
     """Customer subscriptions"""
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        # Active/expiring counts and expiry sweeps
+        db.Index('ix_subscriptions_status_end_date', 'status', 'end_date'),
+        # Branch dashboards: active and expiring per branch
+        db.Index('ix_subscriptions_branch_status_end_date', 'branch_id', 'status', 'end_date'),
+        # A customer's active subscriptions (eligibility, profile)
+        db.Index('ix_subscriptions_customer_status', 'customer_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -201,6 +210,21 @@ class Subscription(db.Model):
         
         return info
     
+    @classmethod
+    def load_options(cls, include_details=False, include_customer=False):
+        """Loader options for the relationships ``to_dict`` reads with the same flags
+        
+        ``include_customer`` covers the member id and name list views add.
+        """
+        from app.models.customer import Customer
+        
+        options = []
+        if include_details:
+            options += [joinedload(cls.plan), selectinload(cls.payments)]
+        if include_customer:
+            options.append(joinedload(cls.customer).joinedload(Customer.user))
+        return options
+    
     def to_dict(self, include_details=False):
         """Convert to dictionary"""
         data = {
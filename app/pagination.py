@@ -0,0 +1,141 @@
+"""Keyset (cursor) pagination
+
+Pages are delimited by the sort key of the last row returned instead of an
+offset, so each page is an index range scan no matter how deep the client
+has paged, and rows inserted meanwhile never shift a page. The cursor
+handed to clients is an opaque URL-safe token encoding that sort key.
+
+List endpoints switch to this mode when the request carries ``cursor``
+(empty for the first page). Their total is only counted on request
+(``include_total=true``) and then cached for ``PAGINATION_COUNT_CACHE_TTL``
+seconds per filtered query, so paging through a large table does not
+repeat the ``COUNT(*)`` on every page.
+"""
+import base64
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time
+from time import monotonic
+from flask import current_app
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+COUNT_CACHE_MAX_ENTRIES = 1024
+
+# (statement, parameters) -> (expires_at, total)
+_count_cache = OrderedDict()
+_count_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor token that cannot be decoded"""
+
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(value, column):
+    """Convert a cursor value back to the Python type of its column"""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is time:
+        return time.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    """Opaque cursor for a sort key"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Sort key from a cursor produced by ``encode_cursor`` for ``columns``"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong number of values')
+        return [_decode_value(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a requested page size"""
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """One page of ``query`` ordered by ``columns``, after ``cursor``
+
+    ``columns`` must form a unique sort key (end with the primary key).
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last
+    page. Raises ``InvalidCursor`` for a malformed cursor.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
+
+
+def cached_count(query, ttl=60):
+    """``query.count()``, reused for ``ttl`` seconds per statement and parameters"""
+    query = query.enable_eagerloads(False).order_by(None)
+    compiled = query.statement.compile()
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    now = monotonic()
+    with _count_lock:
+        cached = _count_cache.get(key)
+        if cached is not None and cached[0] > now:
+            _count_cache.move_to_end(key)
+            return cached[1]
+
+    total = query.count()
+    with _count_lock:
+        _count_cache[key] = (now + ttl, total)
+        while len(_count_cache) > COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.popitem(last=False)
+    return total
+
+
+def cursor_requested(args):
+    """Whether a list request asked for cursor pagination"""
+    return 'cursor' in args
+
+
+def cursor_pagination(query, columns, args, default_page_size=DEFAULT_PAGE_SIZE, descending=True):
+    """Cursor-mode page of a list endpoint's query; returns ``(rows, pagination)``
+
+    Reads ``cursor``, ``per_page`` and ``include_total`` from ``args``.
+    Raises ``InvalidCursor`` for a malformed cursor.
+    """
+    limit = page_size(args.get('per_page'), default_page_size)
+    rows, next_cursor = keyset_page(query, columns, args.get('cursor') or None, limit, descending)
+    pagination = {'per_page': limit, 'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    if args.get('include_total', '').lower() == 'true':
+        pagination['total'] = cached_count(query, current_app.config.get('PAGINATION_COUNT_CACHE_TTL', 60))
+    return rows, pagination
@@ -0,0 +1,84 @@
+"""Query-count budgets
+
+List endpoints declare how many SQL statements one request may issue with
+``@query_budget(n)``, placed right under the route so authentication and
+conditional-GET checks count too. With ``QUERY_BUDGET_ENFORCED`` (on under
+``TestingConfig``) a request going over its budget raises
+``QueryBudgetExceeded``, so a lazy load sneaking into a serializer fails
+the test that renders the page instead of turning into N+1 queries in
+production. Otherwise the decorator costs nothing.
+
+``count_queries()`` counts the statements issued by the current thread
+inside a block, for budgets on services or ad-hoc checks.
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+_listener_registered = False
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request issues more statements than its budget"""
+
+
+class QueryCount:
+    """Number of statements seen so far, and their SQL"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', ()):
+        counter.statements.append(statement)
+
+
+def _register_listener():
+    global _listener_registered
+    if not _listener_registered:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        _listener_registered = True
+
+
+@contextmanager
+def count_queries():
+    """Count the statements executed by this thread inside the block"""
+    _register_listener()
+    counter = QueryCount()
+    counters = _local.__dict__.setdefault('counters', [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+def query_budget(limit):
+    """Fail the request when it issues more than ``limit`` statements (if enforced)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('QUERY_BUDGET_ENFORCED', False):
+                return f(*args, **kwargs)
+
+            with count_queries() as queries:
+                response = f(*args, **kwargs)
+            if queries.count > limit:
+                listing = '\n'.join(queries.statements)
+                raise QueryBudgetExceeded(
+                    f'{f.__name__} issued {queries.count} queries (budget {limit}):\n{listing}'
+                )
+            return response
+
+        decorated_function.query_budget = limit
+        return decorated_function
+    return decorator
@@ -0,0 +1,209 @@
+"""Precomputed dashboard alerts
+
+Alert counts change slowly, so instead of counting on every request they
+are computed for every branch (and system-wide) at once by three grouped
+queries and stored in ``alert_snapshots``. A background worker refreshes
+the snapshots periodically; requests only read them.
+"""
+import json
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, insert, update
+from sqlalchemy.exc import IntegrityError
+from app.database import db
+from app.models.alert_snapshot import AlertSnapshot
+from app.models.branch import Branch
+from app.models.subscription import Subscription
+from app.models.payment import Payment
+from app.models.complaint import Complaint
+from app.services.dashboard_service import count_if, aggregate_by_branch, total
+
+
+def _build_alerts(counts):
+    """Alert entries for one scope from its counts"""
+    alerts = []
+
+    expiring_count = counts.get('expiring', 0)
+    if expiring_count > 0:
+        alerts.append({
+            'type': 'warning',
+            'category': 'subscriptions',
+            'title': 'Subscriptions Expiring Soon',
+            'message': f"{expiring_count} subscriptions expire in the next 3 days",
+            'count': expiring_count,
+            'priority': 'medium'
+        })
+
+    pending_count = counts.get('old_pending', 0)
+    if pending_count > 0:
+        alerts.append({
+            'type': 'warning',
+            'category': 'payments',
+            'title': 'Pending Payments',
+            'message': f"{pending_count} payments have been pending for 2+ days",
+            'count': pending_count,
+            'priority': 'medium'
+        })
+
+    complaint_count = counts.get('high_priority', 0)
+    if complaint_count > 0:
+        alerts.append({
+            'type': 'error',
+            'category': 'complaints',
+            'title': 'High Priority Complaints',
+            'message': f"{complaint_count} high/critical priority complaints need attention",
+            'count': complaint_count,
+            'priority': 'high'
+        })
+
+    return alerts
+
+
+class AlertService:
+    """Computation and storage of alert snapshots"""
+
+    @staticmethod
+    def compute_alerts():
+        """Alerts for every branch plus the system-wide list
+
+        Returns ``{branch_id: alerts}`` with ``None`` as the system-wide key.
+        """
+        today = date.today()
+
+        subscriptions = aggregate_by_branch(Subscription, {
+            'expiring': count_if(and_(
+                Subscription.end_date >= today,
+                Subscription.end_date <= today + timedelta(days=3)
+            ))
+        }, Subscription.status == 'active')
+
+        payments = aggregate_by_branch(Payment, {
+            'old_pending': count_if(Payment.created_at <= datetime.utcnow() - timedelta(days=2))
+        }, Payment.status == 'pending')
+
+        complaints = aggregate_by_branch(Complaint, {
+            'high_priority': count_if(Complaint.priority.in_(['high', 'critical']))
+        }, Complaint.status.in_(['open', 'in_progress']))
+
+        per_branch = {}
+        branch_ids = [row.id for row in db.session.query(Branch.id).all()]
+        for branch_id in branch_ids:
+            counts = {}
+            for results in (subscriptions, payments, complaints):
+                counts.update(results.get(branch_id, {}))
+            per_branch[branch_id] = _build_alerts(counts)
+
+        per_branch[None] = _build_alerts({
+            'expiring': total(subscriptions, 'expiring'),
+            'old_pending': total(payments, 'old_pending'),
+            'high_priority': total(complaints, 'high_priority')
+        })
+        return per_branch
+
+    @staticmethod
+    def refresh_snapshots():
+        """Recompute and store every snapshot; returns the number written
+
+        Snapshots are upserted by scope, so workers refreshing at the same
+        time overwrite each other's rows instead of adding their own. If
+        another worker creates a missing row first, the refresh is retried
+        once and then updates that row.
+        """
+        computed = AlertService.compute_alerts()
+        try:
+            AlertService._store(computed)
+        except IntegrityError:
+            db.session.rollback()
+            AlertService._store(computed)
+        return len(computed)
+
+    @staticmethod
+    def _store(computed):
+        table = AlertSnapshot.__table__
+        now = datetime.utcnow()
+        for branch_id, alerts in computed.items():
+            values = {'payload': json.dumps(alerts), 'generated_at': now}
+            scope = AlertSnapshot.scope_for(branch_id)
+            result = db.session.execute(update(table).where(table.c.scope == scope).values(**values))
+            if result.rowcount == 0:
+                db.session.execute(insert(table).values(scope=scope, branch_id=branch_id, **values))
+        db.session.commit()
+
+    @staticmethod
+    def get_snapshot(branch_id=None, max_age=None):
+        """Stored snapshot for a branch (None: system-wide)
+
+        The snapshots are refreshed in place when the requested one is
+        missing or older than ``max_age`` seconds (e.g. the worker is not
+        running).
+        """
+        scope = AlertSnapshot.scope_for(branch_id)
+        snapshot = AlertSnapshot.query.filter_by(scope=scope).first()
+
+        stale = snapshot is None or (
+            max_age is not None and
+            snapshot.generated_at < datetime.utcnow() - timedelta(seconds=max_age)
+        )
+        if stale:
+            try:
+                AlertService.refresh_snapshots()
+            except IntegrityError:
+                # Lost both upsert races to other writers; their rows are as fresh
+                db.session.rollback()
+            snapshot = AlertSnapshot.query.filter_by(scope=scope).first()
+        return snapshot
+
+
+class AlertSnapshotWorker:
+    """Daemon thread refreshing alert snapshots on a fixed interval"""
+
+    def __init__(self):
+        self.app = None
+        self.interval = 300
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Start the worker with the first request when enabled in config"""
+        self.app = app
+        self.interval = app.config.get('ALERT_SNAPSHOT_INTERVAL', 300)
+        if not app.config.get('ALERT_SNAPSHOT_WORKER', False):
+            return
+
+        # Started lazily so CLI commands (migrations, seeding) never spawn it
+        @app.before_request
+        def start_alert_worker():
+            self.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the refresh thread (idempotent)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='alert-snapshot-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Ask the refresh thread to exit"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    AlertService.refresh_snapshots()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[ALERTS] Snapshot refresh failed: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.interval)
+
+
+alert_worker = AlertSnapshotWorker()
@@ -0,0 +1,227 @@
+"""Cold archive for old attendance
+
+Attendance rows older than the archive horizon are moved, whole months at
+a time, from ``attendance`` into ``attendance_archive`` so date-range
+queries on the hot table stay small. Each archived row is folded into a
+per-customer, per-month row of ``attendance_monthly_summary``, which
+answers visit statistics for archived months without reading the archive.
+
+Rows are moved with Core statements in id-ordered batches, one
+transaction per batch, so an interrupted run resumes where it stopped.
+Core statements bypass the ORM hooks on purpose: moving a row is not a
+new visit, so rollups, caches and the live indexes must not react.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, insert, func
+from app.database import db
+from app.pagination import DEFAULT_PAGE_SIZE, keyset_page, encode_cursor
+from app.services.dashboard_service import date_bucket, minutes_between
+from app.models.attendance import Attendance, AttendanceArchive, AttendanceIngestKey, AttendanceMonthlySummary
+
+ARCHIVED_COLUMNS = [column.name for column in Attendance.__table__.columns]
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+class ArchiveService:
+    """Moves old attendance to the archive and reads across both tables"""
+
+    @staticmethod
+    def archive_cutoff(horizon_days, today=None):
+        """First day kept hot: the start of the month ``horizon_days`` ago"""
+        today = today or date.today()
+        return month_start(today - timedelta(days=horizon_days))
+
+    @staticmethod
+    def archive_attendance(before, batch_size=5000):
+        """Move attendance rows with entry_date < ``before`` to the archive
+
+        Returns the number of rows moved.
+        """
+        table = Attendance.__table__
+        moved = 0
+        while True:
+            rows = db.session.execute(
+                table.select().where(table.c.entry_date < before).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            ids = [row.id for row in rows]
+            ArchiveService._add_to_summaries(rows)
+            now = datetime.utcnow()
+            db.session.execute(insert(AttendanceArchive.__table__), [
+                {**{name: row._mapping[name] for name in ARCHIVED_COLUMNS}, 'archived_at': now} for row in rows
+            ])
+            # Idempotency keys only matter for recent replays
+            db.session.execute(delete(AttendanceIngestKey.__table__).where(
+                AttendanceIngestKey.__table__.c.attendance_id.in_(ids)
+            ))
+            db.session.execute(delete(table).where(table.c.id.in_(ids)))
+            db.session.commit()
+
+            moved += len(rows)
+            print(f"[ARCHIVE] Moved {moved} attendance rows")
+        return moved
+
+    @staticmethod
+    def _add_to_summaries(rows):
+        """Fold a batch of archived rows into the monthly summaries"""
+        deltas = {}
+        for row in rows:
+            key = (row.customer_id, month_start(row.entry_date))
+            delta = deltas.setdefault(key, {
+                'visits': 0, 'denied_entries': 0, 'total_duration_minutes': 0.0, 'timed_visits': 0,
+                'first_visit': None, 'last_visit': None
+            })
+            if not row.access_granted:
+                delta['denied_entries'] += 1
+                continue
+
+            delta['visits'] += 1
+            day = row.entry_date
+            delta['first_visit'] = min(delta['first_visit'] or day, day)
+            delta['last_visit'] = max(delta['last_visit'] or day, day)
+            minutes = Attendance.calculate_duration(row)
+            # Same rule as customer_history_stats: no exit or zero minutes is not timed
+            if minutes:
+                delta['total_duration_minutes'] += minutes
+                delta['timed_visits'] += 1
+
+        customer_ids = {customer_id for customer_id, _ in deltas}
+        months = {month for _, month in deltas}
+        existing = {
+            (summary.customer_id, summary.month): summary
+            for summary in AttendanceMonthlySummary.query.filter(
+                AttendanceMonthlySummary.customer_id.in_(customer_ids),
+                AttendanceMonthlySummary.month.in_(months)
+            ).all()
+        }
+
+        for (customer_id, month), delta in deltas.items():
+            summary = existing.get((customer_id, month))
+            if summary is None:
+                summary = AttendanceMonthlySummary(
+                    customer_id=customer_id, month=month, visits=0, denied_entries=0,
+                    total_duration_minutes=0, timed_visits=0
+                )
+                db.session.add(summary)
+            summary.visits += delta['visits']
+            summary.denied_entries += delta['denied_entries']
+            summary.total_duration_minutes += delta['total_duration_minutes']
+            summary.timed_visits += delta['timed_visits']
+            for bound, pick in (('first_visit', min), ('last_visit', max)):
+                if delta[bound] is not None:
+                    current = getattr(summary, bound)
+                    setattr(summary, bound, pick(current, delta[bound]) if current else delta[bound])
+
+    @staticmethod
+    def customer_has_archive(customer_id, start_date):
+        """Whether any archived entry of the customer falls on or after start_date"""
+        latest = db.session.query(func.max(AttendanceArchive.entry_date)).filter(
+            AttendanceArchive.customer_id == customer_id
+        ).scalar()
+        return latest is not None and latest >= start_date
+
+    @staticmethod
+    def _history_models(customer_id, start_date):
+        models = [Attendance]
+        if ArchiveService.customer_has_archive(customer_id, start_date):
+            models.append(AttendanceArchive)
+        return models
+
+    @staticmethod
+    def customer_history_page(customer_id, start_date, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of a customer's granted entries since start_date, newest first
+
+        Keyset-paginated on (entry_date, entry_time, id) across the hot and
+        archived tables; the archive is only queried when the range reaches
+        into it. Returns ``(records, next_cursor)``.
+        """
+        candidates = []
+        has_more = False
+        for model in ArchiveService._history_models(customer_id, start_date):
+            query = model.query.filter(
+                model.customer_id == customer_id,
+                model.entry_date >= start_date,
+                model.access_granted == True
+            )
+            rows, next_cursor = keyset_page(
+                query, [model.entry_date, model.entry_time, model.id], cursor, limit
+            )
+            candidates.extend(rows)
+            has_more = has_more or next_cursor is not None
+
+        candidates.sort(key=lambda record: (record.entry_date, record.entry_time, record.id), reverse=True)
+        records = candidates[:limit]
+        if has_more or len(candidates) > limit:
+            last = records[-1]
+            return records, encode_cursor([last.entry_date, last.entry_time, last.id])
+        return records, None
+
+    @staticmethod
+    def _monthly_visits(model, customer_id, start_date, end_date=None):
+        """Granted visits of a customer per month, with duration totals, aggregated in SQL"""
+        dialect = db.engine.dialect.name
+        minutes = func.nullif(minutes_between(model.entry_time, model.exit_time, dialect), 0)
+        month = date_bucket(model.entry_date, 'month', dialect).label('month')
+        query = db.session.query(
+            month,
+            func.count(model.id).label('visits'),
+            func.sum(minutes).label('duration_total'),
+            func.count(minutes).label('duration_count')
+        ).filter(
+            model.customer_id == customer_id,
+            model.entry_date >= start_date,
+            model.access_granted == True
+        )
+        if end_date is not None:
+            query = query.filter(model.entry_date < end_date)
+        # SQLite returns the bucket as text
+        return [
+            (str(row.month)[:7], row.visits, float(row.duration_total or 0), row.duration_count)
+            for row in query.group_by(month).all()
+        ]
+
+    @staticmethod
+    def customer_history_stats(customer_id, start_date):
+        """Visit count, average duration and visits per month since start_date
+
+        Hot entries are aggregated in SQL. Archived months come from the
+        monthly summaries; only the archived part of a month cut by
+        start_date is aggregated from the archive. Durations of zero
+        minutes and entries without an exit are left out of the average.
+        """
+        months = ArchiveService._monthly_visits(Attendance, customer_id, start_date)
+
+        summaries = AttendanceMonthlySummary.query.filter(
+            AttendanceMonthlySummary.customer_id == customer_id,
+            AttendanceMonthlySummary.month >= month_start(start_date)
+        ).all()
+        for summary in summaries:
+            if summary.month >= start_date:
+                months.append((
+                    summary.month.strftime('%Y-%m'), summary.visits,
+                    summary.total_duration_minutes, summary.timed_visits
+                ))
+            else:
+                next_month = (summary.month + timedelta(days=31)).replace(day=1)
+                months.extend(ArchiveService._monthly_visits(
+                    AttendanceArchive, customer_id, start_date, next_month
+                ))
+
+        visits, duration_total, duration_count = 0, 0.0, 0
+        monthly_visits = {}
+        for month_key, month_visits, month_duration, month_timed in months:
+            monthly_visits[month_key] = monthly_visits.get(month_key, 0) + month_visits
+            visits += month_visits
+            duration_total += month_duration
+            duration_count += month_timed
+
+        return {
+            'total_visits': visits,
+            'average_duration_minutes': duration_total / duration_count if duration_count else 0,
+            'visits_per_month': dict(sorted(monthly_visits.items(), reverse=True))
+        }
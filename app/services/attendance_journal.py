@@ -0,0 +1,361 @@
+"""Write-behind attendance recorder
+
+With ``ATTENDANCE_WRITE_BEHIND`` enabled, check-ins no longer commit their
+own transaction. A validated entry is appended (and fsynced) to a local
+journal file and queued; the response carries a provisional id. A
+background flusher inserts the queued entries in one transaction every
+``ATTENDANCE_FLUSH_INTERVAL_MS`` milliseconds, or as soon as
+``ATTENDANCE_FLUSH_MAX_ROWS`` entries are waiting, so a burst of swipes
+costs one SQLite write lock instead of one per swipe.
+
+Every flushed row gets an ``AttendanceIngestKey`` with device
+``wb:<provisional id>``, which makes flushing idempotent and lets clients
+resolve a provisional id to the real record. On startup, each worker
+replays journals left behind by workers that are no longer running (those
+whose file lock it can take), skipping entries already in the database.
+
+Live state (occupancy, eligibility, the event stream) follows the flush,
+since it is driven by commits; entries still queued count as open for the
+"already checked in today" check of the worker that queued them.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import date, datetime, time
+from sqlalchemy.exc import IntegrityError
+from app.database import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: no journal locking, run a single worker
+    fcntl = None
+
+DEVICE_PREFIX = 'wb:'
+
+# Attendance columns carried by a journal entry, with their types
+ENTRY_FIELDS = {
+    'customer_id': int, 'branch_id': int, 'entry_date': date, 'entry_time': time,
+    'entry_method': str, 'biometric_verified': bool, 'access_granted': bool,
+    'denial_reason': str, 'processed_by_id': int, 'notes': str, 'created_at': datetime
+}
+
+
+def _encode(values):
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime, time)) else value
+        for key, value in values.items()
+    }
+
+
+def _decode(values):
+    decoded = {}
+    for key, kind in ENTRY_FIELDS.items():
+        value = values.get(key)
+        if value is not None and kind in (date, datetime, time):
+            value = kind.fromisoformat(value)
+        decoded[key] = value
+    return decoded
+
+
+def read_journal(path):
+    """Entries of a journal file not yet marked as flushed, as (provisional_id, values)"""
+    entries, flushed = {}, set()
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash mid-write
+                continue
+            if 'flushed' in record:
+                flushed.update(record['flushed'])
+            else:
+                entries[record['id']] = _decode(record['values'])
+    return [(provisional_id, values) for provisional_id, values in entries.items()
+            if provisional_id not in flushed]
+
+
+class AttendanceRecorder:
+    """Journal plus queue of check-ins awaiting a batched insert"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 0.2
+        self.max_rows = 100
+        self.fsync = True
+        self.journal_dir = None
+        self._journal = None
+        self._journal_path = None
+        self._token = None
+        self._sequence = 0
+        self._queue = []
+        self._open = {}
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self.flushed = 0
+        self.replayed = 0
+
+    def init_app(self, app):
+        """Configure from app config; the journal and flusher start with the first request"""
+        self.app = app
+        self.enabled = app.config.get('ATTENDANCE_WRITE_BEHIND', False)
+        self.flush_interval = app.config.get('ATTENDANCE_FLUSH_INTERVAL_MS', 200) / 1000
+        self.max_rows = app.config.get('ATTENDANCE_FLUSH_MAX_ROWS', 100)
+        self.fsync = app.config.get('ATTENDANCE_JOURNAL_FSYNC', True)
+        self.journal_dir = app.config.get('ATTENDANCE_JOURNAL_DIR') or app.instance_path
+        if not self.enabled:
+            return
+
+        # Started lazily so CLI commands (migrations, seeding) never replay or spawn it
+        @app.before_request
+        def start_attendance_recorder():
+            if not self.enabled:
+                return
+            try:
+                self.start()
+            except OSError as e:
+                # Check-ins fall back to committing directly in this worker
+                self.enabled = False
+                print(f"[RECORDER] Write-behind disabled, journal unavailable: {e}")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def active(self):
+        """Whether check-ins should be queued instead of committed"""
+        return self.enabled and self.running
+
+    def start(self):
+        """Replay orphaned journals, open this worker's journal and start the flusher (idempotent)"""
+        with self._lock:
+            if self.running:
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._replay_orphans()
+
+            self._token = uuid.uuid4().hex[:12]
+            self._journal_path = os.path.join(self.journal_dir, f'attendance-{self._token}.journal')
+            # Created and locked under a name replay does not match, then renamed into view,
+            # so no other worker can ever see this journal unlocked
+            pending_path = self._journal_path + '.new'
+            self._journal = open(pending_path, 'a', encoding='utf-8')
+            if fcntl is not None:
+                # Held for the worker's lifetime; a journal nobody holds belongs to a dead worker
+                fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(pending_path, self._journal_path)
+
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='attendance-recorder', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Flush what is queued and stop the flusher"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, values):
+        """Journal and queue one attendance row; returns its provisional id
+
+        ``values`` are the Attendance column values (without ``id``).
+        Raises ``ValueError`` for an entry the table would reject, since
+        the caller cannot be told after the flush.
+        """
+        if values.get('customer_id') is None or values.get('branch_id') is None:
+            raise ValueError('customer_id and branch_id are required')
+        values = dict(values, created_at=values.get('created_at') or datetime.utcnow())
+        with self._lock:
+            self._sequence += 1
+            provisional_id = f'{self._token}-{self._sequence}'
+            self._write({'id': provisional_id, 'values': _encode(values)})
+            self._queue.append((provisional_id, values))
+            if values['access_granted']:
+                self._open[provisional_id] = (values['customer_id'], values['entry_date'])
+            queued = len(self._queue)
+
+        if queued >= self.max_rows:
+            self._wake.set()
+        return provisional_id
+
+    def pending_open_entries(self, customer_id, on=None):
+        """Provisional ids of the customer's queued granted entries for a day (default today)"""
+        on = on or date.today()
+        with self._lock:
+            return {
+                provisional_id for provisional_id, (queued_customer, day) in self._open.items()
+                if queued_customer == customer_id and day == on
+            }
+
+    def is_pending(self, provisional_id):
+        with self._lock:
+            return any(queued_id == provisional_id for queued_id, _ in self._queue)
+
+    def _write(self, record):
+        self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stop.is_set()
+            with self.app.app_context():
+                try:
+                    while self.flush():
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    # Entries stay queued and journaled; retried on the next tick
+                    print(f"[RECORDER] Flush failed: {e}")
+                finally:
+                    db.session.remove()
+            if stopping:
+                return
+
+    def flush(self):
+        """Insert up to ``max_rows`` queued entries in one transaction; returns the number inserted"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._queue[:self.max_rows]
+            if not batch:
+                return 0
+
+            try:
+                inserted = self.insert_entries(batch)
+            except IntegrityError:
+                db.session.rollback()
+                inserted = self._insert_one_by_one(batch)
+            flushed_ids = [provisional_id for provisional_id, _ in batch]
+            with self._lock:
+                del self._queue[:len(batch)]
+                for provisional_id in flushed_ids:
+                    self._open.pop(provisional_id, None)
+                if self._queue:
+                    self._write({'flushed': flushed_ids})
+                else:
+                    # Everything journaled is in the database: start the journal over
+                    self._journal.truncate(0)
+                    self._journal.seek(0)
+            self.flushed += inserted
+            return len(batch)
+
+    def _insert_one_by_one(self, batch):
+        """Insert a batch that failed as a whole entry by entry, dropping the rejected ones"""
+        inserted = 0
+        for provisional_id, values in batch:
+            try:
+                inserted += self.insert_entries([(provisional_id, values)])
+            except IntegrityError as e:
+                db.session.rollback()
+                print(f"[RECORDER] Dropped check-in {provisional_id} rejected by the database: {e.orig}")
+        return inserted
+
+    @staticmethod
+    def insert_entries(entries):
+        """Insert (provisional_id, values) pairs not already in the database, in one commit"""
+        from app.models.attendance import Attendance, AttendanceIngestKey
+
+        device_ids = [DEVICE_PREFIX + provisional_id for provisional_id, _ in entries]
+        existing = {
+            row.device_id for row in db.session.query(AttendanceIngestKey.device_id).filter(
+                AttendanceIngestKey.device_id.in_(device_ids)
+            ).all()
+        }
+
+        created = []
+        for device_id, (_, values) in zip(device_ids, entries):
+            if device_id in existing:
+                continue
+            attendance = Attendance(**values)
+            created.extend([attendance, AttendanceIngestKey(
+                customer_id=values['customer_id'], device_id=device_id,
+                client_timestamp=datetime.combine(values['entry_date'], values['entry_time']),
+                attendance=attendance
+            )])
+
+        if created:
+            db.session.add_all(created)
+            db.session.commit()
+        return len(created) // 2
+
+    def _replay_orphans(self):
+        """Insert what journals of dead workers still hold, then remove them"""
+        # Journals a worker died creating, before renaming them into view, never hold entries
+        for path in glob.glob(os.path.join(self.journal_dir, 'attendance-*.journal.new')):
+            try:
+                with open(path, 'r', encoding='utf-8') as pending:
+                    if fcntl is not None:
+                        fcntl.flock(pending, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.remove(path)
+            except OSError:
+                continue  # Being created by a running worker, or already removed
+
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, 'attendance-*.journal'))):
+            try:
+                journal = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # Replayed and removed by another worker meanwhile
+            with journal:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Owned by a running worker
+                    try:
+                        unchanged = os.path.samestat(os.fstat(journal.fileno()), os.stat(path))
+                    except FileNotFoundError:
+                        unchanged = False
+                    if not unchanged:
+                        continue  # Another worker replayed and removed it before we locked it
+
+                entries = read_journal(path)
+                inserted = 0
+                with self.app.app_context():
+                    try:
+                        for start in range(0, len(entries), self.max_rows):
+                            inserted += self.insert_entries(entries[start:start + self.max_rows])
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"[RECORDER] Replay of {os.path.basename(path)} failed: {e}")
+                        continue
+                    finally:
+                        db.session.remove()
+                os.remove(path)
+                self.replayed += inserted
+                if entries:
+                    print(f"[RECORDER] Replayed {inserted} of {len(entries)} unflushed check-ins "
+                          f"from {os.path.basename(path)}")
+
+    def lookup(self, provisional_id):
+        """The flushed attendance row for a provisional id, or None"""
+        from app.models.attendance import AttendanceIngestKey
+
+        key = AttendanceIngestKey.query.filter_by(device_id=DEVICE_PREFIX + provisional_id).first()
+        return key.attendance if key is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self.running,
+                'queued': len(self._queue),
+                'flushed': self.flushed,
+                'replayed': self.replayed,
+                'journal': self._journal_path
+            }
+
+
+attendance_recorder = AttendanceRecorder()
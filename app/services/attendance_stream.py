@@ -0,0 +1,271 @@
+"""Live attendance events for server-sent event streams
+
+Committed check-ins, checkouts and denials of today's attendance are
+turned into events and fanned out to every subscriber whose branch scope
+matches. Each subscriber has a bounded queue; a subscriber that falls
+behind is told to resync instead of slowing down the writers. Recent
+events are kept in a ring buffer so a reconnecting client can resume from
+its ``Last-Event-ID``.
+
+With the ``redis`` backend every worker publishes its events to one Redis
+channel and fans out what it receives from it, so a client sees the
+check-ins of all workers and event ids are shared between workers. With
+the ``memory`` backend events are per worker: a client only sees commits
+made by the worker that serves its stream, and event ids from another
+worker (or from before a restart) produce a ``reset`` event instead.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date
+from app.services.change_tracker import on_commit
+
+
+class StreamSubscription:
+    """One connected client: a bounded event queue and its branch scope"""
+
+    def __init__(self, branch_ids, max_queue):
+        self.branch_ids = branch_ids
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def accepts(self, branch_id):
+        return self.branch_ids is None or branch_id in self.branch_ids
+
+    def next_event(self, timeout):
+        """Next queued event, or None after ``timeout`` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisEventChannel:
+    """Attendance events shared by all workers through Redis pub/sub
+
+    A script numbers and publishes each event atomically, so every worker
+    receives events in sequence order.
+    """
+
+    PUBLISH_SCRIPT = """
+        local sequence = redis.call('INCR', KEYS[1])
+        redis.call('PUBLISH', KEYS[2], sequence .. ' ' .. ARGV[1])
+        return sequence
+    """
+
+    def __init__(self, url, prefix='gym:attendance:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("ATTENDANCE_STREAM_BACKEND='redis' requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self._publish = self._redis.register_script(self.PUBLISH_SCRIPT)
+        self.sequence_key = prefix + 'sequence'
+        self.channel = prefix + 'events'
+        self._redis.set(prefix + 'epoch', uuid.uuid4().hex[:8], nx=True)
+        self.epoch = self._redis.get(prefix + 'epoch').decode('utf-8')
+
+    def publish(self, branch_id, event_type, data):
+        self._publish(keys=[self.sequence_key, self.channel], args=[json.dumps([branch_id, event_type, data])])
+
+    def listen(self, deliver, resync):
+        """Deliver received events forever; ``resync`` runs after (re)subscribing"""
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Subscribed first, so no event numbered after this value is missed
+                resync(int(self._redis.get(self.sequence_key) or 0))
+                for message in pubsub.listen():
+                    sequence, _, payload = message['data'].decode('utf-8').partition(' ')
+                    branch_id, event_type, data = json.loads(payload)
+                    deliver(int(sequence), branch_id, event_type, data)
+            except Exception as e:
+                print(f"[STREAM] Redis subscription lost, reconnecting: {e}")
+                time.sleep(1)
+
+
+class AttendanceBroker:
+    """Fan-out of committed attendance changes to stream subscribers"""
+
+    def __init__(self):
+        self.enabled = False
+        self.max_queue = 100
+        self.max_subscribers = 200
+        self.heartbeat = 15
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._buffer = deque(maxlen=500)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._channel = None
+        self._listener = None
+        self._synced = threading.Event()
+
+    def init_app(self, app):
+        """Configure from app config and subscribe to attendance commits"""
+        from app.models.attendance import Attendance
+
+        self._model = Attendance
+        self.enabled = app.config.get('ATTENDANCE_STREAM_ENABLED', True)
+        self.max_queue = app.config.get('ATTENDANCE_STREAM_QUEUE_SIZE', 100)
+        self.max_subscribers = app.config.get('ATTENDANCE_STREAM_MAX_SUBSCRIBERS', 200)
+        self.heartbeat = app.config.get('ATTENDANCE_STREAM_HEARTBEAT', 15)
+        self._buffer = deque(maxlen=app.config.get('ATTENDANCE_STREAM_BUFFER', 500))
+        if self.enabled and app.config.get('ATTENDANCE_STREAM_BACKEND', 'memory') == 'redis':
+            self._channel = RedisEventChannel(app.config['DASHBOARD_CACHE_REDIS_URL'])
+            self.epoch = self._channel.epoch
+        if self.enabled:
+            on_commit(self._on_commit, Attendance)
+
+    def event_id(self, sequence):
+        return f'{self.epoch}-{sequence}'
+
+    def subscribe(self, branch_ids=None, last_event_id=None):
+        """Register a subscriber; returns ``(subscription, backlog)``
+
+        ``backlog`` holds the buffered events after ``last_event_id``, or a
+        single ``reset`` event when that id can no longer be resumed.
+        Returns ``(None, None)`` when the subscriber limit is reached.
+        """
+        self._start_listener()
+        subscription = StreamSubscription(branch_ids, self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None, None
+
+            backlog = []
+            if last_event_id:
+                epoch, _, sequence = last_event_id.partition('-')
+                oldest = self._buffer[0][0] if self._buffer else self._sequence + 1
+                resumable = epoch == self.epoch and sequence.isdigit() and int(sequence) >= oldest - 1
+                if resumable:
+                    backlog = [
+                        event for event in self._buffer
+                        if event[0] > int(sequence) and subscription.accepts(event[1])
+                    ]
+                else:
+                    backlog = [self.reset_event()]
+
+            self._subscribers.add(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def snapshot_event(self, summary):
+        """Occupancy summary sent on connect; its id resumes from the current event"""
+        return (self._sequence, None, 'occupancy', summary)
+
+    def reset_event(self):
+        """Tells the client to reload today's attendance before continuing"""
+        return (self._sequence, None, 'reset', {'reason': 'Event history unavailable; reload attendance'})
+
+    def _start_listener(self):
+        """Receive shared events in this worker (started lazily, after any fork)"""
+        if self._channel is None or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._channel.listen, args=(self._deliver, self._resync),
+                    name='attendance-stream', daemon=True
+                )
+                self._listener.start()
+        # Resume checks need the shared sequence
+        self._synced.wait(5)
+
+    def _resync(self, sequence):
+        """Restart numbering at the shared sequence; events missed while disconnected cannot be resumed"""
+        with self._lock:
+            missed = sequence > self._sequence and self._sequence > 0
+            if missed:
+                self._buffer.clear()
+            self._sequence = sequence
+            subscribers = list(self._subscribers) if missed else []
+        self._synced.set()
+        for subscription in subscribers:
+            subscription.overflowed = True
+
+    def publish(self, branch_id, event_type, data):
+        """Publish an event to every worker (redis) or to this worker's subscribers"""
+        if self._channel is not None:
+            self._channel.publish(branch_id, event_type, data)
+            return
+        self._deliver(None, branch_id, event_type, data)
+
+    def _deliver(self, sequence, branch_id, event_type, data):
+        """Buffer an event and queue it for every matching subscriber (``sequence`` None: next local one)"""
+        with self._lock:
+            if sequence is None:
+                sequence = self._sequence + 1
+            self._sequence = max(self._sequence, sequence)
+            event = (sequence, branch_id, event_type, data)
+            self._buffer.append(event)
+            subscribers = [subscription for subscription in self._subscribers if subscription.accepts(branch_id)]
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def format(self, event):
+        """Server-sent event frame for an event tuple"""
+        sequence, _, event_type, data = event
+        return f'id: {self.event_id(sequence)}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+    def _on_commit(self, changes):
+        from app.services.occupancy import occupancy_tracker
+        from app.services.eligibility_index import eligibility_index
+
+        today = date.today()
+        for change in changes:
+            if change.model is not self._model or change.action == 'delete':
+                continue
+            values = change.values
+            if values['entry_date'] != today:
+                continue
+
+            if change.action == 'insert':
+                event_type, delta = ('checkin', 1) if values['access_granted'] else ('denied', 0)
+            elif 'exit_time' in change.changed and values['exit_time'] is not None and values['access_granted']:
+                event_type, delta = 'checkout', -1
+            else:
+                continue
+
+            branch_id = values['branch_id']
+            self.publish(branch_id, event_type, {
+                'attendance': {
+                    'id': values['id'],
+                    'customer_id': values['customer_id'],
+                    'branch_id': branch_id,
+                    'entry_time': values['entry_time'].strftime('%H:%M:%S') if values['entry_time'] else None,
+                    'exit_time': values['exit_time'].strftime('%H:%M:%S') if values['exit_time'] else None,
+                    'entry_method': values['entry_method'],
+                    'denial_reason': values['denial_reason']
+                },
+                'customer': eligibility_index.customer_summary(values['customer_id']),
+                'occupancy': {
+                    'branch_id': branch_id,
+                    'delta': delta,
+                    'currently_in_gym': occupancy_tracker.in_gym(branch_id)
+                }
+            })
+
+    def stats(self):
+        """Subscriber and buffer counters for this worker"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'subscribers': len(self._subscribers),
+                'buffered_events': len(self._buffer),
+                'last_event_id': self.event_id(self._sequence)
+            }
+
+
+attendance_broker = AttendanceBroker()
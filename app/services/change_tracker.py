@@ -0,0 +1,128 @@
+"""Commit-time change notifications
+
+Subsystems that keep derived state outside the database (caches, in-memory
+indexes, live counters) subscribe here instead of hooking the session
+themselves. Changes to tracked models are collected per session during
+flushes and handed to subscribers only once the transaction has committed,
+so a rolled-back write never leaks into derived state.
+"""
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from app.database import db
+
+# model: mapped class; action: 'insert' | 'update' | 'delete'
+# values: column values after the write (before it, for deletes)
+# previous: pre-update values of the changed columns, where known (updates only)
+# changed: keys of the changed columns (updates only)
+Change = namedtuple('Change', ['model', 'action', 'values', 'previous', 'changed'])
+
+_tracked_models = set()
+_subscribers = []
+_listeners_registered = False
+
+
+def _column_values(obj):
+    """Snapshot of an object's column attributes"""
+    mapper = inspect(obj).mapper
+    return {attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs}
+
+
+def _changed_columns(obj):
+    """Changed column keys of obj, with their pre-flush values where known
+
+    Returns ``(changed, previous)``. Old values of attributes that were
+    expired when they were set are unknown and absent from ``previous``.
+    """
+    state = inspect(obj)
+    changed, previous = [], {}
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if history.has_changes():
+            changed.append(attr.key)
+            if history.deleted:
+                previous[attr.key] = history.deleted[0]
+    return changed, previous
+
+
+def _pending(session):
+    return session.info.setdefault('pending_changes', [])
+
+
+def _before_flush(session, flush_context, instances):
+    """Snapshot rows about to be deleted while their attributes are loadable"""
+    for obj in session.deleted:
+        if type(obj) in _tracked_models:
+            _pending(session).append(Change(type(obj), 'delete', _column_values(obj), {}, ()))
+
+
+def _after_flush(session, flush_context):
+    """Record inserts and updates of tracked models"""
+    for obj in session.new:
+        if type(obj) in _tracked_models:
+            _pending(session).append(Change(type(obj), 'insert', _column_values(obj), {}, ()))
+
+    for obj in session.dirty:
+        if type(obj) not in _tracked_models or obj in session.deleted:
+            continue
+        changed, previous = _changed_columns(obj)
+        if changed:
+            _pending(session).append(Change(type(obj), 'update', _column_values(obj), previous, tuple(changed)))
+
+
+def _after_commit(session):
+    """Hand the committed changes to every subscriber"""
+    changes = session.info.pop('pending_changes', None)
+    if not changes:
+        return
+
+    for callback in list(_subscribers):
+        try:
+            callback(changes)
+        except Exception as e:
+            # Derived state must never break a request whose data is already committed
+            print(f"[CHANGES] Subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def _after_soft_rollback(session, previous_transaction):
+    """Forget changes from a transaction that was rolled back"""
+    if previous_transaction.parent is None:
+        session.info.pop('pending_changes', None)
+
+
+def register_change_tracking():
+    """Hook change collection into the shared session (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    event.listen(db.session, 'before_flush', _before_flush)
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_soft_rollback', _after_soft_rollback)
+    _listeners_registered = True
+
+
+def on_commit(callback, *models):
+    """Subscribe callback(changes) to committed changes of the given models
+
+    The callback receives every committed change of any tracked model and
+    is expected to filter for the ones it cares about.
+    """
+    _tracked_models.update(models)
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+    register_change_tracking()
+
+
+def branch_ids(changes, *models):
+    """Branch ids touched by changes to the given models (old and new values)"""
+    touched = set()
+    for change in changes:
+        if models and change.model not in models:
+            continue
+        branch_id = change.values.get('branch_id')
+        if branch_id is not None:
+            touched.add(branch_id)
+        if change.previous.get('branch_id') is not None:
+            touched.add(change.previous['branch_id'])
+    return touched
@@ -0,0 +1,268 @@
+"""Dashboard response cache
+
+Dashboard payloads are cached per (endpoint, branch scope, date range).
+Every cache key embeds the current version of its branch scope; a commit
+touching a branch bumps that branch's version (and the system-wide one),
+which makes every stale entry for it unreachable at once. Entries also
+expire after a TTL to bound staleness for time-based metrics.
+
+Two backends are available:
+- ``memory``: in-process LRU with TTL (default, per worker)
+- ``redis``: shared across workers; requires the ``redis`` package
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from flask import request, current_app
+from app.services.change_tracker import on_commit, branch_ids
+
+ALL_BRANCHES = 'all'
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        # Versions restart at 0 in every process; the epoch keeps their keys distinct
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self, scope):
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def bump_version(self, scope):
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared by all workers through Redis"""
+
+    def __init__(self, url, prefix='gym:dashboard:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("DASHBOARD_CACHE_BACKEND='redis' requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.epoch = 'shared'
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['status'], entry['body'].encode('utf-8'), entry['mimetype']
+
+    def set(self, key, value, ttl):
+        status, body, mimetype = value
+        entry = json.dumps({'status': status, 'body': body.decode('utf-8'), 'mimetype': mimetype})
+        self._redis.set(self.prefix + key, entry, ex=max(int(ttl), 1))
+
+    def get_version(self, scope):
+        return int(self._redis.get(f'{self.prefix}version:{scope}') or 0)
+
+    def bump_version(self, scope):
+        self._redis.incr(f'{self.prefix}version:{scope}')
+
+    def clear(self):
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+    def size(self):
+        return None
+
+
+class DashboardCache:
+    """Versioned dashboard payload cache with hit/miss counters"""
+
+    def __init__(self):
+        self.backend = None
+        # Rows whose commits invalidate dashboards for their branch
+        self.invalidating_models = ()
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the backend from app config and subscribe to commits"""
+        from app.models.payment import Payment
+        from app.models.attendance import Attendance
+        from app.models.subscription import Subscription
+        from app.models.customer import Customer
+        from app.models.complaint import Complaint
+
+        backend = app.config.get('DASHBOARD_CACHE_BACKEND', 'memory')
+        self.ttl = app.config.get('DASHBOARD_CACHE_TTL', 60)
+        if backend == 'redis':
+            self.backend = RedisCacheBackend(app.config['DASHBOARD_CACHE_REDIS_URL'])
+        elif backend == 'memory':
+            self.backend = MemoryCacheBackend(app.config.get('DASHBOARD_CACHE_MAX_ENTRIES', 1024))
+        else:
+            self.backend = None
+
+        self.invalidating_models = (Payment, Attendance, Subscription, Customer, Complaint)
+        on_commit(self._on_commit, *self.invalidating_models)
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def version_token(self, scope):
+        """Opaque token that changes whenever data in scope changes"""
+        return f'{self.backend.epoch}.{self.backend.get_version(scope)}'
+
+    def make_key(self, endpoint, scope, params):
+        """Cache key for an endpoint, branch scope and request parameters"""
+        version = self.version_token(scope)
+        query = '&'.join(f'{name}={value}' for name, value in sorted(params.items()))
+        return f'{endpoint}:{scope}:v{version}:{query}'
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate_branches(self, touched):
+        """Invalidate every entry for the given branches and all system-wide entries"""
+        if not self.enabled:
+            return
+        for branch_id in touched:
+            self.backend.bump_version(branch_id)
+        self.backend.bump_version(ALL_BRANCHES)
+        with self._lock:
+            self.invalidations += 1
+
+    def _on_commit(self, changes):
+        relevant = [change for change in changes if change.model in self.invalidating_models]
+        if relevant:
+            self.invalidate_branches(branch_ids(relevant))
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__ if self.backend else None,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'invalidations': self.invalidations,
+                'entries': self.backend.size() if self.backend else 0
+            }
+
+
+dashboard_cache = DashboardCache()
+
+
+def cached_dashboard(endpoint, scope, vary=None):
+    """Cache a dashboard view's 200 responses
+
+    ``scope(current_user, **view_kwargs)`` returns the branch id the payload
+    depends on, or ``ALL_BRANCHES``. ``vary(current_user)`` optionally
+    returns an extra key component for payloads (or permission checks)
+    that differ by role. Users without access to the scope bypass the cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not dashboard_cache.enabled:
+                return f(*args, **kwargs)
+
+            current_user = kwargs['current_user']
+            view_kwargs = {name: value for name, value in kwargs.items() if name != 'current_user'}
+            params = dict(request.args.items())
+            # Default date ranges are relative to today
+            params['_today'] = date.today().isoformat()
+            if vary:
+                params['_vary'] = vary(current_user)
+
+            scope_value = scope(current_user, **view_kwargs)
+            if scope_value != ALL_BRANCHES and not current_user.has_branch_access(scope_value):
+                # Let the view produce its own access error; never serve another branch's payload
+                return f(*args, **kwargs)
+
+            key = dashboard_cache.make_key(endpoint, scope_value, params)
+            cached = dashboard_cache.get(key)
+            if cached is not None:
+                status, body, mimetype = cached
+                response = current_app.response_class(body, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                dashboard_cache.set(key, (response.status_code, response.get_data(), response.mimetype))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
+
+
+def user_scope(current_user, **view_kwargs):
+    """Owners see every branch; everyone else is scoped to their own"""
+    return ALL_BRANCHES if current_user.role == 'owner' else current_user.branch_id
+
+
+def dashboard_version(scope):
+    """Conditional-GET version function for a cached dashboard view
+
+    The token combines the scope's cache version with the date and the
+    current TTL window, so time-dependent metrics are revalidated at least
+    as often as cached payloads expire.
+    """
+    def version(current_user, **view_kwargs):
+        if not dashboard_cache.enabled:
+            return None
+        scope_value = scope(current_user, **view_kwargs)
+        if scope_value != ALL_BRANCHES and not current_user.has_branch_access(scope_value):
+            return None
+
+        window = int(time.time() // max(int(dashboard_cache.ttl), 1))
+        token = f'{dashboard_cache.version_token(scope_value)}:{date.today().isoformat()}:{window}'
+        return token, None
+    return version
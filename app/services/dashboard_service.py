@@ -0,0 +1,404 @@
+"""Dashboard aggregation service
+
+Every dashboard metric is expressed as a conditional aggregate
+(``SUM(CASE WHEN ... THEN ... ELSE 0 END)``) so that all metrics read from
+the same table are computed by a single grouped query, no matter how many
+of them a dashboard asks for.
+"""
+from datetime import date, timedelta
+from sqlalchemy import func, case, and_, or_, cast, Date
+from app.database import db
+from app.models.subscription import Subscription, SubscriptionPlan
+from app.models.customer import Customer
+from app.models.payment import Payment
+from app.models.complaint import Complaint
+from app.models.branch import Branch
+from app.models.branch_stats import BranchDailyStats, PAYMENT_METHODS
+
+
+def count_if(condition):
+    """Count rows matching condition"""
+    return func.sum(case((condition, 1), else_=0))
+
+
+def sum_if(condition, column):
+    """Sum column over rows matching condition"""
+    return func.sum(case((condition, column), else_=0))
+
+
+def aggregate_by_branch(model, metrics, *criteria):
+    """Run one grouped query computing every metric per branch
+
+    ``metrics`` maps a metric name to a ``count_if``/``sum_if`` expression.
+    Returns ``{branch_id: {metric: value}}`` for every branch that has at
+    least one row matching ``criteria``.
+    """
+    names = list(metrics)
+    query = db.session.query(
+        model.branch_id,
+        *[metrics[name].label(name) for name in names]
+    )
+    if criteria:
+        query = query.filter(*criteria)
+
+    results = {}
+    for row in query.group_by(model.branch_id).all():
+        results[row.branch_id] = {name: getattr(row, name) or 0 for name in names}
+    return results
+
+
+def total(per_branch, metric):
+    """Sum a metric across all branches of an aggregate result"""
+    return sum(values[metric] for values in per_branch.values())
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def date_bucket(column, granularity, dialect):
+    """SQL expression truncating a date column to the start of its day/week/month
+
+    Weeks start on Monday. Only SQLite and PostgreSQL are supported.
+    """
+    if dialect == 'postgresql':
+        if granularity == 'day':
+            return column
+        return cast(func.date_trunc(granularity, column), Date)
+    if granularity == 'week':
+        # 'weekday 0' moves forward to Sunday (or stays); six days back is Monday
+        return func.date(column, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.date(column, 'start of month')
+    return func.date(column)
+
+
+def shift_date(column, days, dialect):
+    """SQL expression adding a number of days to a date column"""
+    if dialect == 'postgresql':
+        return column + days
+    return func.date(column, f'+{days} days')
+
+
+def minutes_between(start, end, dialect):
+    """SQL expression for the minutes from one time column to another
+
+    An end earlier than the start is taken to be on the next day, as in
+    ``Attendance.calculate_duration``.
+    """
+    if dialect == 'postgresql':
+        minutes = func.extract('epoch', end - start) / 60
+    else:
+        # julianday() is a float; round off its error (well below a millisecond)
+        minutes = func.round((func.julianday(end) - func.julianday(start)) * 1440, 4)
+    return case((end < start, minutes + 1440), else_=minutes)
+
+
+def bucket_start(value, granularity):
+    """Python counterpart of date_bucket"""
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value, granularity):
+    """Start of the bucket following the one starting at value"""
+    if granularity == 'week':
+        return value + timedelta(days=7)
+    if granularity == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+class DashboardService:
+    """Metric definitions and aggregation for dashboards"""
+
+    @staticmethod
+    def rollup_metrics(start_date, end_date, today):
+        """Revenue, attendance and signup metrics read from branch_daily_stats"""
+        in_period = and_(BranchDailyStats.stat_date >= start_date, BranchDailyStats.stat_date <= end_date)
+        is_today = BranchDailyStats.stat_date == today
+        last_week = BranchDailyStats.stat_date >= today - timedelta(days=7)
+        metrics = {
+            'revenue': sum_if(in_period, BranchDailyStats.completed_revenue),
+            'payments': sum_if(in_period, BranchDailyStats.completed_count),
+            'refunded': sum_if(in_period, BranchDailyStats.refunded_amount),
+            'pending_amount': sum_if(in_period, BranchDailyStats.pending_amount),
+            'pending_recent': sum_if(last_week, BranchDailyStats.pending_count),
+            'granted': sum_if(in_period, BranchDailyStats.entries_granted),
+            'new_customers': sum_if(in_period, BranchDailyStats.new_customers),
+            'revenue_today': sum_if(is_today, BranchDailyStats.completed_revenue),
+            'granted_today': sum_if(is_today, BranchDailyStats.entries_granted),
+            'new_customers_today': sum_if(is_today, BranchDailyStats.new_customers)
+        }
+        for method in PAYMENT_METHODS:
+            metrics[f'{method}_count'] = sum_if(in_period, getattr(BranchDailyStats, f'{method}_count'))
+            metrics[f'{method}_revenue'] = sum_if(in_period, getattr(BranchDailyStats, f'{method}_revenue'))
+        return metrics, or_(in_period, is_today, last_week)
+
+    @staticmethod
+    def branch_rollup(branch_id, start_date, end_date, today):
+        """Rollup metrics for a single branch (zeros when it has no rollup rows)"""
+        metrics, where = DashboardService.rollup_metrics(start_date, end_date, today)
+        per_branch = aggregate_by_branch(BranchDailyStats, metrics, where, BranchDailyStats.branch_id == branch_id)
+        return per_branch.get(branch_id, {name: 0 for name in metrics})
+
+    @staticmethod
+    def payment_method_breakdown(rollup):
+        """Completed payments per method from rollup metrics"""
+        return [{
+            'method': method,
+            'count': rollup[f'{method}_count'],
+            'amount': float(rollup[f'{method}_revenue'])
+        } for method in sorted(PAYMENT_METHODS) if rollup[f'{method}_count']]
+
+    @staticmethod
+    def payment_totals(start_date, end_date, branch_id=None):
+        """Completed, pending, refunded and cash totals in one aggregate over payments
+
+        Scoped to branch_id when given; every total shares the same filter.
+        """
+        completed = Payment.status == 'completed'
+        completed_cash = and_(completed, Payment.payment_method == 'cash')
+        query = db.session.query(
+            sum_if(completed, Payment.amount).label('total_revenue'),
+            sum_if(Payment.status == 'pending', Payment.amount).label('pending_amount'),
+            sum_if(Payment.status == 'refunded', Payment.amount).label('refunded_amount'),
+            count_if(completed_cash).label('cash_count'),
+            sum_if(completed_cash, Payment.amount).label('cash_total')
+        ).filter(
+            Payment.payment_date >= start_date,
+            Payment.payment_date <= end_date
+        )
+        if branch_id is not None:
+            query = query.filter(Payment.branch_id == branch_id)
+
+        row = query.one()
+        return {name: getattr(row, name) or 0 for name in row._fields}
+
+    @staticmethod
+    def revenue_series(start_date, end_date, granularity='day', branch_id=None):
+        """Completed revenue per day/week/month with the previous period alongside
+
+        The previous period is the equally long range ending the day before
+        start_date. Its rows are shifted forward by the period length so both
+        periods are bucketed and summed by the same single query. Buckets
+        without revenue are filled with zeros.
+        """
+        dialect = db.session.get_bind().dialect.name
+        period_days = (end_date - start_date).days + 1
+        previous_start = start_date - timedelta(days=period_days)
+
+        is_current = BranchDailyStats.stat_date >= start_date
+        aligned_date = case(
+            (is_current, BranchDailyStats.stat_date),
+            else_=shift_date(BranchDailyStats.stat_date, period_days, dialect)
+        )
+        bucket = date_bucket(aligned_date, granularity, dialect).label('bucket')
+
+        query = db.session.query(
+            bucket,
+            sum_if(is_current, BranchDailyStats.completed_revenue).label('amount'),
+            sum_if(~is_current, BranchDailyStats.completed_revenue).label('previous_amount')
+        ).filter(
+            BranchDailyStats.stat_date >= previous_start,
+            BranchDailyStats.stat_date <= end_date
+        )
+        if branch_id is not None:
+            query = query.filter(BranchDailyStats.branch_id == branch_id)
+
+        totals = {}
+        for row in query.group_by(bucket).all():
+            # SQLite returns dates as ISO strings
+            key = row.bucket if isinstance(row.bucket, date) else date.fromisoformat(row.bucket)
+            totals[key] = (row.amount or 0, row.previous_amount or 0)
+
+        series = []
+        current = bucket_start(start_date, granularity)
+        while current <= end_date:
+            amount, previous_amount = totals.get(current, (0, 0))
+            series.append({
+                'date': current.isoformat(),
+                'amount': float(amount),
+                'previous_amount': float(previous_amount)
+            })
+            current = next_bucket(current, granularity)
+
+        return {
+            'granularity': granularity,
+            'previous_period': {
+                'start_date': previous_start.isoformat(),
+                'end_date': (start_date - timedelta(days=1)).isoformat()
+            },
+            'series': series
+        }
+
+    @staticmethod
+    def subscription_metrics(today, expiring_days=7):
+        """Subscription metrics keyed by name, plus the WHERE clause covering them"""
+        active = Subscription.status == 'active'
+        metrics = {
+            'active': count_if(active),
+            'expiring_soon': count_if(and_(
+                active,
+                Subscription.end_date >= today,
+                Subscription.end_date <= today + timedelta(days=expiring_days)
+            )),
+            'expiring_today': count_if(and_(active, Subscription.end_date == today))
+        }
+        return metrics, active
+
+    @staticmethod
+    def complaint_metrics():
+        """Complaint metrics keyed by name, plus the WHERE clause covering them"""
+        open_status = Complaint.status.in_(['open', 'in_progress'])
+        metrics = {
+            'open': count_if(open_status),
+            'critical': count_if(and_(open_status, Complaint.priority == 'critical'))
+        }
+        return metrics, open_status
+
+    @staticmethod
+    def owner_overview(start_date, end_date, today):
+        """System-wide summary, per-branch breakdowns and alert counts
+
+        Runs exactly one grouped query per table; revenue, attendance and
+        signups come from the branch daily rollup.
+        """
+        metrics, where = DashboardService.rollup_metrics(start_date, end_date, today)
+        rollup = aggregate_by_branch(BranchDailyStats, metrics, where)
+
+        metrics, where = DashboardService.subscription_metrics(today)
+        subscriptions = aggregate_by_branch(Subscription, metrics, where)
+
+        metrics, where = DashboardService.complaint_metrics()
+        complaints = aggregate_by_branch(Complaint, metrics, where)
+
+        branch_ids = set(rollup) | set(subscriptions)
+        branches = {}
+        if branch_ids:
+            branches = {
+                branch.id: branch
+                for branch in Branch.query.filter(Branch.id.in_(branch_ids)).all()
+            }
+
+        return {
+            'summary': {
+                'total_revenue': float(total(rollup, 'revenue')),
+                'new_customers': total(rollup, 'new_customers'),
+                'active_subscriptions': total(subscriptions, 'active'),
+                'total_attendance': total(rollup, 'granted'),
+                'expiring_subscriptions': total(subscriptions, 'expiring_soon'),
+                'open_complaints': total(complaints, 'open')
+            },
+            'revenue_by_branch': [{
+                'branch_name': branches[branch_id].name,
+                'branch_code': branches[branch_id].code,
+                'revenue': float(values['revenue']),
+                'payments': values['payments']
+            } for branch_id, values in sorted(rollup.items()) if values['payments']],
+            'subscriptions_by_branch': [{
+                'branch_name': branches[branch_id].name,
+                'branch_code': branches[branch_id].code,
+                'active_subscriptions': values['active']
+            } for branch_id, values in sorted(subscriptions.items()) if values['active']],
+            'alert_counts': {
+                'critical_complaints': total(complaints, 'critical'),
+                'expiring_today': total(subscriptions, 'expiring_today'),
+                'pending_payments': total(rollup, 'pending_recent')
+            }
+        }
+
+    @staticmethod
+    def popular_plans_by_branch(branch_ids, since, limit=5):
+        """Most subscribed plans per branch since a date, in one grouped query"""
+        subscription_count = func.count(Subscription.id)
+        rows = db.session.query(
+            Subscription.branch_id,
+            SubscriptionPlan.name,
+            subscription_count.label('count')
+        ).join(SubscriptionPlan).filter(
+            Subscription.branch_id.in_(branch_ids),
+            Subscription.status.in_(['active', 'pending']),
+            Subscription.created_at >= since
+        ).group_by(
+            Subscription.branch_id, SubscriptionPlan.id, SubscriptionPlan.name
+        ).order_by(Subscription.branch_id, subscription_count.desc(), SubscriptionPlan.id).all()
+
+        plans = {branch_id: [] for branch_id in branch_ids}
+        for row in rows:
+            if len(plans[row.branch_id]) < limit:
+                plans[row.branch_id].append({
+                    'plan_name': row.name,
+                    'subscription_count': row.count
+                })
+        return plans
+
+    @staticmethod
+    def branch_dashboards(branches, start_date, end_date, today):
+        """Branch dashboard payloads for many branches
+
+        Each metric is computed by one query grouped by branch, so the number
+        of queries does not depend on the number of branches. Returns
+        ``{branch_id: payload}``.
+        """
+        branch_ids = [branch.id for branch in branches]
+        if not branch_ids:
+            return {}
+
+        metrics, where = DashboardService.rollup_metrics(start_date, end_date, today)
+        rollup = aggregate_by_branch(BranchDailyStats, metrics, where, BranchDailyStats.branch_id.in_(branch_ids))
+        empty_rollup = {name: 0 for name in metrics}
+
+        customers = aggregate_by_branch(
+            Customer, {'total_active': count_if(Customer.is_active == True)},
+            Customer.branch_id.in_(branch_ids)
+        )
+
+        metrics, where = DashboardService.subscription_metrics(today)
+        subscriptions = aggregate_by_branch(Subscription, metrics, where, Subscription.branch_id.in_(branch_ids))
+
+        metrics, where = DashboardService.complaint_metrics()
+        complaints = aggregate_by_branch(Complaint, metrics, where, Complaint.branch_id.in_(branch_ids))
+
+        popular_plans = DashboardService.popular_plans_by_branch(branch_ids, start_date)
+
+        payloads = {}
+        for branch in branches:
+            values = rollup.get(branch.id, empty_rollup)
+            revenue = float(values['revenue'])
+            target_progress = 0
+            if branch.monthly_target:
+                target_progress = (revenue / float(branch.monthly_target)) * 100
+
+            payloads[branch.id] = {
+                'branch': branch.to_dict(),
+                'period': {
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat()
+                },
+                'financial': {
+                    'revenue': revenue,
+                    'monthly_target': float(branch.monthly_target) if branch.monthly_target else 0,
+                    'target_progress_percent': round(target_progress, 1)
+                },
+                'customers': {
+                    'total_active': customers.get(branch.id, {}).get('total_active', 0),
+                    'new_this_period': values['new_customers']
+                },
+                'subscriptions': {
+                    'active': subscriptions.get(branch.id, {}).get('active', 0),
+                    'expiring_soon': subscriptions.get(branch.id, {}).get('expiring_soon', 0)
+                },
+                'attendance': {
+                    'today': values['granted_today'],
+                    'period_total': values['granted']
+                },
+                'popular_plans': popular_plans[branch.id],
+                'payment_methods': DashboardService.payment_method_breakdown(values),
+                'complaints': {
+                    'open': complaints.get(branch.id, {}).get('open', 0)
+                }
+            }
+        return payloads
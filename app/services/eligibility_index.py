@@ -0,0 +1,367 @@
+"""In-memory check-in eligibility index
+
+Each worker keeps, per customer, everything ``AttendanceValidation`` needs
+to grant or deny entry: account status, active subscriptions (branch,
+period, freeze window) and today's open entries. Commits made by this
+worker are applied to it immediately through the change tracker. With the
+``redis`` backend every worker also publishes the customers its commits
+touched, and the other workers drop those records so the next swipe
+reloads them; the index is then authoritative and a hit needs no query.
+
+The index is rebuilt (three queries) by a background thread on first use,
+at midnight and every ``ELIGIBILITY_INDEX_REFRESH`` seconds, which also
+picks up writes made outside the application; lookups keep serving the
+previous snapshot meanwhile, and changes committed during a build are
+replayed onto the new one. Customers missing from the index are loaded
+from the database on demand.
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import date
+from sqlalchemy.pool import StaticPool
+from app.database import db
+from app.services.change_tracker import on_commit
+
+
+class RedisInvalidationChannel:
+    """Customer ids touched by each worker's commits, shared through Redis pub/sub"""
+
+    def __init__(self, url, channel='gym:eligibility:invalidate'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("ELIGIBILITY_INDEX_BACKEND='redis' requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def publish(self, origin, customer_ids, user_ids):
+        self._redis.publish(self.channel, json.dumps([origin, customer_ids, user_ids]))
+
+    def listen(self, origin, invalidate, resync):
+        """Apply other workers' invalidations forever; ``resync`` runs after each reconnect"""
+        connected = False
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if connected:
+                    resync()
+                connected = True
+                for message in pubsub.listen():
+                    sender, customer_ids, user_ids = json.loads(message['data'])
+                    if sender != origin:
+                        invalidate(customer_ids, user_ids)
+            except Exception as e:
+                print(f"[ELIGIBILITY] Redis subscription lost, reconnecting: {e}")
+                time.sleep(1)
+
+
+class EligibilityIndex:
+    """customer_id -> access record, maintained from committed changes"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.refresh_interval = 300
+        self._records = {}
+        self._customer_by_user = {}
+        self._built_on = None
+        self._built_at = 0
+        self._lock = threading.RLock()
+        self._builder = None
+        self._replay = None
+        self._channel = None
+        self._listener = None
+        self._origin = None
+        # Bumped by every applied change; a record loaded before a bump may be stale
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Configure from app config and subscribe to commits"""
+        from app.models.customer import Customer
+        from app.models.subscription import Subscription
+        from app.models.payment import Payment
+        from app.models.attendance import Attendance
+        from app.models.user import User
+
+        self.app = app
+        self.enabled = app.config.get('ELIGIBILITY_INDEX_ENABLED', True)
+        self.refresh_interval = app.config.get('ELIGIBILITY_INDEX_REFRESH', 300)
+        self._models = {
+            'customer': Customer, 'subscription': Subscription, 'payment': Payment,
+            'attendance': Attendance, 'user': User
+        }
+        if self.enabled and app.config.get('ELIGIBILITY_INDEX_BACKEND', 'memory') == 'redis':
+            self._channel = RedisInvalidationChannel(app.config['DASHBOARD_CACHE_REDIS_URL'])
+        if self.enabled:
+            on_commit(self._on_commit, Customer, Subscription, Payment, Attendance, User)
+
+    def _stale(self):
+        return (self._built_on != date.today() or
+                time.monotonic() - self._built_at > self.refresh_interval)
+
+    def _start_listener(self):
+        """Receive other workers' invalidations (started lazily, after any fork)"""
+        if self._channel is None or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._origin = uuid.uuid4().hex
+                self._listener = threading.Thread(
+                    target=self._channel.listen, args=(self._origin, self._invalidate, self._resync),
+                    name='eligibility-invalidations', daemon=True
+                )
+                self._listener.start()
+
+    def _resync(self):
+        """Invalidations may have been missed while disconnected: serve from the database until rebuilt"""
+        with self._lock:
+            self._records = {}
+            self._customer_by_user = {}
+            self._built_on = None
+            self._replay = None
+            self._version += 1
+
+    def refresh(self):
+        """Rebuild in a background thread unless one is already running"""
+        self._start_listener()
+        if isinstance(db.engine.pool, StaticPool):
+            # One connection shared by all threads (in-memory SQLite): a second thread would interleave with requests
+            try:
+                self.build()
+            except Exception as e:
+                self._replay = None
+                print(f"[ELIGIBILITY] Index rebuild failed: {e}")
+            return
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return
+            self._builder = threading.Thread(target=self._run_build, name='eligibility-index', daemon=True)
+            self._builder.start()
+
+    def _run_build(self):
+        with self.app.app_context():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"[ELIGIBILITY] Index rebuild failed: {e}")
+                with self._lock:
+                    self._replay = None
+                    # Retry after another interval rather than on every swipe
+                    self._built_at = time.monotonic()
+            finally:
+                db.session.remove()
+
+    def build(self):
+        """Load every customer's access record (three queries) and swap it in
+
+        Runs without the lock; commits applied meanwhile are recorded and
+        replayed onto the new records before they replace the old ones.
+        """
+        with self._lock:
+            self._replay = []
+        records, customer_by_user, today = self._load()
+        with self._lock:
+            if self._replay is None:
+                # Reset by _resync while loading
+                return 0
+            replay, self._replay = self._replay, None
+            self._records = records
+            self._customer_by_user = customer_by_user
+            for apply, args in replay:
+                apply(*args)
+            self._built_on = today
+            self._built_at = time.monotonic()
+        return len(records)
+
+    def _load(self):
+        models = self._models
+        Customer, Subscription, Attendance, User = (
+            models['customer'], models['subscription'], models['attendance'], models['user']
+        )
+        today = date.today()
+
+        records, customer_by_user = {}, {}
+        customers = db.session.query(
+            Customer.id, Customer.is_active, Customer.branch_id, Customer.member_id,
+            Customer.user_id, User.first_name, User.last_name
+        ).join(User, Customer.user_id == User.id).all()
+        for row in customers:
+            records[row.id] = {
+                'customer_id': row.id,
+                'is_active': row.is_active,
+                'branch_id': row.branch_id,
+                'user_id': row.user_id,
+                'customer': {'member_id': row.member_id, 'name': f"{row.first_name} {row.last_name}"},
+                'subscriptions': {},
+                'open_entries': set()
+            }
+            customer_by_user[row.user_id] = row.id
+
+        subscriptions = db.session.query(
+            Subscription.id, Subscription.customer_id, Subscription.branch_id,
+            Subscription.start_date, Subscription.end_date,
+            Subscription.current_freeze_start, Subscription.current_freeze_end
+        ).filter(Subscription.status == 'active', Subscription.end_date >= today).all()
+        for row in subscriptions:
+            if row.customer_id in records:
+                records[row.customer_id]['subscriptions'][row.id] = (
+                    row.branch_id, row.start_date, row.end_date,
+                    row.current_freeze_start, row.current_freeze_end
+                )
+
+        open_entries = db.session.query(Attendance.id, Attendance.customer_id).filter(
+            Attendance.entry_date == today,
+            Attendance.access_granted == True,
+            Attendance.exit_time.is_(None)
+        ).all()
+        for row in open_entries:
+            if row.customer_id in records:
+                records[row.customer_id]['open_entries'].add(row.id)
+
+        return records, customer_by_user, today
+
+    def version(self):
+        """Token to pass to ``put`` for a record loaded after this call"""
+        with self._lock:
+            return self._version
+
+    def get(self, customer_id):
+        """Access record for a customer, or None on a miss"""
+        if not self.enabled:
+            return None
+        if self._stale():
+            self.refresh()
+
+        with self._lock:
+            record = self._records.get(customer_id) if self._built_on is not None else None
+            if record is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return record
+
+    def customer_summary(self, customer_id):
+        """Member id and name of an indexed customer, without touching the database"""
+        with self._lock:
+            record = self._records.get(customer_id)
+            return dict(record['customer']) if record is not None else None
+
+    def put(self, record, version):
+        """Store a record loaded from the database after a miss
+
+        Skipped when a change was applied since ``version`` was taken, as it
+        may postdate the record.
+        """
+        if not self.enabled or self._built_on is None:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._records[record['customer_id']] = record
+            self._customer_by_user[record['user_id']] = record['customer_id']
+
+    def _on_commit(self, changes):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._apply, (changes,)))
+            self._apply(changes)
+            customer_ids, user_ids = self._touched(changes)
+        if self._channel is not None and (customer_ids or user_ids):
+            self._channel.publish(self._origin, customer_ids, user_ids)
+
+    def _touched(self, changes):
+        """Customer and user ids whose records the changes affect"""
+        models = self._models
+        customer_ids, user_ids = set(), set()
+        for change in changes:
+            values = change.values
+            if change.model is models['customer']:
+                customer_ids.add(values['id'])
+            elif change.model is models['user']:
+                user_ids.add(values['id'])
+            else:
+                customer_ids.add(values['customer_id'])
+                if 'customer_id' in change.previous:
+                    customer_ids.add(change.previous['customer_id'])
+        return sorted(customer_ids), sorted(user_ids)
+
+    def _invalidate(self, customer_ids, user_ids):
+        """Drop records another worker's commit touched; the next swipe reloads them"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._invalidate, (customer_ids, user_ids)))
+            self._version += 1
+            dropped = set(customer_ids) | {self._customer_by_user.get(user_id) for user_id in user_ids}
+            for customer_id in dropped:
+                self._records.pop(customer_id, None)
+
+    def _apply(self, changes):
+        models = self._models
+        with self._lock:
+            self._version += 1
+            for change in changes:
+                values = change.values
+                if change.model is models['subscription']:
+                    self._apply_subscription(change)
+                elif change.model is models['attendance']:
+                    self._apply_attendance(change)
+                elif change.model is models['customer']:
+                    record = self._records.get(values['id'])
+                    if change.action == 'delete':
+                        self._records.pop(values['id'], None)
+                    elif record is not None:
+                        record.update(is_active=values['is_active'], branch_id=values['branch_id'])
+                        record['customer']['member_id'] = values['member_id']
+                elif change.model is models['user']:
+                    record = self._records.get(self._customer_by_user.get(values['id']))
+                    if record is not None:
+                        record['customer']['name'] = f"{values['first_name']} {values['last_name']}"
+                elif change.model is models['payment']:
+                    # Payments can activate or extend subscriptions; reload the customer on next swipe
+                    self._records.pop(values['customer_id'], None)
+
+    def _apply_subscription(self, change):
+        values = change.values
+        if 'customer_id' in change.previous:
+            self._records.pop(change.previous['customer_id'], None)
+        record = self._records.get(values['customer_id'])
+        if record is None:
+            return
+        record['subscriptions'].pop(values['id'], None)
+        if change.action != 'delete' and values['status'] == 'active':
+            record['subscriptions'][values['id']] = (
+                values['branch_id'], values['start_date'], values['end_date'],
+                values['current_freeze_start'], values['current_freeze_end']
+            )
+
+    def _apply_attendance(self, change):
+        values = change.values
+        record = self._records.get(values['customer_id'])
+        if record is None:
+            return
+        record['open_entries'].discard(values['id'])
+        is_open = (
+            change.action != 'delete' and values['access_granted'] and
+            values['exit_time'] is None and values['entry_date'] == date.today()
+        )
+        if is_open:
+            record['open_entries'].add(values['id'])
+
+    def stats(self):
+        """Index size and hit/miss counters for this worker"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'customers': len(self._records),
+                'built_on': self._built_on.isoformat() if self._built_on else None,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+eligibility_index = EligibilityIndex()
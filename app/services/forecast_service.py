@@ -0,0 +1,149 @@
+"""Month-end revenue projection
+
+Remaining days of the month are forecast from each branch's day-of-week
+revenue profile over the trailing N complete weeks of the branch daily
+rollup. The profile only depends on days before today, so it is computed
+for all branches at once with NumPy and kept per trailing window for the
+rest of the day; the branch list and month-to-date actuals are read fresh
+on every call.
+"""
+import calendar
+import threading
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import and_
+from app.database import db
+from app.models.branch import Branch
+from app.models.branch_stats import BranchDailyStats
+from app.services.dashboard_service import sum_if, aggregate_by_branch
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# (day, weeks) -> {branch id: weekday means}; only the current day is kept
+_profile_cache = {}
+_profile_lock = threading.Lock()
+
+
+class ForecastService:
+    """Revenue projections from the branch daily rollup"""
+
+    @staticmethod
+    def revenue_matrix(branch_ids, start_date, days):
+        """Completed revenue as a (branches x days) array starting at start_date"""
+        matrix = np.zeros((len(branch_ids), days))
+        if not branch_ids:
+            return matrix
+
+        rows = db.session.query(
+            BranchDailyStats.branch_id,
+            BranchDailyStats.stat_date,
+            BranchDailyStats.completed_revenue
+        ).filter(
+            BranchDailyStats.branch_id.in_(branch_ids),
+            BranchDailyStats.stat_date >= start_date,
+            BranchDailyStats.stat_date < start_date + timedelta(days=days)
+        ).all()
+        if rows:
+            position = {branch_id: index for index, branch_id in enumerate(branch_ids)}
+            branch_index = np.array([position[row.branch_id] for row in rows])
+            day_index = np.array([(row.stat_date - start_date).days for row in rows])
+            matrix[branch_index, day_index] = np.array([float(row.completed_revenue or 0) for row in rows])
+        return matrix
+
+    @staticmethod
+    def weekday_profile(today, weeks, branch_ids):
+        """Mean revenue per weekday over the trailing complete weeks for ``branch_ids``
+
+        Returns an array of shape (branches, 7), Monday first. Means of every
+        branch are cached per ``weeks`` for the rest of ``today``; branches
+        added since then have no history and get zeros.
+        """
+        key = (today, weeks)
+        with _profile_lock:
+            cached = _profile_cache.get(key)
+        if cached is None:
+            cached = ForecastService._branch_means(today, weeks)
+            with _profile_lock:
+                for stale in [k for k in _profile_cache if k[0] != today]:
+                    del _profile_cache[stale]
+                _profile_cache[key] = cached
+
+        means = np.zeros((len(branch_ids), 7))
+        for index, branch_id in enumerate(branch_ids):
+            if branch_id in cached:
+                means[index] = cached[branch_id]
+        return means
+
+    @staticmethod
+    def _branch_means(today, weeks):
+        """branch id -> weekday means over the ``weeks`` complete weeks before today"""
+        branch_ids = [row.id for row in db.session.query(Branch.id).order_by(Branch.id).all()]
+        window_start = today - timedelta(days=7 * weeks)
+        history = ForecastService.revenue_matrix(branch_ids, window_start, 7 * weeks)
+
+        # Column j of each week is weekday (window_start + j)
+        by_position = history.reshape(len(branch_ids), weeks, 7).mean(axis=1)
+        weekday_of_position = (window_start.weekday() + np.arange(7)) % 7
+        means = np.empty_like(by_position)
+        means[:, weekday_of_position] = by_position
+        return dict(zip(branch_ids, means))
+
+    @staticmethod
+    def month_end_projection(today=None, weeks=8, branch_ids=None):
+        """Projected month-end revenue and target attainment per branch
+
+        Month-to-date revenue (including today) plus, for each remaining
+        day, the branch's trailing mean revenue for that weekday.
+        """
+        today = today or date.today()
+        month_start = today.replace(day=1)
+        month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+
+        query = Branch.query.order_by(Branch.id)
+        if branch_ids is not None:
+            query = query.filter(Branch.id.in_(branch_ids))
+        branches = query.all()
+        means = ForecastService.weekday_profile(today, weeks, [branch.id for branch in branches])
+
+        # Remaining days of the month counted per weekday
+        remaining_days = (month_end - today).days
+        remaining_weekdays = (today.weekday() + 1 + np.arange(remaining_days)) % 7
+        remaining_counts = np.bincount(remaining_weekdays, minlength=7)
+        projected_remaining = means @ remaining_counts
+
+        overall_mean = means.mean(axis=1, keepdims=True)
+        seasonality = np.divide(means, overall_mean, out=np.ones_like(means), where=overall_mean > 0)
+
+        in_month = and_(BranchDailyStats.stat_date >= month_start, BranchDailyStats.stat_date <= today)
+        actuals = aggregate_by_branch(
+            BranchDailyStats, {'revenue': sum_if(in_month, BranchDailyStats.completed_revenue)}, in_month
+        )
+
+        projections = []
+        for index, branch in enumerate(branches):
+            branch_id = branch.id
+            actual = float(actuals.get(branch_id, {}).get('revenue', 0))
+            projected = actual + float(projected_remaining[index])
+            target = float(branch.monthly_target) if branch.monthly_target else 0
+            projections.append({
+                'branch_id': branch_id,
+                'branch_name': branch.name,
+                'branch_code': branch.code,
+                'revenue_to_date': round(actual, 2),
+                'projected_remaining': round(float(projected_remaining[index]), 2),
+                'projected_month_end': round(projected, 2),
+                'monthly_target': target,
+                'projected_attainment_percent': round(projected / target * 100, 1) if target else None,
+                'on_track': projected >= target if target else None,
+                'weekday_seasonality': {
+                    WEEKDAYS[day]: round(float(seasonality[index, day]), 3) for day in range(7)
+                }
+            })
+
+        return {
+            'as_of': today.isoformat(),
+            'month_end': month_end.isoformat(),
+            'remaining_days': remaining_days,
+            'trailing_weeks': weeks,
+            'branches': projections
+        }
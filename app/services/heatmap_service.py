@@ -0,0 +1,172 @@
+"""Hour-of-day by day-of-week occupancy heatmaps
+
+For each branch and week the service returns a 7x24 grid (Monday first,
+hour 0 first) of visit counts by entry hour and of average and peak
+concurrent occupancy. Occupancy is derived from the entry/exit interval of
+every granted visit with a NumPy sweep over the minutes of the week: +1
+at each entry minute, -1 at each exit minute, cumulative sum, then reduced
+per hour.
+
+Only complete weeks are used, and each (branch, week) grid is cached for
+``HEATMAP_CACHE_TTL`` seconds, so serving every branch at once mostly
+reads memory; the TTL bounds how long late corrections to past weeks
+stay invisible. Visits without an exit time count as
+``HEATMAP_DEFAULT_VISIT_MINUTES`` long.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+from app.database import db
+from app.models.attendance import Attendance, AttendanceArchive
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# (branch_id, week_start, default_visit_minutes) -> (expires_at, grid arrays)
+_week_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def week_start(day):
+    """Monday of the week containing day"""
+    return day - timedelta(days=day.weekday())
+
+
+def _minute_of_day(values):
+    return np.array([value.hour * 60 + value.minute + value.second / 60 for value in values])
+
+
+class HeatmapService:
+    """Weekly occupancy grids per branch"""
+
+    @staticmethod
+    def compute_weeks(keys, default_visit_minutes):
+        """Grids for every (branch_id, week_start) in keys
+
+        Rows for all keys are read with one query per attendance table and
+        swept together. Returns ``{key: {'visits', 'occupancy_minutes',
+        'peak'}}`` with 7x24 arrays; ``occupancy_minutes`` holds the summed
+        head-count minutes of each hour.
+        """
+        if not keys:
+            return {}
+        branch_ids = sorted({branch_id for branch_id, _ in keys})
+        first_week = min(start for _, start in keys)
+        last_week = max(start for _, start in keys)
+        position = {key: index for index, key in enumerate(keys)}
+
+        rows = []
+        for model in (Attendance, AttendanceArchive):
+            rows.extend(db.session.query(
+                model.branch_id, model.entry_date, model.entry_time, model.exit_time
+            ).filter(
+                model.branch_id.in_(branch_ids),
+                model.entry_date >= first_week,
+                model.entry_date < last_week + timedelta(days=7),
+                model.access_granted == True
+            ).all())
+        rows = [row for row in rows if (row.branch_id, week_start(row.entry_date)) in position]
+
+        sweep = np.zeros((len(keys), MINUTES_PER_WEEK + 1))
+        visits = np.zeros((len(keys), 7 * 24))
+        if rows:
+            key_index = np.array([position[(row.branch_id, week_start(row.entry_date))] for row in rows])
+            weekday = np.array([row.entry_date.weekday() for row in rows])
+            entry_minute = _minute_of_day([row.entry_time for row in rows])
+            has_exit = np.array([row.exit_time is not None for row in rows])
+            exit_minute = _minute_of_day([row.exit_time or row.entry_time for row in rows])
+
+            duration = np.where(has_exit, exit_minute - entry_minute, default_visit_minutes)
+            duration = np.where(duration < 0, duration + 24 * 60, duration)  # exit after midnight
+
+            start = weekday * 24 * 60 + entry_minute
+            end = np.minimum(start + duration, MINUTES_PER_WEEK)
+            np.add.at(sweep, (key_index, np.floor(start).astype(int)), 1)
+            np.add.at(sweep, (key_index, np.floor(end).astype(int)), -1)
+            np.add.at(visits, (key_index, (start // 60).astype(int)), 1)
+
+        # Head count during each minute of the week, then per hour
+        occupancy = np.cumsum(sweep, axis=1)[:, :MINUTES_PER_WEEK].reshape(len(keys), 7 * 24, 60)
+        occupancy_minutes = occupancy.sum(axis=2)
+        peak = occupancy.max(axis=2)
+
+        return {
+            key: {
+                'visits': visits[index].reshape(7, 24),
+                'occupancy_minutes': occupancy_minutes[index].reshape(7, 24),
+                'peak': peak[index].reshape(7, 24)
+            }
+            for key, index in position.items()
+        }
+
+    @staticmethod
+    def week_grids(branch_ids, weeks, default_visit_minutes=60, ttl=3600, max_entries=2048):
+        """Cached grids for every branch and week start, computing the missing ones together"""
+        now = time.monotonic()
+        grids, missing = {}, []
+        with _cache_lock:
+            for branch_id in branch_ids:
+                for start in weeks:
+                    key = (branch_id, start, default_visit_minutes)
+                    cached = _week_cache.get(key)
+                    if cached is not None and cached[0] > now:
+                        _week_cache.move_to_end(key)
+                        grids[(branch_id, start)] = cached[1]
+                    else:
+                        missing.append((branch_id, start))
+
+        computed = HeatmapService.compute_weeks(missing, default_visit_minutes)
+        with _cache_lock:
+            for (branch_id, start), grid in computed.items():
+                _week_cache[(branch_id, start, default_visit_minutes)] = (now + ttl, grid)
+                grids[(branch_id, start)] = grid
+            while len(_week_cache) > max_entries:
+                _week_cache.popitem(last=False)
+        return grids
+
+    @staticmethod
+    def branch_heatmaps(branches, weeks=4, today=None, default_visit_minutes=60, ttl=3600, max_entries=2048):
+        """Heatmaps over the last ``weeks`` complete weeks, per branch
+
+        Visit counts are totals over the period; occupancy is the average
+        head count over the period's hours, peak the highest minute.
+        """
+        today = today or date.today()
+        current = week_start(today)
+        week_starts = [current - timedelta(days=7 * offset) for offset in range(weeks, 0, -1)]
+        grids = HeatmapService.week_grids(
+            [branch.id for branch in branches], week_starts, default_visit_minutes, ttl, max_entries
+        )
+
+        heatmaps = []
+        for branch in branches:
+            weekly = [grids[(branch.id, start)] for start in week_starts]
+            visits = np.sum([grid['visits'] for grid in weekly], axis=0)
+            average = np.sum([grid['occupancy_minutes'] for grid in weekly], axis=0) / (60 * weeks)
+            peak = np.max([grid['peak'] for grid in weekly], axis=0)
+            busiest_day, busiest_hour = np.unravel_index(np.argmax(average), average.shape)
+            heatmaps.append({
+                'branch_id': branch.id,
+                'branch_name': branch.name,
+                'branch_code': branch.code,
+                'total_visits': int(visits.sum()),
+                'visits': visits.astype(int).tolist(),
+                'average_occupancy': np.round(average, 2).tolist(),
+                'peak_occupancy': peak.astype(int).tolist(),
+                'busiest_slot': {
+                    'weekday': int(busiest_day),
+                    'hour': int(busiest_hour),
+                    'average_occupancy': round(float(average[busiest_day, busiest_hour]), 2)
+                } if average.any() else None
+            })
+
+        return {
+            'period': {
+                'start_date': week_starts[0].isoformat(),
+                'end_date': (current - timedelta(days=1)).isoformat(),
+                'weeks': weeks
+            },
+            'grid': {'rows': 'weekday (0 = Monday)', 'columns': 'hour of day (0-23)'},
+            'branches': heatmaps
+        }
@@ -0,0 +1,131 @@
+"""Sequential ID allocation
+
+Member ids, subscription, payment and complaint numbers keep their formats
+(``<prefix><YYMMDD><suffix>``) but the suffix is now a per-scope, per-day
+sequence number instead of random characters checked against the table
+until unused. Counters live in ``id_counters``; each worker reserves
+``ID_BLOCK_SIZE`` numbers at a time with one atomic ``UPDATE ... RETURNING``
+on a connection of its own, committed at once, and hands them out from
+memory. Numbers are unique without reading the target table, at the cost
+of gaps (a worker's unused numbers are lost when it stops) and of numbers
+from different workers interleaving out of order.
+
+A block is reserved outside the request transaction, so on SQLite (one
+writer at a time) numbers must be allocated before the request's first
+write, or the reservation waits for a lock the request itself holds. With
+an in-memory SQLite database (tests), whose single connection is shared,
+numbers are drawn one at a time on the session's own connection instead.
+
+The first reservation of a scope on a day starts above the highest numeric
+suffix already in the table for that prefix, so numbers issued under the
+old random scheme on the same day are not reused.
+"""
+import os
+import threading
+from datetime import date, datetime
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.database import db
+from app.models.id_counter import IdCounter
+
+
+class IdAllocator:
+    """Hands out sequence numbers from blocks reserved in ``id_counters``"""
+
+    def __init__(self):
+        self.block_size = 20
+        self._blocks = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.block_size = max(1, app.config.get('ID_BLOCK_SIZE', 20))
+
+    def member_id(self, branch_code):
+        """Branch code + YYMMDD + 4-digit sequence"""
+        from app.models.customer import Customer
+        return self._next('member:' + branch_code, branch_code, 4, Customer.member_id)
+
+    def subscription_number(self, branch_code):
+        """SUB + branch code + YYMMDD + 6-digit sequence"""
+        from app.models.subscription import Subscription
+        return self._next('subscription:' + branch_code, 'SUB' + branch_code, 6, Subscription.subscription_number)
+
+    def payment_number(self):
+        """PAY + YYMMDD + 8-digit sequence"""
+        from app.models.payment import Payment
+        return self._next('payment', 'PAY', 8, Payment.payment_number)
+
+    def complaint_number(self):
+        """CMP + YYMMDD + 6-digit sequence"""
+        from app.models.complaint import Complaint
+        return self._next('complaint', 'CMP', 6, Complaint.complaint_number)
+
+    def _next(self, scope, prefix, width, column):
+        today = date.today()
+        number_prefix = f"{prefix}{today.strftime('%y%m%d')}"
+
+        if self._shared_connection():
+            value, _ = self._reserve(db.session.connection(), scope, today, number_prefix, column, 1)
+            return f'{number_prefix}{value:0{width}d}'
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: blocks reserved by the parent are the parent's
+                self._blocks.clear()
+                self._pid = os.getpid()
+            block = self._blocks.get((scope, today))
+            if block is None or block[0] >= block[1]:
+                block = list(self._reserve_block(scope, today, number_prefix, column))
+                # Only today's block is kept per scope
+                self._blocks = {key: value for key, value in self._blocks.items() if key[0] != scope}
+                self._blocks[(scope, today)] = block
+            value = block[0]
+            block[0] += 1
+        return f'{number_prefix}{value:0{width}d}'
+
+    @staticmethod
+    def _shared_connection():
+        url = db.engine.url
+        return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+    def _reserve_block(self, scope, day, number_prefix, column):
+        """Reserve ``block_size`` numbers in a transaction of its own"""
+        while True:
+            try:
+                with db.engine.begin() as connection:
+                    return self._reserve(connection, scope, day, number_prefix, column, self.block_size)
+            except IntegrityError:
+                # Another worker created the counter first; the next UPDATE finds it
+                continue
+
+    @staticmethod
+    def _reserve(connection, scope, day, number_prefix, column, size):
+        """Advance the scope's counter by ``size``; returns the reserved ``(start, end)``"""
+        table = IdCounter.__table__
+        now = datetime.utcnow()
+        end = connection.execute(
+            update(table)
+            .where(table.c.scope == scope, table.c.day == day)
+            .values(next_value=table.c.next_value + size, updated_at=now)
+            .returning(table.c.next_value)
+        ).scalar()
+        if end is not None:
+            return end - size, end
+
+        start = IdAllocator._first_free(connection, number_prefix, column)
+        connection.execute(insert(table).values(scope=scope, day=day, next_value=start + size, updated_at=now))
+        return start, start + size
+
+    @staticmethod
+    def _first_free(connection, number_prefix, column):
+        """One past the highest numeric suffix already issued under the prefix"""
+        highest = 0
+        for number in connection.execute(select(column).where(column.startswith(number_prefix, autoescape=True))).scalars():
+            suffix = number[len(number_prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest + 1
+
+
+id_allocator = IdAllocator()
@@ -0,0 +1,362 @@
+"""Bulk customer import
+
+Rows are read lazily from CSV or NDJSON and handled in batches: each batch
+is validated, checked for username/email clashes with one set-based query
+per column, has its passwords hashed on a process pool (hashing dominates
+the cost of creating a member) and is inserted with one multi-row INSERT
+per table, in one transaction. A bad row is reported with its line number
+and reason and never aborts the rest of the import.
+
+The inserts bypass the ORM flush, so the session hooks are applied here
+instead: the customer search index and the branch daily rollup are
+updated in the same transaction, and dashboards of the affected branches
+are invalidated after the commit.
+"""
+import csv
+import io
+import json
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from sqlalchemy import Enum, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.security import generate_password_hash
+from app.database import db
+from app.models.branch import Branch
+from app.models.customer import Customer, HealthReport
+from app.models.user import User
+
+REQUIRED_FIELDS = ('username', 'email', 'password', 'first_name', 'last_name', 'branch_id')
+OPTIONAL_FIELDS = ('phone', 'date_of_birth', 'gender', 'emergency_contact_name', 'emergency_contact_phone',
+                   'height_cm', 'weight_kg', 'medical_conditions', 'fitness_goals')
+GENDERS = ('male', 'female', 'other')
+
+# Longest value each text column accepts, checked before the insert
+MAX_LENGTHS = {
+    name: column.type.length
+    for table in (User.__table__, Customer.__table__)
+    for name, column in table.columns.items()
+    if name in REQUIRED_FIELDS + OPTIONAL_FIELDS and getattr(column.type, 'length', None)
+    and not isinstance(column.type, Enum)
+}
+
+# Numeric(5, 2) body measurements
+MAX_MEASUREMENT = 999.99
+
+# Below this many passwords per batch, hashing inline beats starting workers
+POOL_THRESHOLD = 8
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row)`` from a binary or text stream of CSV or NDJSON
+
+    Rows that cannot be parsed are yielded as an error string instead of a dict.
+    """
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or hasattr(stream, 'mode') and 'b' in stream.mode:
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, 'Invalid JSON'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value, field):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{field} must be a number')
+    if number <= 0 or number > MAX_MEASUREMENT:
+        raise ValueError(f'{field} must be between 0 and {MAX_MEASUREMENT}')
+    return number
+
+
+def normalize_row(row, default_branch_id=None):
+    """Validated column values of one row; raises ValueError with the reason"""
+    values = {field: _text(row.get(field)) for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+    if values['branch_id'] is None and default_branch_id is not None:
+        values['branch_id'] = default_branch_id
+
+    missing = [field for field in REQUIRED_FIELDS if values[field] is None]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    for field, length in MAX_LENGTHS.items():
+        if values[field] is not None and len(values[field]) > length:
+            raise ValueError(f'{field} must be at most {length} characters')
+
+    try:
+        values['branch_id'] = int(values['branch_id'])
+    except ValueError:
+        raise ValueError('branch_id must be an integer')
+    if values['date_of_birth']:
+        try:
+            values['date_of_birth'] = datetime.strptime(values['date_of_birth'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('date_of_birth must be YYYY-MM-DD')
+    if values['gender']:
+        values['gender'] = values['gender'].lower()
+        if values['gender'] not in GENDERS:
+            raise ValueError(f"gender must be one of {', '.join(GENDERS)}")
+    values['height_cm'] = _number(values['height_cm'], 'height_cm')
+    values['weight_kg'] = _number(values['weight_kg'], 'weight_kg')
+    return values
+
+
+def hashing_pool(workers=None):
+    """Process pool for password hashing, or None to hash inline
+
+    Workers are started from a fork server (spawned where unavailable)
+    rather than forked from the web worker and its background threads.
+    """
+    if workers == 1:
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def hash_passwords(passwords, pool=None):
+    """Password hashes in input order, computed on ``pool`` for larger batches"""
+    if pool is None or len(passwords) < POOL_THRESHOLD:
+        return [generate_password_hash(password) for password in passwords]
+    return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // 32)))
+
+
+class CustomerImportService:
+    """Streams rows into users, customers and health reports in batches"""
+
+    @staticmethod
+    def import_rows(rows, created_by_id=None, default_branch_id=None, can_access_branch=None,
+                    batch_size=500, workers=None):
+        """Import ``(line_number, row)`` pairs; returns a summary with per-row errors
+
+        ``can_access_branch(branch_id)`` limits the branches rows may target.
+        """
+        summary = {'processed': 0, 'imported': 0, 'failed': 0, 'customers': [], 'errors': []}
+        branches = {branch.id: branch for branch in Branch.query.all()}
+
+        # One pool for the whole import; its processes start with the first large batch
+        pool = hashing_pool(workers)
+        batch = []
+        try:
+            for line_number, row in rows:
+                summary['processed'] += 1
+                try:
+                    if isinstance(row, str):
+                        raise ValueError(row)
+                    values = normalize_row(row, default_branch_id)
+                    if values['branch_id'] not in branches:
+                        raise ValueError('Branch not found')
+                    if can_access_branch is not None and not can_access_branch(values['branch_id']):
+                        raise ValueError('Access denied for this branch')
+                except ValueError as e:
+                    CustomerImportService._fail(summary, line_number, row, str(e))
+                    continue
+
+                batch.append((line_number, values))
+                if len(batch) >= batch_size:
+                    CustomerImportService._import_batch(batch, branches, created_by_id, pool, summary)
+                    batch = []
+
+            if batch:
+                CustomerImportService._import_batch(batch, branches, created_by_id, pool, summary)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        summary['errors'].sort(key=lambda error: error['row'])
+        return summary
+
+    @staticmethod
+    def _fail(summary, line_number, row, reason):
+        summary['failed'] += 1
+        summary['errors'].append({
+            'row': line_number,
+            'username': row.get('username') if isinstance(row, dict) else None,
+            'error': reason
+        })
+
+    @staticmethod
+    def _unique(batch, summary):
+        """Drop rows whose username or email exists or repeats earlier in the import"""
+        usernames = {values['username'] for _, values in batch}
+        emails = {values['email'] for _, values in batch}
+        taken_usernames = set(db.session.execute(
+            select(User.username).where(User.username.in_(usernames))
+        ).scalars())
+        taken_emails = set(db.session.execute(
+            select(User.email).where(User.email.in_(emails))
+        ).scalars())
+
+        unique = []
+        for line_number, values in batch:
+            if values['username'] in taken_usernames:
+                CustomerImportService._fail(summary, line_number, values, 'Username already exists')
+            elif values['email'] in taken_emails:
+                CustomerImportService._fail(summary, line_number, values, 'Email already exists')
+            else:
+                taken_usernames.add(values['username'])
+                taken_emails.add(values['email'])
+                unique.append((line_number, values))
+        return unique
+
+    @staticmethod
+    def _import_batch(batch, branches, created_by_id, pool, summary):
+        """Insert one batch in one transaction
+
+        After a unique violation (another writer took a username or email
+        since the check) the batch is re-checked and retried once. If it
+        still fails, or fails with any other database error, its rows are
+        inserted one by one so that only the offending rows are reported.
+        """
+        batch = CustomerImportService._unique(batch, summary)
+        if not batch:
+            return
+        hashes = hash_passwords([values['password'] for _, values in batch], pool)
+        batch = [(line_number, dict(values, password_hash=password_hash))
+                 for (line_number, values), password_hash in zip(batch, hashes)]
+
+        for attempt in range(2):
+            try:
+                created = CustomerImportService._insert(batch, branches, created_by_id)
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    break
+                batch = CustomerImportService._unique(batch, summary)
+                if not batch:
+                    return
+            except SQLAlchemyError:
+                db.session.rollback()
+                break
+            else:
+                CustomerImportService._record(summary, created)
+                return
+
+        for line_number, values in batch:
+            try:
+                created = CustomerImportService._insert([(line_number, values)], branches, created_by_id)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                CustomerImportService._fail(summary, line_number, values, f"Database error: {getattr(e, 'orig', e)}")
+            else:
+                CustomerImportService._record(summary, created)
+
+    @staticmethod
+    def _record(summary, created):
+        summary['imported'] += len(created)
+        summary['customers'].extend(created)
+        print(f"[IMPORT] Imported {summary['imported']} customers")
+
+    @staticmethod
+    def _insert(batch, branches, created_by_id):
+        """Multi-row inserts of users, customers and health reports; commits"""
+        from app.services.dashboard_cache import dashboard_cache
+        from app.services.id_allocator import id_allocator
+        from app.services.rollup_service import _add_contribution, apply_deltas
+        from app.services.search_service import reindex
+
+        # Allocated before the first insert (see app.services.id_allocator)
+        member_ids = {
+            line_number: id_allocator.member_id(branches[values['branch_id']].code)
+            for line_number, values in batch
+        }
+        now = datetime.utcnow()
+        today = date.today()
+
+        users = db.session.execute(insert(User).returning(User.id, User.username), [{
+            'username': values['username'],
+            'email': values['email'],
+            'password_hash': values['password_hash'],
+            'role': 'customer',
+            'first_name': values['first_name'],
+            'last_name': values['last_name'],
+            'phone': values['phone'],
+            'branch_id': values['branch_id'],
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        } for _, values in batch]).all()
+        user_ids = {row.username: row.id for row in users}
+
+        customers = db.session.execute(insert(Customer).returning(Customer.id, Customer.member_id), [{
+            'user_id': user_ids[values['username']],
+            'branch_id': values['branch_id'],
+            'member_id': member_ids[line_number],
+            'date_of_birth': values['date_of_birth'],
+            'gender': values['gender'],
+            'emergency_contact_name': values['emergency_contact_name'],
+            'emergency_contact_phone': values['emergency_contact_phone'],
+            'height_cm': values['height_cm'],
+            'weight_kg': values['weight_kg'],
+            'medical_conditions': values['medical_conditions'],
+            'fitness_goals': values['fitness_goals'],
+            'joined_date': today,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        } for line_number, values in batch]).all()
+        customer_ids = {row.member_id: row.id for row in customers}
+
+        # Initial health report when height and weight are given, as for single sign-ups
+        reports = []
+        for line_number, values in batch:
+            if not (values['height_cm'] and values['weight_kg']):
+                continue
+            profile = Customer(height_cm=values['height_cm'], weight_kg=values['weight_kg'],
+                               date_of_birth=values['date_of_birth'], gender=values['gender'])
+            health = profile.generate_health_report()
+            reports.append({
+                'customer_id': customer_ids[member_ids[line_number]],
+                'height_cm': values['height_cm'],
+                'weight_kg': values['weight_kg'],
+                'bmi': health['bmi'],
+                'bmi_category': health['bmi_category'],
+                'ideal_weight_kg': health['ideal_weight_kg'],
+                'daily_calories': health['daily_calories'],
+                'report_date': today,
+                'notes': 'Initial health assessment',
+                'created_by_id': created_by_id,
+                'created_at': now
+            })
+        if reports:
+            db.session.execute(insert(HealthReport), reports)
+
+        # What the session hooks would have done for ORM inserts
+        reindex(db.session.connection(), customer_ids.values())
+        deltas = defaultdict(dict)
+        for _, values in batch:
+            _add_contribution(deltas, Customer, {'branch_id': values['branch_id'], 'joined_date': today}, 1)
+        apply_deltas(db.session, deltas)
+
+        db.session.commit()
+        dashboard_cache.invalidate_branches({values['branch_id'] for _, values in batch})
+
+        return [{
+            'row': line_number,
+            'customer_id': customer_ids[member_ids[line_number]],
+            'user_id': user_ids[values['username']],
+            'member_id': member_ids[line_number],
+            'username': values['username']
+        } for line_number, values in batch]
@@ -1,10 +1,45 @@
 """Notification service for alerts and reminders"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from sqlalchemy.pool import StaticPool
+from app.database import db
 from app.models.subscription import Subscription
 from app.models.payment import Payment
 from app.models.complaint import Complaint
 from app.models.customer import Customer
 
+# Shared bounded pool for parallel alert collection, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+# Group name -> future still running after its deadline; not resubmitted until it ends
+_overdue = {}
+
+
+def _get_executor(max_workers):
+    """Process-wide thread pool for alert groups"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='alerts')
+        return _executor
+
+
+def _run_in_app_context(app, group, branch_id, timeout):
+    """Run an alert group with its own app context, session and pooled connection"""
+    with app.app_context():
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                # Stop the group's queries at the deadline, so the pool thread is freed
+                db.session.execute(text(f'SET LOCAL statement_timeout = {int(timeout * 1000)}'))
+            return group(branch_id)
+        finally:
+            db.session.remove()
+
+
 class NotificationService:
     """Service for generating notifications and alerts"""
     
@@ -214,15 +249,79 @@ class NotificationService:
         return alerts
     
     @staticmethod
-    def get_all_alerts(branch_id=None):
-        """Get all alerts for dashboard"""
-        all_alerts = []
-        
-        # Collect all types of alerts
-        all_alerts.extend(NotificationService.get_subscription_alerts(branch_id))
-        all_alerts.extend(NotificationService.get_payment_alerts(branch_id))
-        all_alerts.extend(NotificationService.get_complaint_alerts(branch_id))
-        all_alerts.extend(NotificationService.get_customer_alerts(branch_id))
+    def alert_groups():
+        """Independent alert groups by name"""
+        return {
+            'subscriptions': NotificationService.get_subscription_alerts,
+            'payments': NotificationService.get_payment_alerts,
+            'complaints': NotificationService.get_complaint_alerts,
+            'customers': NotificationService.get_customer_alerts
+        }
+    
+    @staticmethod
+    def collect_alerts_parallel(branch_id=None, timeout=None):
+        """Run the alert groups concurrently on the shared pool
+        
+        Each group gets its own session, so the groups' queries run on
+        separate connections at the same time. Groups that fail or do not
+        finish within ``timeout`` seconds are reported instead of waited for.
+        A group still running from an earlier call is reported as timed out
+        without being submitted again, so at most one thread per group is
+        ever overdue; the pool keeps that many threads on top of
+        ``NOTIFICATION_MAX_WORKERS`` for them. Returns ``(alerts, timed_out, failed)``.
+        """
+        app = current_app._get_current_object()
+        if timeout is None:
+            timeout = app.config.get('NOTIFICATION_GROUP_TIMEOUT', 5)
+        groups = NotificationService.alert_groups()
+        executor = _get_executor(app.config.get('NOTIFICATION_MAX_WORKERS', 4) + len(groups))
+        
+        with _executor_lock:
+            overdue = {name for name, future in _overdue.items() if not future.done()}
+        futures = {
+            executor.submit(_run_in_app_context, app, group, branch_id, timeout): name
+            for name, group in groups.items() if name not in overdue
+        }
+        # Groups run side by side, so one deadline bounds each of them
+        done, not_done = wait(futures, timeout=timeout)
+        
+        alerts, failed = [], []
+        for future in done:
+            try:
+                alerts.extend(future.result())
+            except Exception as e:
+                print(f"[ALERTS] Alert group {futures[future]} failed: {e}")
+                failed.append(futures[future])
+        
+        timed_out = list(overdue)
+        for future in not_done:
+            if not future.cancel():
+                # Already running; remember it so later calls do not pile up behind it
+                with _executor_lock:
+                    _overdue[futures[future]] = future
+            timed_out.append(futures[future])
+        
+        return alerts, sorted(timed_out), sorted(failed)
+    
+    @staticmethod
+    def get_all_alerts(branch_id=None, parallel=False, timeout=None):
+        """Get all alerts for dashboard
+        
+        With ``parallel=True`` the alert groups run concurrently; groups that
+        time out or fail are left out and the result is flagged ``degraded``.
+        """
+        timed_out, failed = [], []
+        if parallel and isinstance(db.engine.pool, StaticPool):
+            # One connection shared by all threads (in-memory SQLite): run the groups in turn
+            parallel = False
+        if parallel:
+            all_alerts, timed_out, failed = NotificationService.collect_alerts_parallel(branch_id, timeout)
+        else:
+            all_alerts = []
+            
+            # Collect all types of alerts
+            for group in NotificationService.alert_groups().values():
+                all_alerts.extend(group(branch_id))
         
         # Sort by priority
         priority_order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
@@ -237,6 +336,9 @@ class NotificationService:
                 'medium': len([a for a in all_alerts if a['priority'] == 'medium']),
                 'low': len([a for a in all_alerts if a['priority'] == 'low'])
             },
+            'degraded': bool(timed_out or failed),
+            'timed_out': timed_out,
+            'failed': failed,
             'generated_at': date.today().isoformat()
         }
     
@@ -245,7 +347,9 @@ class NotificationService:
         """Get list of customers to contact for subscription renewal"""
         cutoff_date = date.today() + timedelta(days=days_ahead)
         
-        query = Subscription.query.filter(
+        query = Subscription.query.options(
+            joinedload(Subscription.plan), *Subscription.load_options(include_customer=True)
+        ).filter(
             Subscription.status == 'active',
             Subscription.end_date <= cutoff_date,
             Subscription.end_date >= date.today()
@@ -0,0 +1,169 @@
+"""Live per-branch occupancy
+
+Each worker keeps today's attendance state in memory: for every entry of
+the day, its branch and whether the customer is inside, has left, or was
+denied. Per-branch counters derived from it answer "how many people are in
+the gym" without touching the database. Commits made by this worker are
+applied immediately through the change tracker; the state is reconciled
+against the table at midnight and every ``OCCUPANCY_RECONCILE_INTERVAL``
+seconds, which picks up writes from other workers and corrects any drift.
+"""
+import threading
+import time
+from datetime import date
+from app.database import db
+from app.services.change_tracker import on_commit
+
+STATES = ('in', 'out', 'denied')
+
+
+def entry_state(access_granted, exit_time):
+    """Occupancy state of one attendance entry"""
+    if not access_granted:
+        return 'denied'
+    return 'out' if exit_time is not None else 'in'
+
+
+class OccupancyTracker:
+    """attendance id -> (branch_id, state, entry_time) for today, with per-branch counters"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reconcile_interval = 60
+        self._entries = {}
+        self._counts = {}
+        self._built_on = None
+        self._built_at = 0
+        self._lock = threading.RLock()
+        self.reconciliations = 0
+        self.last_drift = 0
+
+    def init_app(self, app):
+        """Configure from app config and subscribe to attendance commits"""
+        from app.models.attendance import Attendance
+
+        self._model = Attendance
+        self.enabled = app.config.get('OCCUPANCY_TRACKER_ENABLED', True)
+        self.reconcile_interval = app.config.get('OCCUPANCY_RECONCILE_INTERVAL', 60)
+        if self.enabled:
+            on_commit(self._on_commit, Attendance)
+
+    def _load(self):
+        """Today's entries from the table, as (entries, counts)"""
+        Attendance = self._model
+        rows = db.session.query(
+            Attendance.id, Attendance.branch_id, Attendance.entry_time,
+            Attendance.access_granted, Attendance.exit_time
+        ).filter(Attendance.entry_date == date.today()).all()
+
+        entries, counts = {}, {}
+        for row in rows:
+            state = entry_state(row.access_granted, row.exit_time)
+            entries[row.id] = (row.branch_id, state, row.entry_time)
+            branch_counts = counts.setdefault(row.branch_id, dict.fromkeys(STATES, 0))
+            branch_counts[state] += 1
+        return entries, counts
+
+    def reconcile(self):
+        """Replace the in-memory state with the table's; returns the drift found
+
+        Drift is the number of entries whose state differed, which for a
+        single worker should be zero.
+        """
+        with self._lock:
+            entries, counts = self._load()
+            if self._built_on == date.today():
+                keys = set(entries) | set(self._entries)
+                self.last_drift = sum(1 for key in keys if entries.get(key) != self._entries.get(key))
+                if self.last_drift:
+                    print(f"[OCCUPANCY] Reconciled {self.last_drift} drifted entries")
+            else:
+                self.last_drift = 0
+            self._entries, self._counts = entries, counts
+            self._built_on = date.today()
+            self._built_at = time.monotonic()
+            self.reconciliations += 1
+            return self.last_drift
+
+    def _current(self):
+        """(entries, counts) for today, reconciling first when stale"""
+        if not self.enabled:
+            return self._load()
+        stale = (self._built_on != date.today() or
+                 time.monotonic() - self._built_at > self.reconcile_interval)
+        if stale:
+            self.reconcile()
+        return self._entries, self._counts
+
+    def summary(self, branch_ids=None):
+        """Today's entry counts for the given branches (None: all branches)"""
+        with self._lock:
+            _, counts = self._current()
+            totals = dict.fromkeys(STATES, 0)
+            for branch_id, branch_counts in counts.items():
+                if branch_ids is None or branch_id in branch_ids:
+                    for state in STATES:
+                        totals[state] += branch_counts[state]
+
+        return {
+            'total_entries': totals['in'] + totals['out'],
+            'currently_in_gym': totals['in'],
+            'checked_out': totals['out'],
+            'denied_entries': totals['denied']
+        }
+
+    def in_gym(self, branch_id):
+        """Tracked number of members inside a branch, without reconciling
+
+        Safe to call from commit hooks; None before the first build.
+        """
+        with self._lock:
+            if self._built_on is None:
+                return None
+            return self._counts.get(branch_id, {}).get('in', 0)
+
+    def checked_in_ids(self, branch_ids=None):
+        """Ids of today's open entries, latest entry first"""
+        with self._lock:
+            entries, _ = self._current()
+            open_entries = [
+                (entry_time, attendance_id)
+                for attendance_id, (branch_id, state, entry_time) in entries.items()
+                if state == 'in' and (branch_ids is None or branch_id in branch_ids)
+            ]
+        open_entries.sort(reverse=True)
+        return [attendance_id for _, attendance_id in open_entries]
+
+    def _on_commit(self, changes):
+        if self._built_on is None:
+            return
+        today = date.today()
+        with self._lock:
+            for change in changes:
+                if change.model is not self._model:
+                    continue
+                values = change.values
+                previous = self._entries.pop(values['id'], None)
+                if previous is not None:
+                    self._counts[previous[0]][previous[1]] -= 1
+                if change.action == 'delete' or values['entry_date'] != today:
+                    continue
+
+                state = entry_state(values['access_granted'], values['exit_time'])
+                self._entries[values['id']] = (values['branch_id'], state, values['entry_time'])
+                branch_counts = self._counts.setdefault(values['branch_id'], dict.fromkeys(STATES, 0))
+                branch_counts[state] += 1
+
+    def stats(self):
+        """Tracked entries and reconciliation counters for this worker"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'built_on': self._built_on.isoformat() if self._built_on else None,
+                'reconciliations': self.reconciliations,
+                'last_drift': self.last_drift
+            }
+
+
+occupancy_tracker = OccupancyTracker()
@@ -0,0 +1,272 @@
+"""Branch daily rollup maintenance
+
+``branch_daily_stats`` is kept in step with the fact tables by session
+hooks: every flush that inserts, updates or deletes a Payment, Attendance
+or Customer row applies the matching +/- deltas to the affected
+(branch_id, date) rollup rows inside the same transaction. ``rebuild``
+backfills the table from history.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, inspect, func, insert, delete, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database import db
+from app.models.branch_stats import BranchDailyStats, PAYMENT_METHODS
+from app.models.payment import Payment
+from app.models.attendance import Attendance, AttendanceArchive
+from app.models.customer import Customer
+from app.services.dashboard_service import count_if, sum_if
+
+# Attributes whose values decide which rollup buckets a row contributes to
+TRACKED_ATTRIBUTES = {
+    Payment: ('branch_id', 'payment_date', 'status', 'payment_method', 'amount'),
+    Attendance: ('branch_id', 'entry_date', 'access_granted'),
+    Customer: ('branch_id', 'joined_date')
+}
+
+_listeners_registered = False
+
+
+def _decimal(value):
+    """Coerce an amount to Decimal"""
+    if value is None:
+        return Decimal('0')
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _payment_contribution(values):
+    """Rollup columns a payment adds to its bucket"""
+    amount = _decimal(values['amount'])
+    status = values['status']
+    if status == 'completed':
+        contribution = {'completed_count': 1, 'completed_revenue': amount}
+        if values['payment_method'] in PAYMENT_METHODS:
+            method = values['payment_method']
+            contribution[f'{method}_count'] = 1
+            contribution[f'{method}_revenue'] = amount
+        return contribution
+    if status == 'refunded':
+        return {'refunded_count': 1, 'refunded_amount': amount}
+    if status == 'pending':
+        return {'pending_count': 1, 'pending_amount': amount}
+    return {}
+
+
+def _attendance_contribution(values):
+    """Rollup columns an attendance record adds to its bucket"""
+    if values['access_granted'] is False:
+        return {'entries_denied': 1}
+    return {'entries_granted': 1}
+
+
+def _customer_contribution(values):
+    """Rollup columns a customer adds to its bucket"""
+    return {'new_customers': 1}
+
+
+CONTRIBUTIONS = {
+    Payment: ('payment_date', _payment_contribution),
+    Attendance: ('entry_date', _attendance_contribution),
+    Customer: ('joined_date', _customer_contribution)
+}
+
+
+def _current_values(obj):
+    """Tracked attribute values as they are now"""
+    return {name: getattr(obj, name) for name in TRACKED_ATTRIBUTES[type(obj)]}
+
+
+def _previous_values(obj):
+    """Tracked attribute values as they were before this flush, or None if unchanged"""
+    state = inspect(obj)
+    values = {}
+    changed = False
+    for name in TRACKED_ATTRIBUTES[type(obj)]:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+            changed = True
+        else:
+            values[name] = getattr(obj, name)
+    return values if changed else None
+
+
+def _add_contribution(deltas, model, values, sign):
+    """Accumulate a row's contribution into the pending deltas"""
+    date_attr, contribution = CONTRIBUTIONS[model]
+    if values['branch_id'] is None or values[date_attr] is None:
+        return
+    bucket = deltas[(values['branch_id'], values[date_attr])]
+    for column, amount in contribution(values).items():
+        bucket[column] = bucket.get(column, 0) + sign * amount
+
+
+def apply_deltas(session, deltas):
+    """Apply accumulated deltas to branch_daily_stats with in-place increments
+
+    One upsert per bucket, so concurrent first writes to a branch/day add up
+    instead of one of them failing on the unique constraint.
+    """
+    table = BranchDailyStats.__table__
+    dialect_insert = postgresql.insert if session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    now = datetime.utcnow()
+    for (branch_id, stat_date), columns in deltas.items():
+        columns = {name: value for name, value in columns.items() if value}
+        if not columns:
+            continue
+
+        statement = dialect_insert(table).values(
+            branch_id=branch_id,
+            stat_date=stat_date,
+            updated_at=now,
+            **columns
+        )
+        increments = {name: table.c[name] + statement.excluded[name] for name in columns}
+        increments['updated_at'] = statement.excluded.updated_at
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.branch_id, table.c.stat_date], set_=increments
+        ))
+
+
+def _before_flush(session, flush_context, instances):
+    """Capture the contribution of rows about to be deleted while they are still loadable"""
+    deltas = session.info.setdefault('rollup_deltas', defaultdict(dict))
+    for obj in session.deleted:
+        if type(obj) in TRACKED_ATTRIBUTES:
+            _add_contribution(deltas, type(obj), _current_values(obj), -1)
+
+
+def _after_flush(session, flush_context):
+    """Apply rollup deltas for everything written by this flush"""
+    deltas = session.info.pop('rollup_deltas', None) or defaultdict(dict)
+
+    for obj in session.new:
+        if type(obj) in TRACKED_ATTRIBUTES:
+            _add_contribution(deltas, type(obj), _current_values(obj), 1)
+
+    for obj in session.dirty:
+        if type(obj) not in TRACKED_ATTRIBUTES or obj in session.deleted:
+            continue
+        previous = _previous_values(obj)
+        if previous is None:
+            continue
+        _add_contribution(deltas, type(obj), previous, -1)
+        _add_contribution(deltas, type(obj), _current_values(obj), 1)
+
+    if deltas:
+        apply_deltas(session, deltas)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    """Drop deltas captured for a flush that never completed"""
+    session.info.pop('rollup_deltas', None)
+
+
+def _record_old_value(target, value, oldvalue, initiator):
+    """No-op set listener; registering it with active_history loads the old value"""
+
+
+def register_rollup_listeners():
+    """Hook rollup maintenance into the shared session (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    # Make sure the pre-update value is known even when the attribute was expired
+    for model, attributes in TRACKED_ATTRIBUTES.items():
+        for name in attributes:
+            event.listen(getattr(model, name), 'set', _record_old_value, active_history=True)
+
+    event.listen(db.session, 'before_flush', _before_flush)
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_soft_rollback', _after_soft_rollback)
+    _listeners_registered = True
+
+
+class RollupService:
+    """Reads and rebuilds of the branch daily rollup"""
+
+    @staticmethod
+    def rebuild(start_date=None, end_date=None):
+        """Recompute branch_daily_stats from payments, attendance and customers
+
+        Only buckets within [start_date, end_date] are replaced when a range
+        is given. Returns the number of rollup rows written.
+        """
+        def in_range(column):
+            criteria = []
+            if start_date:
+                criteria.append(column >= start_date)
+            if end_date:
+                criteria.append(column <= end_date)
+            return criteria
+
+        rows = defaultdict(dict)
+
+        # Payments: one grouped query with a column per status/method bucket
+        payment_columns = {
+            'completed_count': count_if(Payment.status == 'completed'),
+            'completed_revenue': sum_if(Payment.status == 'completed', Payment.amount),
+            'refunded_count': count_if(Payment.status == 'refunded'),
+            'refunded_amount': sum_if(Payment.status == 'refunded', Payment.amount),
+            'pending_count': count_if(Payment.status == 'pending'),
+            'pending_amount': sum_if(Payment.status == 'pending', Payment.amount)
+        }
+        for method in PAYMENT_METHODS:
+            completed_method = and_(Payment.status == 'completed', Payment.payment_method == method)
+            payment_columns[f'{method}_count'] = count_if(completed_method)
+            payment_columns[f'{method}_revenue'] = sum_if(completed_method, Payment.amount)
+
+        names = list(payment_columns)
+        payment_rows = db.session.query(
+            Payment.branch_id, Payment.payment_date,
+            *[payment_columns[name].label(name) for name in names]
+        ).filter(*in_range(Payment.payment_date)).group_by(Payment.branch_id, Payment.payment_date)
+        for row in payment_rows:
+            rows[(row.branch_id, row.payment_date)].update(
+                {name: getattr(row, name) or 0 for name in names}
+            )
+
+        # Attendance, hot and archived
+        for model in (Attendance, AttendanceArchive):
+            attendance_rows = db.session.query(
+                model.branch_id, model.entry_date,
+                count_if(model.access_granted == True).label('entries_granted'),
+                count_if(model.access_granted == False).label('entries_denied')
+            ).filter(*in_range(model.entry_date)).group_by(model.branch_id, model.entry_date)
+            for row in attendance_rows:
+                bucket = rows[(row.branch_id, row.entry_date)]
+                bucket['entries_granted'] = bucket.get('entries_granted', 0) + (row.entries_granted or 0)
+                bucket['entries_denied'] = bucket.get('entries_denied', 0) + (row.entries_denied or 0)
+
+        # Signups
+        customer_rows = db.session.query(
+            Customer.branch_id, Customer.joined_date,
+            func.count(Customer.id).label('new_customers')
+        ).filter(*in_range(Customer.joined_date)).group_by(Customer.branch_id, Customer.joined_date)
+        for row in customer_rows:
+            rows[(row.branch_id, row.joined_date)]['new_customers'] = row.new_customers or 0
+
+        table = BranchDailyStats.__table__
+        db.session.execute(delete(table).where(*in_range(table.c.stat_date)))
+
+        now = datetime.utcnow()
+        values = [{
+            'branch_id': branch_id,
+            'stat_date': stat_date,
+            'updated_at': now,
+            **{column: 0 for column in _ROLLUP_COLUMNS},
+            **columns
+        } for (branch_id, stat_date), columns in rows.items()]
+        if values:
+            db.session.execute(insert(table), values)
+
+        db.session.commit()
+        return len(values)
+
+
+_ROLLUP_COLUMNS = [
+    column.name for column in BranchDailyStats.__table__.columns
+    if column.name not in ('id', 'branch_id', 'stat_date', 'updated_at')
+]
@@ -0,0 +1,242 @@
+"""Indexed customer search
+
+``customer_search`` holds one search document per customer and is kept in
+step with Customer and User writes by session hooks, inside the same
+transaction. Lookups go through the dialect's full-text index instead of
+``LIKE '%term%'`` scans over ``customers JOIN users``:
+
+- SQLite: the FTS5 table ``customer_search_fts`` (prefix queries per token)
+- PostgreSQL: a GIN index on ``to_tsvector('simple', document)`` and a
+  pattern index on the phone digits
+
+Every word of the search term must prefix-match a word of the document
+(member id, first and last name, email); a term that looks like a phone
+number also prefix-matches the phone digits. Phones are indexed and searched
+in national form (without the ``PHONE_COUNTRY_CODE`` prefix or trunk 0), so
+``+20 100 000 0001``, ``0100 000 0001`` and ``100 000 0001`` all find the
+same customer. An exact member id match is
+ranked first. Other databases fall back to the old substring filter.
+"""
+import re
+from flask import current_app
+from sqlalchemy import case, column, delete, event, false, func, insert, inspect, literal, literal_column, or_, select, table
+from app.database import db
+from app.models.customer import Customer, CustomerSearch
+from app.models.user import User
+
+# Attributes that feed the search document
+TRACKED_ATTRIBUTES = {
+    Customer: ('member_id', 'user_id'),
+    User: ('first_name', 'last_name', 'email', 'phone')
+}
+
+FTS_TABLE = table('customer_search_fts', column('rowid'))
+
+PHONE_TERM = re.compile(r'^\+?[\d\s\-().]{3,}$')
+
+_listeners_registered = False
+
+
+def phone_digits(phone):
+    """National digits of a phone number, for prefix matching regardless of formatting
+
+    Drops an international prefix (``+`` or ``00``) followed by the home
+    ``PHONE_COUNTRY_CODE``, then a trunk ``0``; foreign numbers keep their
+    country code.
+    """
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    international = phone.startswith('+') or digits.startswith('00')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    country_code = current_app.config.get('PHONE_COUNTRY_CODE', '20')
+    if international and country_code and digits.startswith(country_code):
+        digits = digits[len(country_code):]
+    if digits.startswith('0'):
+        digits = digits[1:]
+    return digits[:20] or None
+
+
+def phone_prefixes(term):
+    """Indexed phone digits a typed number may be the start of
+
+    A term written with the country code but no ``+`` is ambiguous, so it
+    is tried both as typed and without the code.
+    """
+    digits = phone_digits(term)
+    if not digits:
+        return []
+    prefixes = [digits]
+    country_code = current_app.config.get('PHONE_COUNTRY_CODE', '20')
+    if country_code and digits.startswith(country_code) and len(digits) > len(country_code) + 2:
+        prefixes.append(phone_digits('+' + digits))
+    return prefixes
+
+
+def search_document(member_id, first_name, last_name, email):
+    """Lower-cased text indexed for a customer"""
+    return ' '.join(part for part in (member_id, first_name, last_name, email) if part).lower()
+
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+def reindex(connection, customer_ids):
+    """Rewrite the search rows of the given customers from their current values"""
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return
+    rows = connection.execute(
+        select(Customer.id, Customer.member_id, User.first_name, User.last_name, User.email, User.phone)
+        .join(User, Customer.user_id == User.id)
+        .where(Customer.id.in_(customer_ids))
+    ).all()
+
+    search_table = CustomerSearch.__table__
+    connection.execute(delete(search_table).where(search_table.c.customer_id.in_(customer_ids)))
+    if rows:
+        connection.execute(insert(search_table), [{
+            'customer_id': row.id,
+            'member_id': row.member_id,
+            'document': search_document(row.member_id, row.first_name, row.last_name, row.email),
+            'phone_digits': phone_digits(row.phone)
+        } for row in rows])
+
+
+def _after_flush(session, flush_context):
+    """Reindex customers whose member id, user or user's name, email or phone was written"""
+    customer_ids, user_ids, deleted_ids = set(), set(), set()
+
+    for obj in session.new:
+        if isinstance(obj, Customer):
+            customer_ids.add(obj.id)
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Customer) and _changed(obj, TRACKED_ATTRIBUTES[Customer]):
+            customer_ids.add(obj.id)
+        elif isinstance(obj, User) and _changed(obj, TRACKED_ATTRIBUTES[User]):
+            user_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Customer):
+            deleted_ids.add(obj.id)
+
+    if not (customer_ids or user_ids or deleted_ids):
+        return
+
+    connection = session.connection()
+    if user_ids:
+        customer_ids.update(connection.execute(
+            select(Customer.id).where(Customer.user_id.in_(user_ids))
+        ).scalars())
+    if deleted_ids:
+        search_table = CustomerSearch.__table__
+        connection.execute(delete(search_table).where(search_table.c.customer_id.in_(deleted_ids)))
+    reindex(connection, customer_ids - deleted_ids)
+
+
+def register_search_listeners():
+    """Hook search index maintenance into the shared session (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    event.listen(db.session, 'after_flush', _after_flush)
+    _listeners_registered = True
+
+
+class SearchService:
+    """Customer search over the maintained index"""
+
+    @staticmethod
+    def backend():
+        """'fts5', 'tsvector' or 'like' for the current database"""
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            return 'fts5'
+        if dialect == 'postgresql':
+            return 'tsvector'
+        return 'like'
+
+    @staticmethod
+    def tokens(term):
+        """Words of a search term, lower-cased"""
+        return re.findall(r'\w+', term.lower())
+
+    @staticmethod
+    def matches(term):
+        """Subquery of (customer_id, exact, rank) for customers matching term
+
+        Order by ``exact`` then ``rank`` (both ascending) for relevance.
+        Returns None on databases without a full-text backend.
+        """
+        backend = SearchService.backend()
+        if backend == 'like':
+            return None
+
+        words = SearchService.tokens(term)
+        prefixes = phone_prefixes(term) if PHONE_TERM.match(term.strip()) else []
+        exact = case((func.upper(CustomerSearch.member_id) == term.strip().upper(), 0), else_=1).label('exact')
+
+        if backend == 'fts5':
+            # Every word as a quoted prefix query; quoting keeps FTS5 syntax out of user input
+            clauses = []
+            if words:
+                clauses.append('document : (' + ' AND '.join(f'"{word}"*' for word in words) + ')')
+            clauses.extend(f'phone_digits : "{prefix}"*' for prefix in prefixes)
+            fts = literal_column(FTS_TABLE.name)
+            return select(CustomerSearch.customer_id, exact, func.bm25(fts).label('rank')).join(
+                FTS_TABLE, FTS_TABLE.c.rowid == CustomerSearch.customer_id
+            ).where(
+                fts.op('MATCH')(' OR '.join(clauses)) if clauses else false()
+            ).subquery()
+
+        document = func.to_tsvector('simple', CustomerSearch.document)
+        conditions = []
+        if words:
+            query = func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+            conditions.append(document.op('@@')(query))
+            rank = -func.ts_rank(document, query)
+        else:
+            rank = literal(0)
+        conditions.extend(CustomerSearch.phone_digits.like(f'{prefix}%') for prefix in prefixes)
+        return select(CustomerSearch.customer_id, exact, rank.label('rank')).where(
+            or_(*conditions) if conditions else false()
+        ).subquery()
+
+    @staticmethod
+    def filter_customers(query, term, ranked=True):
+        """Restrict a ``Customer JOIN User`` query to customers matching term
+        
+        Best matches come first unless ``ranked`` is False (for callers
+        imposing their own order).
+        """
+        matches = SearchService.matches(term)
+        if matches is None:
+            return query.filter(or_(
+                Customer.member_id.contains(term),
+                User.first_name.contains(term),
+                User.last_name.contains(term),
+                User.email.contains(term),
+                User.phone.contains(term)
+            ))
+        query = query.join(matches, matches.c.customer_id == Customer.id)
+        if not ranked:
+            return query
+        return query.order_by(matches.c.exact, matches.c.rank, Customer.id)
+
+    @staticmethod
+    def rebuild():
+        """Recompute the search rows of every customer; returns the number indexed"""
+        connection = db.session.connection()
+        connection.execute(delete(CustomerSearch.__table__))
+        if SearchService.backend() == 'fts5':
+            # Resynchronise the FTS index with its (now empty) content table
+            connection.exec_driver_sql("INSERT INTO customer_search_fts(customer_search_fts) VALUES ('rebuild')")
+
+        customer_ids = connection.execute(select(Customer.id)).scalars().all()
+        for start in range(0, len(customer_ids), 1000):
+            reindex(connection, customer_ids[start:start + 1000])
+        db.session.commit()
+        return len(customer_ids)
@@ -0,0 +1,137 @@
+"""Check-in latency benchmark
+
+Seeds a throwaway database with customers holding active subscriptions,
+then replays a rush-hour burst of POST /api/attendance/checkin requests
+through the full request stack (JWT auth, eligibility, insert, rollup and
+cache hooks) and reports latency percentiles.
+
+Exits with status 1 when p99 exceeds the target, so it can gate CI:
+
+    python benchmark_checkin.py --customers 2000 --p99-ms 25
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from flask_jwt_extended import create_access_token
+
+from config import TestingConfig
+from app import create_app
+from app.database import db
+from app.models.user import User
+from app.models.branch import Branch
+from app.models.customer import Customer
+from app.models.subscription import SubscriptionPlan, Subscription
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(int(round(fraction * len(samples))) - 1, 0)
+    return samples[index]
+
+
+def seed(customers):
+    """Create a branch, a receptionist and customers with active subscriptions"""
+    today = date.today()
+    branch = Branch(name='Benchmark Branch', code='BENCH')
+    db.session.add(branch)
+    db.session.flush()
+
+    staff = User(username='bench_staff', email='bench_staff@example.com', role='receptionist',
+                 first_name='Bench', last_name='Staff', branch_id=branch.id)
+    staff.set_password('benchmark')
+    db.session.add(staff)
+
+    plan = SubscriptionPlan(name='Benchmark Monthly', duration_days=30, price=100)
+    db.session.add(plan)
+    db.session.flush()
+
+    customer_ids = []
+    for i in range(customers):
+        user = User(username=f'bench_member_{i}', email=f'bench_member_{i}@example.com', role='customer',
+                    first_name='Member', last_name=str(i), branch_id=branch.id)
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+
+        customer = Customer(user_id=user.id, branch_id=branch.id, member_id=f'BENCH{i:06d}', joined_date=today)
+        db.session.add(customer)
+        db.session.flush()
+
+        db.session.add(Subscription(
+            customer_id=customer.id, plan_id=plan.id, branch_id=branch.id,
+            subscription_number=f'BENCH-SUB-{i:06d}', start_date=today - timedelta(days=10),
+            end_date=today + timedelta(days=20), actual_price=100, status='active',
+            created_by_id=staff.id
+        ))
+        customer_ids.append(customer.id)
+
+    db.session.commit()
+    return branch.id, staff.id, customer_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the check-in endpoint')
+    parser.add_argument('--customers', type=int, default=1000, help='number of check-ins to replay')
+    parser.add_argument('--warmup', type=int, default=50, help='check-ins excluded from the statistics')
+    parser.add_argument('--p99-ms', type=float, default=25.0, help='p99 latency target in milliseconds')
+    parser.add_argument('--database-url', help='database to benchmark against (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    db_path = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='checkin_bench_')
+        os.close(fd)
+        database_url = f'sqlite:///{db_path}'
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    app = create_app(BenchmarkConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            branch_id, staff_id, customer_ids = seed(args.customers + args.warmup)
+            token = create_access_token(identity=str(staff_id))
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        latencies = []
+        for n, customer_id in enumerate(customer_ids):
+            started = time.perf_counter()
+            response = client.post('/api/attendance/checkin', headers=headers,
+                                   json={'customer_id': customer_id, 'branch_id': branch_id})
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 201:
+                print(f"Unexpected response for customer {customer_id}: {response.status_code} {response.get_json()}")
+                return 1
+            if n >= args.warmup:
+                latencies.append(elapsed_ms)
+
+        latencies.sort()
+        p99 = percentile(latencies, 0.99)
+        print(f"Check-ins: {len(latencies)} (after {args.warmup} warm-up)")
+        print(f"  mean {statistics.mean(latencies):7.2f} ms")
+        print(f"  p50  {percentile(latencies, 0.50):7.2f} ms")
+        print(f"  p95  {percentile(latencies, 0.95):7.2f} ms")
+        print(f"  p99  {p99:7.2f} ms   (target {args.p99_ms:.2f} ms)")
+        print(f"  max  {latencies[-1]:7.2f} ms")
+
+        if p99 > args.p99_ms:
+            print("FAIL: p99 above target")
+            return 1
+        print("OK: p99 within target")
+        return 0
+    finally:
+        if db_path:
+            os.remove(db_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
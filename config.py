@@ -21,6 +21,71 @@ class Config:
 
     # Pagination
     ITEMS_PER_PAGE = 20
+    PAGINATION_COUNT_CACHE_TTL = 60  # seconds a cursor-mode total (include_total=true) is reused
+    
+    # Dashboard cache: 'memory' (per-process LRU), 'redis' (shared) or 'none'
+    DASHBOARD_CACHE_BACKEND = os.environ.get('DASHBOARD_CACHE_BACKEND') or 'memory'
+    DASHBOARD_CACHE_REDIS_URL = os.environ.get('DASHBOARD_CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    DASHBOARD_CACHE_TTL = 60  # seconds
+    DASHBOARD_CACHE_MAX_ENTRIES = 1024
+    
+    # Alert snapshots: refreshed by a background worker every interval
+    ALERT_SNAPSHOT_WORKER = True
+    ALERT_SNAPSHOT_INTERVAL = 300  # seconds
+    
+    # Parallel alert collection for /api/dashboard/alerts/live
+    NOTIFICATION_MAX_WORKERS = 4  # plus one reserve thread per alert group for overdue groups
+    NOTIFICATION_GROUP_TIMEOUT = 5  # seconds
+    
+    # Per-worker check-in eligibility index; rebuilt at midnight and every refresh interval
+    ELIGIBILITY_INDEX_ENABLED = True
+    ELIGIBILITY_INDEX_REFRESH = 300  # seconds
+    # 'redis' shares invalidations between workers through DASHBOARD_CACHE_REDIS_URL
+    ELIGIBILITY_INDEX_BACKEND = os.environ.get('ELIGIBILITY_INDEX_BACKEND') or DASHBOARD_CACHE_BACKEND
+    
+    # Live occupancy counters; reconciled with the attendance table every interval
+    OCCUPANCY_TRACKER_ENABLED = True
+    OCCUPANCY_RECONCILE_INTERVAL = 60  # seconds
+    
+    # Server-sent attendance events
+    ATTENDANCE_STREAM_ENABLED = True
+    ATTENDANCE_STREAM_QUEUE_SIZE = 100  # events buffered per client before it must resync
+    ATTENDANCE_STREAM_MAX_SUBSCRIBERS = 200  # open streams per worker
+    ATTENDANCE_STREAM_HEARTBEAT = 15  # seconds
+    ATTENDANCE_STREAM_BUFFER = 500  # recent events kept for Last-Event-ID resume
+    # 'redis' shares events between workers through DASHBOARD_CACHE_REDIS_URL
+    ATTENDANCE_STREAM_BACKEND = os.environ.get('ATTENDANCE_STREAM_BACKEND') or DASHBOARD_CACHE_BACKEND
+    
+    # Occupancy heatmaps: per (branch, week) grids cached in each worker
+    HEATMAP_DEFAULT_VISIT_MINUTES = 60  # assumed length of visits without a checkout
+    HEATMAP_CACHE_TTL = 3600  # seconds
+    HEATMAP_CACHE_MAX_ENTRIES = 2048
+    
+    # Attendance older than the horizon (whole months) is moved to attendance_archive
+    ATTENDANCE_ARCHIVE_HORIZON_DAYS = 365
+    ATTENDANCE_ARCHIVE_BATCH_SIZE = 5000
+    
+    # Batch check-in replay from door controllers
+    ATTENDANCE_BATCH_MAX_ENTRIES = 500
+    ATTENDANCE_BATCH_CLOCK_SKEW = 300  # seconds a client timestamp may run ahead
+    
+    # Write-behind check-ins: journaled locally and inserted in batches by a background flusher
+    ATTENDANCE_WRITE_BEHIND = os.environ.get('ATTENDANCE_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+    ATTENDANCE_JOURNAL_DIR = os.environ.get('ATTENDANCE_JOURNAL_DIR')  # default: instance folder
+    ATTENDANCE_JOURNAL_FSYNC = True
+    ATTENDANCE_FLUSH_INTERVAL_MS = 200
+    ATTENDANCE_FLUSH_MAX_ROWS = 100
+    
+    # Home country calling code; customer search matches phones in national form
+    PHONE_COUNTRY_CODE = os.environ.get('PHONE_COUNTRY_CODE', '20')
+    
+    # Member, subscription, payment and complaint numbers reserved per worker at a time
+    ID_BLOCK_SIZE = 20
+    
+    # Bulk customer import (CSV / NDJSON)
+    CUSTOMER_IMPORT_BATCH_SIZE = 500  # rows per transaction
+    CUSTOMER_IMPORT_HASH_WORKERS = None  # password hashing processes; None = one per CPU
+    CUSTOMER_IMPORT_MAX_ROWS = 10000  # per request; the CLI has no limit
     
     # Business Rules
     SUBSCRIPTION_FREEZE_MAX_DAYS = 30
@@ -43,6 +108,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    ALERT_SNAPSHOT_WORKER = False
+    QUERY_BUDGET_ENFORCED = True  # list endpoints fail when they exceed their @query_budget
+    ATTENDANCE_WRITE_BEHIND = False
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,44 @@
+"""Add composite indexes for attendance, payment and subscription hot filters
+
+Tables are created by ``db.create_all()``, which also creates these indexes
+on new databases; this revision adds them to existing ones. Every index is
+created only if missing, so it is safe on either.
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-17 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # (index name, table, columns)
+    ('ix_attendance_branch_entry_date', 'attendance', ['branch_id', 'entry_date']),
+    ('ix_attendance_customer_entry_date', 'attendance', ['customer_id', 'entry_date']),
+    ('ix_attendance_entry_date_access', 'attendance', ['entry_date', 'access_granted']),
+    ('ix_payments_branch_status_date', 'payments', ['branch_id', 'status', 'payment_date']),
+    ('ix_payments_status_created_at', 'payments', ['status', 'created_at']),
+    ('ix_payments_reference_number', 'payments', ['reference_number']),
+    ('ix_subscriptions_status_end_date', 'subscriptions', ['status', 'end_date']),
+    ('ix_subscriptions_branch_status_end_date', 'subscriptions', ['branch_id', 'status', 'end_date']),
+    ('ix_subscriptions_customer_status', 'subscriptions', ['customer_id', 'status']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
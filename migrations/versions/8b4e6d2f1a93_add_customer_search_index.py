@@ -0,0 +1,70 @@
+"""Add the customer search table and its full-text index
+
+New databases get ``customer_search`` (and on SQLite the FTS5 table and
+its sync triggers) from ``db.create_all()``. This revision creates them on
+existing databases; run ``flask rebuild-search-index`` afterwards to index
+the customers already there.
+
+Revision ID: 8b4e6d2f1a93
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2f1a93'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+# Full-text index over customer_search, as created by db.create_all()
+SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS customer_search_fts USING fts5("
+        "document, phone_digits, content='customer_search', content_rowid='customer_id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_ai AFTER INSERT ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(rowid, document, phone_digits) "
+        "VALUES (new.customer_id, new.document, new.phone_digits); END",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_ad AFTER DELETE ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(customer_search_fts, rowid, document, phone_digits) "
+        "VALUES ('delete', old.customer_id, old.document, old.phone_digits); END",
+        "CREATE TRIGGER IF NOT EXISTS customer_search_au AFTER UPDATE ON customer_search BEGIN "
+        "INSERT INTO customer_search_fts(customer_search_fts, rowid, document, phone_digits) "
+        "VALUES ('delete', old.customer_id, old.document, old.phone_digits); "
+        "INSERT INTO customer_search_fts(rowid, document, phone_digits) "
+        "VALUES (new.customer_id, new.document, new.phone_digits); END",
+    ],
+    'postgresql': [
+        "CREATE INDEX IF NOT EXISTS ix_customer_search_document ON customer_search "
+        "USING gin (to_tsvector('simple', document))",
+        "CREATE INDEX IF NOT EXISTS ix_customer_search_phone_digits ON customer_search "
+        "(phone_digits text_pattern_ops)",
+    ]
+}
+
+
+def upgrade():
+    op.create_table(
+        'customer_search',
+        sa.Column('customer_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('member_id', sa.String(length=20), nullable=False),
+        sa.Column('document', sa.Text(), nullable=False),
+        sa.Column('phone_digits', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('customer_id'),
+        if_not_exists=True
+    )
+    for statement in SEARCH_DDL.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('customer_search_ai', 'customer_search_ad', 'customer_search_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS customer_search_fts')
+    op.drop_table('customer_search', if_exists=True)
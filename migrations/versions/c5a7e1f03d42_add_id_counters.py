@@ -0,0 +1,36 @@
+"""Add id_counters for sequential member, subscription, payment and complaint numbers
+
+New databases get the table from ``db.create_all()``. Counters start
+lazily, above numbers already issued on the same day, so nothing needs
+backfilling.
+
+Revision ID: c5a7e1f03d42
+Revises: 8b4e6d2f1a93
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e1f03d42'
+down_revision = '8b4e6d2f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'id_counters',
+        sa.Column('scope', sa.String(length=40), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('next_value', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'day'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('id_counters', if_exists=True)
@@ -0,0 +1,157 @@
+"""Add rollup, archive, alert snapshot and ingest key tables
+
+New databases get ``attendance_archive``, ``attendance_monthly_summary``,
+``branch_daily_stats``, ``alert_snapshots`` and ``attendance_ingest_keys``
+from ``db.create_all()``. This revision creates them on existing
+databases. An ``alert_snapshots`` table from before the ``scope`` column
+is dropped and recreated: snapshots are derived data and are recomputed on
+the next refresh. Run ``flask rebuild-rollups`` afterwards to fill
+``branch_daily_stats`` from the payments and attendance already there.
+
+Revision ID: e2b9d4c6a817
+Revises: c5a7e1f03d42
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b9d4c6a817'
+down_revision = 'c5a7e1f03d42'
+branch_labels = None
+depends_on = None
+
+
+# The attendance table already owns the entry_methods type on PostgreSQL
+ENTRY_METHODS = sa.Enum('biometric', 'manual', 'card', name='entry_methods').with_variant(
+    postgresql.ENUM('biometric', 'manual', 'card', name='entry_methods', create_type=False), 'postgresql'
+)
+
+AMOUNT = sa.Numeric(precision=12, scale=2)
+
+INDEXES = [
+    # (index name, table, columns)
+    ('ix_attendance_archive_customer_entry_date', 'attendance_archive', ['customer_id', 'entry_date']),
+    ('ix_attendance_archive_branch_entry_date', 'attendance_archive', ['branch_id', 'entry_date']),
+    ('ix_branch_daily_stats_stat_date', 'branch_daily_stats', ['stat_date']),
+    ('ix_alert_snapshots_generated_at', 'alert_snapshots', ['generated_at']),
+]
+
+
+def upgrade():
+    op.create_table(
+        'attendance_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('entry_date', sa.Date(), nullable=False),
+        sa.Column('entry_time', sa.Time(), nullable=False),
+        sa.Column('exit_time', sa.Time(), nullable=True),
+        sa.Column('entry_method', ENTRY_METHODS, nullable=True),
+        sa.Column('biometric_verified', sa.Boolean(), nullable=True),
+        sa.Column('access_granted', sa.Boolean(), nullable=False),
+        sa.Column('denial_reason', sa.String(length=200), nullable=True),
+        sa.Column('processed_by_id', sa.Integer(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.ForeignKeyConstraint(['processed_by_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'attendance_monthly_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('visits', sa.Integer(), nullable=False),
+        sa.Column('denied_entries', sa.Integer(), nullable=False),
+        sa.Column('total_duration_minutes', sa.Float(), nullable=False),
+        sa.Column('timed_visits', sa.Integer(), nullable=False),
+        sa.Column('first_visit', sa.Date(), nullable=True),
+        sa.Column('last_visit', sa.Date(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('customer_id', 'month', name='uq_attendance_monthly_summary_customer_month'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'branch_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('stat_date', sa.Date(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('completed_revenue', AMOUNT, nullable=False),
+        sa.Column('cash_count', sa.Integer(), nullable=False),
+        sa.Column('cash_revenue', AMOUNT, nullable=False),
+        sa.Column('card_count', sa.Integer(), nullable=False),
+        sa.Column('card_revenue', AMOUNT, nullable=False),
+        sa.Column('upi_count', sa.Integer(), nullable=False),
+        sa.Column('upi_revenue', AMOUNT, nullable=False),
+        sa.Column('net_banking_count', sa.Integer(), nullable=False),
+        sa.Column('net_banking_revenue', AMOUNT, nullable=False),
+        sa.Column('transfer_count', sa.Integer(), nullable=False),
+        sa.Column('transfer_revenue', AMOUNT, nullable=False),
+        sa.Column('refunded_count', sa.Integer(), nullable=False),
+        sa.Column('refunded_amount', AMOUNT, nullable=False),
+        sa.Column('pending_count', sa.Integer(), nullable=False),
+        sa.Column('pending_amount', AMOUNT, nullable=False),
+        sa.Column('entries_granted', sa.Integer(), nullable=False),
+        sa.Column('entries_denied', sa.Integer(), nullable=False),
+        sa.Column('new_customers', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('branch_id', 'stat_date', name='uq_branch_daily_stats_branch_date'),
+        if_not_exists=True
+    )
+
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('alert_snapshots') and \
+            'scope' not in {column['name'] for column in inspector.get_columns('alert_snapshots')}:
+        op.drop_table('alert_snapshots')
+    op.create_table(
+        'alert_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=20), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('generated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope'),
+        if_not_exists=True
+    )
+
+    op.create_table(
+        'attendance_ingest_keys',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(length=64), nullable=False),
+        sa.Column('client_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('attendance_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.ForeignKeyConstraint(['attendance_id'], ['attendance.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('customer_id', 'device_id', 'client_timestamp', name='uq_attendance_ingest_key'),
+        if_not_exists=True
+    )
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    for table in ('attendance_ingest_keys', 'alert_snapshots', 'branch_daily_stats',
+                  'attendance_monthly_summary', 'attendance_archive'):
+        op.drop_table(table, if_exists=True)
@@ -0,0 +1,150 @@
+"""Query plan report for the hot attendance, payment and subscription filters
+
+Builds each hot query in the shape the API and services issue it, asks the
+database for its plan and checks that the filtered table is read through
+an index rather than a full scan. Runs against a throwaway SQLite database
+by default, or against an existing database with ``--database-url``
+(PostgreSQL plans are taken with sequential scans disabled, so the report
+shows whether an index *can* serve the query even on small tables).
+
+Exits with status 1 when any query falls back to a full scan:
+
+    python query_plan_report.py
+    python query_plan_report.py --database-url postgresql://user:pw@host/gym_management
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, text
+
+from config import TestingConfig
+from app import create_app
+from app.database import db
+from app.models.attendance import Attendance
+from app.models.payment import Payment
+from app.models.subscription import Subscription
+
+
+def hot_queries():
+    """(label, table, query) for every hot filter shape"""
+    today = date.today()
+    return [
+        ('attendance: open entry today (check-in eligibility)', 'attendance',
+         db.session.query(Attendance.id).filter(
+             Attendance.customer_id == 1, Attendance.entry_date == today,
+             Attendance.access_granted == True, Attendance.exit_time.is_(None))),
+        ('attendance: branch list, last 30 days (GET /api/attendance)', 'attendance',
+         db.session.query(Attendance.id).filter(
+             Attendance.branch_id == 1, Attendance.entry_date >= today - timedelta(days=30)
+         ).order_by(Attendance.entry_date.desc())),
+        ('attendance: branch today (GET /api/attendance/today)', 'attendance',
+         db.session.query(Attendance.id).filter(Attendance.branch_id == 1, Attendance.entry_date == today)),
+        ('attendance: all branches today (occupancy reconcile)', 'attendance',
+         db.session.query(Attendance.id, Attendance.branch_id, Attendance.access_granted).filter(
+             Attendance.entry_date == today)),
+        ('attendance: customer history (GET /customer/<id>/history)', 'attendance',
+         db.session.query(Attendance.id).filter(
+             Attendance.customer_id == 1, Attendance.entry_date >= today - timedelta(days=90),
+             Attendance.access_granted == True)),
+        ('payments: Paymob callback by reference_number', 'payments',
+         db.session.query(Payment.id).filter(Payment.reference_number == '123456')),
+        ('payments: branch totals for a period (dashboard, payment summary)', 'payments',
+         db.session.query(func.sum(Payment.amount)).filter(
+             Payment.branch_id == 1, Payment.status == 'completed',
+             Payment.payment_date >= today.replace(day=1), Payment.payment_date <= today)),
+        ('payments: aged pending per branch (alerts)', 'payments',
+         db.session.query(Payment.branch_id, func.count(Payment.id)).filter(
+             Payment.status == 'pending', Payment.created_at <= datetime.utcnow() - timedelta(days=2)
+         ).group_by(Payment.branch_id)),
+        ('subscriptions: expiring in 7 days (notifications)', 'subscriptions',
+         db.session.query(Subscription.id).filter(
+             Subscription.status == 'active', Subscription.end_date >= today,
+             Subscription.end_date <= today + timedelta(days=7))),
+        ('subscriptions: expiry sweep', 'subscriptions',
+         db.session.query(Subscription.id).filter(
+             Subscription.status == 'active', Subscription.end_date < today)),
+        ('subscriptions: branch active/expiring (branch dashboard)', 'subscriptions',
+         db.session.query(func.count(Subscription.id)).filter(
+             Subscription.branch_id == 1, Subscription.status == 'active',
+             Subscription.end_date >= today, Subscription.end_date <= today + timedelta(days=7))),
+        ('subscriptions: customer active (eligibility, profile)', 'subscriptions',
+         db.session.query(Subscription.id).filter(
+             Subscription.customer_id == 1, Subscription.status == 'active')),
+    ]
+
+
+def explain(query):
+    """Plan lines for a query on the current database"""
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return [row[-1] for row in rows]
+
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    rows = db.session.execute(text(f'EXPLAIN {sql}')).all()
+    return [row[0] for row in rows]
+
+
+def index_used(plan, table):
+    """Name of the index the plan reads ``table`` through, or None for a full scan"""
+    for line in plan:
+        if table not in line:
+            continue
+        # SQLite: "SEARCH attendance USING INDEX ix_..." / PostgreSQL: "Index Scan using ix_... on attendance"
+        match = re.search(r'(?:USING (?:COVERING )?INDEX|[Ii]ndex (?:Only )?Scan using|Bitmap Index Scan on) (\w+)', line)
+        if match:
+            return match.group(1)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that hot queries are served by indexes')
+    parser.add_argument('--database-url', help='database to inspect (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    db_path = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='query_plans_')
+        os.close(fd)
+        database_url = f'sqlite:///{db_path}'
+
+    class ReportConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    app = create_app(ReportConfig)
+    try:
+        with app.app_context():
+            if db_path:
+                db.create_all()
+
+            failures = 0
+            for label, table, query in hot_queries():
+                plan = explain(query)
+                index = index_used(plan, table)
+                status = 'OK  ' if index else 'SCAN'
+                print(f"[{status}] {label}")
+                print(f"       index: {index or '-'}")
+                for line in plan:
+                    print(f"       | {line}")
+                if not index:
+                    failures += 1
+                db.session.rollback()
+
+            if failures:
+                print(f"FAIL: {failures} hot queries use a full table scan")
+                return 1
+            print("OK: every hot query is served by an index")
+            return 0
+    finally:
+        if db_path:
+            os.remove(db_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
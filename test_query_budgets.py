@@ -0,0 +1,137 @@
+"""Query budgets of the list endpoints
+
+Seeds an in-memory database with several rows per list (so a lazy load in
+a serializer would repeat per row) and renders every list endpoint in page
+and cursor mode under TestingConfig, where ``@query_budget`` is enforced:
+an N+1 regression raises QueryBudgetExceeded. Also checks that renewal
+reminders load in a single query.
+
+    python test_query_budgets.py      (or: python -m pytest test_query_budgets.py)
+"""
+import sys
+from datetime import date, datetime, time, timedelta
+
+from flask_jwt_extended import create_access_token
+
+from config import TestingConfig
+from app import create_app
+from app.database import db
+from app.models.user import User
+from app.models.branch import Branch
+from app.models.customer import Customer
+from app.models.subscription import SubscriptionPlan, Subscription
+from app.models.payment import Payment
+from app.models.attendance import Attendance
+from app.models.complaint import Complaint, ComplaintUpdate
+from app.query_budget import count_queries
+from app.services.notification_service import NotificationService
+
+ROWS = 6
+
+LIST_ENDPOINTS = [
+    ('/api/customers/', 'customers'),
+    ('/api/subscriptions/', 'subscriptions'),
+    ('/api/payments/', 'payments'),
+    ('/api/complaints/', 'complaints'),
+    ('/api/attendance/', 'attendance'),
+]
+
+RENEWAL_REMINDERS_BUDGET = 1
+
+
+def seed():
+    """A branch with ROWS customers, each with a subscription, payment, entry and complaint"""
+    today = date.today()
+    branch = Branch(name='Budget Branch', code='BUD')
+    db.session.add(branch)
+    db.session.flush()
+
+    owner = User(username='budget_owner', email='budget_owner@example.com', role='owner',
+                 first_name='Budget', last_name='Owner', password_hash='-')
+    manager = User(username='budget_manager', email='budget_manager@example.com', role='branch_manager',
+                   first_name='Budget', last_name='Manager', branch_id=branch.id, password_hash='-')
+    plan = SubscriptionPlan(name='Budget Monthly', duration_days=30, price=100)
+    db.session.add_all([owner, manager, plan])
+    db.session.flush()
+
+    for i in range(ROWS):
+        user = User(username=f'budget_member_{i}', email=f'budget_member_{i}@example.com', role='customer',
+                    first_name='Member', last_name=str(i), branch_id=branch.id, password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        customer = Customer(user_id=user.id, branch_id=branch.id, member_id=f'BUD{i:04d}')
+        db.session.add(customer)
+        db.session.flush()
+
+        subscription = Subscription(
+            customer_id=customer.id, plan_id=plan.id, branch_id=branch.id,
+            subscription_number=f'SUBBUD{i:04d}', start_date=today - timedelta(days=20),
+            end_date=today + timedelta(days=i + 1), actual_price=100, status='active',
+            created_by_id=owner.id
+        )
+        db.session.add(subscription)
+        db.session.flush()
+
+        db.session.add_all([
+            Payment(payment_number=f'PAYBUD{i:04d}', amount=100, payment_method='cash', status='completed',
+                    subscription_id=subscription.id, customer_id=customer.id, branch_id=branch.id,
+                    processed_by_id=manager.id),
+            Attendance(customer_id=customer.id, branch_id=branch.id, entry_date=today - timedelta(days=i),
+                       entry_time=time(7, i), access_granted=True),
+        ])
+        complaint = Complaint(complaint_number=f'CMPBUD{i:04d}', title='Budget', description='Budget',
+                              category='service', customer_id=customer.id, branch_id=branch.id,
+                              assigned_to_id=manager.id)
+        db.session.add(complaint)
+        db.session.flush()
+        db.session.add(ComplaintUpdate(complaint_id=complaint.id, update_text='Looking into it',
+                                       updated_by_id=manager.id))
+
+    db.session.commit()
+    return owner.id
+
+
+def make_app():
+    app = create_app(TestingConfig)
+    app.app_context().push()
+    db.create_all()
+    return app, seed()
+
+
+def test_list_endpoints_within_budget():
+    app, owner_id = make_app()
+    assert app.config['QUERY_BUDGET_ENFORCED']
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(owner_id))}
+
+    for path, key in LIST_ENDPOINTS:
+        for query in ('?per_page=50', '?cursor=&per_page=50', '?cursor=&per_page=50&include_total=true'):
+            # Fresh identity map, so nothing loaded by the previous request hides a lazy load
+            db.session.expire_all()
+            # Raises QueryBudgetExceeded (propagated under TESTING) when over budget
+            response = client.get(path + query, headers=headers)
+            assert response.status_code == 200, (path + query, response.get_json())
+            rows = response.get_json()[key]
+            assert len(rows) == ROWS, (path + query, len(rows))
+            print(f"[OK] {path}{query} rendered {len(rows)} rows within budget")
+
+
+def test_renewal_reminders_within_budget():
+    make_app()
+    db.session.expire_all()
+    with count_queries() as queries:
+        reminders = NotificationService.get_renewal_reminders()
+    assert reminders['total'] == ROWS, reminders['total']
+    assert queries.count <= RENEWAL_REMINDERS_BUDGET, '\n'.join(queries.statements)
+    print(f"[OK] Renewal reminders for {reminders['total']} subscriptions in {queries.count} queries")
+
+
+if __name__ == '__main__':
+    failed = False
+    for test in (test_list_endpoints_within_budget, test_renewal_reminders_within_budget):
+        try:
+            test()
+        except AssertionError as e:
+            failed = True
+            print(f"[ERROR] {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
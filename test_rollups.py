@@ -0,0 +1,123 @@
+"""Incremental branch daily rollups against a full rebuild
+
+Inserts, changes and deletes payments, attendance and customers through
+the ORM, so ``branch_daily_stats`` is maintained by the flush hooks, then
+checks that every bucket matches what ``RollupService.rebuild`` computes
+from the fact tables.
+
+    python test_rollups.py      (or: python -m pytest test_rollups.py)
+"""
+import sys
+from datetime import date, time, timedelta
+
+from config import TestingConfig
+from app import create_app
+from app.database import db
+from app.models.user import User
+from app.models.branch import Branch
+from app.models.customer import Customer
+from app.models.payment import Payment
+from app.models.attendance import Attendance
+from app.models.branch_stats import BranchDailyStats
+from app.services.rollup_service import RollupService
+
+
+def make_app():
+    app = create_app(TestingConfig)
+    app.app_context().push()
+    db.create_all()
+    return app
+
+
+def rollup_rows():
+    """Non-empty rollup buckets as {(branch_id, stat_date): {column: value}}"""
+    columns = [
+        column.name for column in BranchDailyStats.__table__.columns
+        if column.name not in ('id', 'branch_id', 'stat_date', 'updated_at')
+    ]
+    rows = {}
+    for stats in BranchDailyStats.query.all():
+        values = {name: round(float(getattr(stats, name)), 2) for name in columns}
+        if any(values.values()):
+            rows[(stats.branch_id, stats.stat_date)] = values
+    return rows
+
+
+def add_customer(branch, index, joined_date):
+    user = User(username=f'rollup_member_{index}', email=f'rollup_member_{index}@example.com', role='customer',
+                first_name='Member', last_name=str(index), branch_id=branch.id, password_hash='-')
+    db.session.add(user)
+    db.session.flush()
+    customer = Customer(user_id=user.id, branch_id=branch.id, member_id=f'ROL{index:04d}', joined_date=joined_date)
+    db.session.add(customer)
+    db.session.flush()
+    return customer
+
+
+def test_incremental_rollups_match_rebuild():
+    make_app()
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    north, south = Branch(name='North', code='RNO'), Branch(name='South', code='RSO')
+    db.session.add_all([north, south])
+    db.session.flush()
+    manager = User(username='rollup_manager', email='rollup_manager@example.com', role='branch_manager',
+                   first_name='Rollup', last_name='Manager', branch_id=north.id, password_hash='-')
+    db.session.add(manager)
+    db.session.commit()
+
+    customers = [add_customer(north if i % 2 else south, i, today - timedelta(days=i)) for i in range(6)]
+    payments = []
+    for i, customer in enumerate(customers):
+        payments.append(Payment(
+            payment_number=f'PAYROL{i:04d}', amount=100 + i, status=['completed', 'pending', 'refunded'][i % 3],
+            payment_method=['cash', 'card', 'upi'][i % 3], customer_id=customer.id,
+            branch_id=customer.branch_id, payment_date=today - timedelta(days=i % 2), processed_by_id=manager.id
+        ))
+    entries = [
+        Attendance(customer_id=customer.id, branch_id=customer.branch_id, entry_date=today - timedelta(days=i % 3),
+                   entry_time=time(8, i), access_granted=i % 4 != 0)
+        for i, customer in enumerate(customers)
+    ]
+    db.session.add_all(payments + entries)
+    db.session.commit()
+
+    # Status, amount, method, date and branch changes move contributions between buckets
+    payments[1].status = 'completed'
+    payments[2].amount = 250
+    payments[3].payment_method = 'net_banking'
+    payments[4].payment_date = yesterday - timedelta(days=3)
+    payments[5].branch_id = north.id
+    entries[0].access_granted = True
+    entries[1].entry_date = yesterday - timedelta(days=5)
+    entries[2].branch_id = north.id
+    customers[0].joined_date = yesterday - timedelta(days=10)
+    customers[1].branch_id = south.id
+    db.session.commit()
+
+    # Deletes take their contribution back out
+    db.session.delete(payments[0])
+    db.session.delete(entries[3])
+    db.session.delete(payments[5])
+    db.session.commit()
+    db.session.delete(entries[5])
+    db.session.delete(customers[5])
+    db.session.commit()
+
+    incremental = rollup_rows()
+    assert incremental, 'no rollup rows were maintained'
+    RollupService.rebuild()
+    rebuilt = rollup_rows()
+    assert incremental == rebuilt, {
+        key: (incremental.get(key), rebuilt.get(key))
+        for key in set(incremental) | set(rebuilt) if incremental.get(key) != rebuilt.get(key)
+    }
+    print(f"[OK] {len(rebuilt)} incremental rollup buckets match a rebuild")
+
+
+if __name__ == '__main__':
+    try:
+        test_incremental_rollups_match_rebuild()
+    except AssertionError as e:
+        print(f"[ERROR] test_incremental_rollups_match_rebuild: {e}")
+        sys.exit(1)